@@ -0,0 +1,27 @@
+"""
+Add fermentation_rollups table (1 min / 15 min / 1 h aggregates per tank)
+"""
+from alembic import op
+import sqlalchemy as sa
+
+VARIABLES = ('temperature', 'pressure', 'co2')
+AGGREGATES = ('min', 'max', 'mean', 'last')
+
+
+def upgrade():
+    op.create_table(
+        'fermentation_rollups',
+        sa.Column('tank_id', sa.String(), sa.ForeignKey('fermentation_tanks.id'), primary_key=True),
+        sa.Column('resolution', sa.Integer(), primary_key=True),
+        sa.Column('bucket', sa.DateTime(timezone=True), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False),
+        *[
+            sa.Column(f'{var}_{agg}', sa.Float(), nullable=True)
+            for var in VARIABLES
+            for agg in AGGREGATES
+        ],
+    )
+
+
+def downgrade():
+    op.drop_table('fermentation_rollups')
@@ -0,0 +1,102 @@
+"""
+Convert fermentation_readings into a table range-partitioned by day (UTC)
+
+Creates the partitioned table with a composite (tank_id, timestamp) index
+(propagated to every partition), one partition per day covering the existing
+data plus the next 7 days, copies the old rows and drops the heap table.
+Later partitions are created by app.services.partition_manager.
+"""
+import datetime as dt
+
+from alembic import op
+import sqlalchemy as sa
+
+PREMAKE_DAYS = 7
+
+
+def _create_partition(day):
+    lower = dt.datetime.combine(day, dt.time(), dt.timezone.utc)
+    upper = lower + dt.timedelta(days=1)
+    op.execute(
+        f'CREATE TABLE IF NOT EXISTS "fermentation_readings_p{day:%Y%m%d}" '
+        f'PARTITION OF fermentation_readings '
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    )
+
+
+def upgrade():
+    bind = op.get_bind()
+    legacy = bind.execute(sa.text("SELECT to_regclass('fermentation_readings')")).scalar() is not None
+    if legacy:
+        op.execute('ALTER TABLE fermentation_readings RENAME TO fermentation_readings_legacy')
+        op.execute('ALTER INDEX IF EXISTS fermentation_readings_pkey RENAME TO fermentation_readings_legacy_pkey')
+        op.execute('ALTER SEQUENCE IF EXISTS fermentation_readings_id_seq RENAME TO fermentation_readings_legacy_id_seq')
+        op.execute('DROP INDEX IF EXISTS ix_fermentation_readings_tank_id')
+        op.execute('DROP INDEX IF EXISTS ix_fermentation_readings_timestamp')
+
+    op.execute(
+        """
+        CREATE TABLE fermentation_readings (
+            id BIGSERIAL NOT NULL,
+            tank_id VARCHAR NOT NULL REFERENCES fermentation_tanks (id),
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+            temperature DOUBLE PRECISION,
+            pressure DOUBLE PRECISION,
+            co2 DOUBLE PRECISION,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+        """
+    )
+    op.execute(
+        'CREATE INDEX ix_fermentation_readings_tank_id_timestamp '
+        'ON fermentation_readings (tank_id, timestamp)'
+    )
+
+    today = dt.datetime.now(dt.timezone.utc).date()
+    first_day = today
+    if legacy:
+        oldest = bind.execute(sa.text('SELECT min(timestamp) FROM fermentation_readings_legacy')).scalar()
+        if oldest is not None:
+            if oldest.tzinfo is None:
+                oldest = oldest.replace(tzinfo=dt.timezone.utc)
+            first_day = min(first_day, oldest.astimezone(dt.timezone.utc).date())
+    day = first_day
+    while day <= today + dt.timedelta(days=PREMAKE_DAYS):
+        _create_partition(day)
+        day += dt.timedelta(days=1)
+
+    if legacy:
+        op.execute(
+            'INSERT INTO fermentation_readings (id, tank_id, timestamp, temperature, pressure, co2) '
+            'SELECT id, tank_id, timestamp, temperature, pressure, co2 FROM fermentation_readings_legacy '
+            'WHERE tank_id IS NOT NULL AND timestamp IS NOT NULL'
+        )
+        op.execute(
+            "SELECT setval('fermentation_readings_id_seq', "
+            "(SELECT COALESCE(max(id), 0) + 1 FROM fermentation_readings), false)"
+        )
+        op.execute('DROP TABLE fermentation_readings_legacy')
+
+
+def downgrade():
+    op.execute('ALTER TABLE fermentation_readings RENAME TO fermentation_readings_partitioned')
+    op.execute('ALTER INDEX fermentation_readings_pkey RENAME TO fermentation_readings_partitioned_pkey')
+    op.execute('ALTER SEQUENCE fermentation_readings_id_seq RENAME TO fermentation_readings_partitioned_id_seq')
+    op.create_table(
+        'fermentation_readings',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('tank_id', sa.String(), sa.ForeignKey('fermentation_tanks.id'), index=True),
+        sa.Column('timestamp', sa.DateTime(timezone=True), index=True),
+        sa.Column('temperature', sa.Float()),
+        sa.Column('pressure', sa.Float()),
+        sa.Column('co2', sa.Float()),
+    )
+    op.execute(
+        'INSERT INTO fermentation_readings (id, tank_id, timestamp, temperature, pressure, co2) '
+        'SELECT id, tank_id, timestamp, temperature, pressure, co2 FROM fermentation_readings_partitioned'
+    )
+    op.execute(
+        "SELECT setval('fermentation_readings_id_seq', "
+        "(SELECT COALESCE(max(id), 0) + 1 FROM fermentation_readings), false)"
+    )
+    op.execute('DROP TABLE fermentation_readings_partitioned CASCADE')
@@ -0,0 +1,49 @@
+"""
+Add fermentation alarm rules and alarm event log
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'fermentation_alarm_rules',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column(
+            'tank_id', sa.String(), sa.ForeignKey('fermentation_tanks.id', ondelete='CASCADE'), nullable=False
+        ),
+        sa.Column('variable', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('limit', sa.Float(), nullable=False),
+        sa.Column('deadband', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('severity', sa.String(), nullable=False, server_default='warning'),
+        sa.Column('enabled', sa.Boolean(), nullable=False, server_default=sa.true()),
+    )
+    op.create_index('ix_fermentation_alarm_rules_tank_id', 'fermentation_alarm_rules', ['tank_id'])
+    op.create_table(
+        'fermentation_alarm_events',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column(
+            'rule_id',
+            sa.Integer(),
+            sa.ForeignKey('fermentation_alarm_rules.id', ondelete='CASCADE'),
+            nullable=False,
+        ),
+        sa.Column('tank_id', sa.String(), nullable=False),
+        sa.Column('variable', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('state', sa.String(), nullable=False),
+        sa.Column('value', sa.Float(), nullable=True),
+        sa.Column('limit', sa.Float(), nullable=False),
+        sa.Column('severity', sa.String(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index('ix_fermentation_alarm_events_rule_id', 'fermentation_alarm_events', ['rule_id'])
+    op.create_index(
+        'ix_fermentation_alarm_events_tank_id_timestamp', 'fermentation_alarm_events', ['tank_id', 'timestamp']
+    )
+
+
+def downgrade():
+    op.drop_table('fermentation_alarm_events')
+    op.drop_table('fermentation_alarm_rules')
@@ -0,0 +1,20 @@
+"""
+Add fermentation_profiles table and fermentation_tanks.profile_started_at
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'fermentation_profiles',
+        sa.Column('name', sa.String(), primary_key=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('steps', sa.JSON(), nullable=False),
+    )
+    op.add_column('fermentation_tanks', sa.Column('profile_started_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column('fermentation_tanks', 'profile_started_at')
+    op.drop_table('fermentation_profiles')
@@ -0,0 +1,47 @@
+"""
+Add fermentation_latest_readings and cascade reading deletes in the database
+
+The table keeps one row per tank with its latest reading (upserted by the
+ingestion path) and is backfilled from fermentation_readings. The readings
+foreign key becomes ON DELETE CASCADE so deleting a tank no longer needs the
+ORM to load its history.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+READINGS_FK = 'fermentation_readings_tank_id_fkey'
+
+
+def upgrade():
+    op.create_table(
+        'fermentation_latest_readings',
+        sa.Column(
+            'tank_id',
+            sa.String(),
+            sa.ForeignKey('fermentation_tanks.id', ondelete='CASCADE'),
+            primary_key=True,
+        ),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('temperature', sa.Float()),
+        sa.Column('pressure', sa.Float()),
+        sa.Column('co2', sa.Float()),
+    )
+    op.execute(
+        'INSERT INTO fermentation_latest_readings (tank_id, timestamp, temperature, pressure, co2) '
+        'SELECT DISTINCT ON (tank_id) tank_id, timestamp, temperature, pressure, co2 '
+        'FROM fermentation_readings ORDER BY tank_id, timestamp DESC'
+    )
+    op.execute(f'ALTER TABLE fermentation_readings DROP CONSTRAINT IF EXISTS {READINGS_FK}')
+    op.execute(
+        f'ALTER TABLE fermentation_readings ADD CONSTRAINT {READINGS_FK} '
+        'FOREIGN KEY (tank_id) REFERENCES fermentation_tanks (id) ON DELETE CASCADE'
+    )
+
+
+def downgrade():
+    op.execute(f'ALTER TABLE fermentation_readings DROP CONSTRAINT IF EXISTS {READINGS_FK}')
+    op.execute(
+        f'ALTER TABLE fermentation_readings ADD CONSTRAINT {READINGS_FK} '
+        'FOREIGN KEY (tank_id) REFERENCES fermentation_tanks (id)'
+    )
+    op.drop_table('fermentation_latest_readings')
@@ -0,0 +1,30 @@
+"""
+Add composite (…, timestamp, id) indexes for the keyset-paginated inventory ledger
+
+One index per access path: per lot, global, by event type and by batch. Every
+page of the ledger is an index range scan regardless of its depth.
+inventory_transactions is created by app.db.create_tables, so the indexes are
+only added when the table exists.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+INDEXES = {
+    'ix_inventory_transactions_lot_number_timestamp_id': '(lot_number, timestamp, id)',
+    'ix_inventory_transactions_timestamp_id': '(timestamp, id)',
+    'ix_inventory_transactions_event_type_timestamp_id': '(event_type, timestamp, id)',
+    'ix_inventory_transactions_batch_id_timestamp_id': '(batch_id, timestamp, id)',
+}
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT to_regclass('inventory_transactions')")).scalar() is None:
+        return
+    for name, columns in INDEXES.items():
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON inventory_transactions {columns}')
+
+
+def downgrade():
+    for name in INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
@@ -0,0 +1,34 @@
+"""
+Add (column, lot_number) indexes for the sorted, keyset-paginated item listing
+
+Sorting by name, category, expiry date or creation date reads the index in
+order and stops after one page. The indexes are only added when the table
+and column exist (some inventory_items columns are created by
+app.db.create_tables rather than by a migration).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+INDEXED_COLUMNS = ('name', 'category', 'expiry_date', 'created_at')
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing = set(
+        bind.execute(
+            sa.text(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = 'inventory_items'"
+            )
+        ).scalars()
+    )
+    for column in INDEXED_COLUMNS:
+        if column in existing:
+            op.execute(
+                f'CREATE INDEX IF NOT EXISTS ix_inventory_items_{column}_lot_number '
+                f'ON inventory_items ({column}, lot_number)'
+            )
+
+
+def downgrade():
+    for column in INDEXED_COLUMNS:
+        op.execute(f'DROP INDEX IF EXISTS ix_inventory_items_{column}_lot_number')
@@ -0,0 +1,34 @@
+"""
+Add inventory_snapshots and inventory_snapshot_balances
+
+Periodic per-lot balances derived from inventory_transactions. A point-in-time
+stock query starts from the latest snapshot taken at or before the requested
+instant and only replays the ledger rows after it.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'inventory_snapshots',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column('taken_at', sa.DateTime(timezone=True), nullable=False, unique=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_table(
+        'inventory_snapshot_balances',
+        sa.Column(
+            'snapshot_id',
+            sa.BigInteger(),
+            sa.ForeignKey('inventory_snapshots.id', ondelete='CASCADE'),
+            primary_key=True,
+        ),
+        sa.Column('lot_number', sa.String(), primary_key=True),
+        sa.Column('quantity', sa.Numeric(12, 3), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('inventory_snapshot_balances')
+    op.drop_table('inventory_snapshots')
@@ -0,0 +1,24 @@
+"""
+Add fermentation_spool_checkpoints
+
+The spool drainer stores the spool position it has persisted up to in the same
+transaction as the readings and rollups of each batch. After a crash between
+the database commit and the local checkpoint the batch is skipped instead of
+being written twice.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'fermentation_spool_checkpoints',
+        sa.Column('spool_id', sa.String(), primary_key=True),
+        sa.Column('segment', sa.BigInteger(), nullable=False),
+        sa.Column('offset', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table('fermentation_spool_checkpoints')
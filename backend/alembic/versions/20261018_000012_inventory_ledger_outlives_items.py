@@ -0,0 +1,33 @@
+"""
+Keep inventory ledger rows when an item is deleted
+
+inventory_transactions.lot_number no longer references inventory_items with
+ON DELETE CASCADE. Deleting an item writes a closing AJUSTE movement that
+brings the lot's ledger balance to zero, so point-in-time stock queries and
+snapshots are computed from the ledger alone: history before the deletion is
+kept and a recreated lot number only adds its new movements.
+"""
+from alembic import op
+
+
+def upgrade():
+    # tablas creadas con metadata.create_all: nombre por defecto de PostgreSQL
+    op.execute(
+        'ALTER TABLE inventory_transactions DROP CONSTRAINT IF EXISTS inventory_transactions_lot_number_fkey'
+    )
+
+
+def downgrade():
+    # las filas de lotes ya borrados no tienen ítem: se descartan para poder restaurar la FK
+    op.execute(
+        'DELETE FROM inventory_transactions t WHERE t.lot_number IS NOT NULL AND NOT EXISTS '
+        '(SELECT 1 FROM inventory_items i WHERE i.lot_number = t.lot_number)'
+    )
+    op.create_foreign_key(
+        'inventory_transactions_lot_number_fkey',
+        'inventory_transactions',
+        'inventory_items',
+        ['lot_number'],
+        ['lot_number'],
+        ondelete='CASCADE',
+    )
@@ -0,0 +1,22 @@
+"""
+Add fermentation_schedule_version
+
+Single-row counter bumped in the same transaction as every profile edit or
+tank assignment. Each API process polls it and reloads its profile scheduler
+when it advances, so no process keeps publishing a superseded setpoint.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'fermentation_schedule_version',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'),
+    )
+    op.execute("INSERT INTO fermentation_schedule_version (id, version) VALUES (1, 0)")
+
+
+def downgrade():
+    op.drop_table('fermentation_schedule_version')
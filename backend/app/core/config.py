@@ -26,6 +26,59 @@ class Settings(BaseModel):
 
     mqtt_host: str = Field(env="MQTT_BROKER_HOST", default="mqtt")
     mqtt_port: int = Field(env="MQTT_BROKER_PORT", default=1883)
+    # Cola por listener MQTT y política de desbordamiento (block|drop_oldest|coalesce)
+    mqtt_listener_queue_size: int = Field(env="MQTT_LISTENER_QUEUE_SIZE", default=1000)
+    mqtt_overflow_policy: str = Field(env="MQTT_OVERFLOW_POLICY", default="drop_oldest")
+
+    # Caché en memoria de lecturas recientes (muestras por tanque, 1 muestra/s)
+    hot_cache_samples: int = Field(env="HOT_CACHE_SAMPLES", default=3600)
+    hot_cache_max_tanks: int = Field(env="HOT_CACHE_MAX_TANKS", default=256)
+    # Cada cuántos segundos se vuelcan los agregados 1 min / 15 min / 1 h
+    rollup_flush_seconds: int = Field(env="ROLLUP_FLUSH_SECONDS", default=15)
+
+    # Particiones diarias de fermentation_readings y su retención (detach|drop)
+    readings_partition_premake_days: int = Field(env="READINGS_PARTITION_PREMAKE_DAYS", default=7)
+    readings_retention_days: int = Field(env="READINGS_RETENTION_DAYS", default=180)
+    readings_retention_action: str = Field(env="READINGS_RETENTION_ACTION", default="detach")
+    partition_maintenance_seconds: int = Field(env="PARTITION_MAINTENANCE_SECONDS", default=3600)
+
+    # Spool local (mmap) entre la ingesta MQTT y la BD
+    spool_enabled: bool = Field(env="SPOOL_ENABLED", default=True)
+    spool_dir: str = Field(env="SPOOL_DIR", default="spool")
+    spool_segment_bytes: int = Field(env="SPOOL_SEGMENT_BYTES", default=16 * 1024 * 1024)
+    spool_max_segments: int = Field(env="SPOOL_MAX_SEGMENTS", default=256)
+    spool_drain_seconds: float = Field(env="SPOOL_DRAIN_SECONDS", default=2.0)
+    spool_batch_rows: int = Field(env="SPOOL_BATCH_ROWS", default=50000)
+
+    # Ingesta: "embedded" (dentro de la API) o "external" (workers aparte)
+    ingestion_mode: str = Field(env="INGESTION_MODE", default="embedded")
+    # Workers de la API (uvicorn/gunicorn leen la misma variable); "embedded" exige 1
+    api_workers: int = Field(env="WEB_CONCURRENCY", default=1)
+    ingest_shards: int = Field(env="INGEST_SHARDS", default=1)
+    ingest_share_group: str = Field(env="INGEST_SHARE_GROUP", default="brewpi-ingest")
+    ingest_refresh_seconds: int = Field(env="INGEST_REFRESH_SECONDS", default=10)
+    # Identificador de la réplica (subdirectorio de spool propio); vacío = hostname
+    ingest_instance: str = Field(env="INGEST_INSTANCE", default="")
+
+    # Stream en vivo /fermentation/ws: frecuencia máxima (Hz) por cliente
+    live_max_rate: float = Field(env="LIVE_MAX_RATE", default=10.0)
+
+    # Eventos de inventario (/api/inventory/ws/inventory): buzón por cliente y
+    # canal NOTIFY de PostgreSQL para repartirlos entre workers
+    inventory_ws_queue_size: int = Field(env="INVENTORY_WS_QUEUE_SIZE", default=256)
+    inventory_events_channel: str = Field(env="INVENTORY_EVENTS_CHANNEL", default="inventory_events")
+    # Periodo de las fotos de saldos por lote para consultas de stock a una fecha (s)
+    inventory_snapshot_seconds: int = Field(env="INVENTORY_SNAPSHOT_SECONDS", default=86400)
+
+    # Motor de alarmas: evaluación periódica (reglas stale), volcado de eventos
+    # y ventana para la velocidad de cambio (segundos)
+    alarm_check_seconds: float = Field(env="ALARM_CHECK_SECONDS", default=1.0)
+    alarm_flush_seconds: float = Field(env="ALARM_FLUSH_SECONDS", default=2.0)
+    alarm_rate_window_seconds: float = Field(env="ALARM_RATE_WINDOW_SECONDS", default=60.0)
+
+    # Planificador de perfiles: periodo del tick y republicación de consignas (s)
+    profile_tick_seconds: float = Field(env="PROFILE_TICK_SECONDS", default=1.0)
+    profile_republish_seconds: float = Field(env="PROFILE_REPUBLISH_SECONDS", default=60.0)
 
     @property
     def database_dsn(self) -> str:
@@ -36,7 +89,22 @@ class Settings(BaseModel):
         )
 
 
+def _from_environment() -> dict[str, str]:
+    """Valores de las variables de entorno declaradas con ``Field(env=...)``.
+
+    ``BaseModel`` no lee el entorno por sí mismo: sin esto todos los campos
+    quedarían en su valor por defecto. Pydantic convierte después cada cadena
+    al tipo del campo.
+    """
+    values = {}
+    for name, field in Settings.model_fields.items():
+        env = (field.json_schema_extra or {}).get("env")
+        if env is not None and env in os.environ:
+            values[name] = os.environ[env]
+    return values
+
+
 @lru_cache()
 def get_settings() -> Settings:  # noqa: D401
     """Devuelve la configuración cacheada (singleton)."""
-    return Settings()
+    return Settings(**_from_environment())
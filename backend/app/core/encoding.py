@@ -0,0 +1,81 @@
+"""Codificación rápida de respuestas negociada por ``Accept``.
+
+Las rutas con muchas filas (históricos, ítems y transacciones de inventario)
+pueden saltarse la validación de ``response_model`` y el codificador JSON por
+defecto si el cliente lo pide:
+
+* ``Accept: application/vnd.brewpi+json`` → JSON generado con ``orjson``
+  (mismo contrato, ``Content-Type: application/json``);
+* ``Accept: application/msgpack`` (o ``application/x-msgpack``) → MessagePack.
+
+Sin esas cabeceras (o si la librería no está instalada) la ruta responde con
+el contrato JSON de siempre. Los ``Decimal`` se codifican como cadena y las
+fechas en ISO 8601, igual que Pydantic.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from collections.abc import Iterable, Sequence
+from decimal import Decimal
+from typing import Any
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependencia opcional
+    msgpack = None
+
+ORJSON = "orjson"
+MSGPACK = "msgpack"
+
+ORJSON_MEDIA_TYPE = "application/vnd.brewpi+json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def negotiate(request: Request) -> str | None:
+    """Codificación rápida pedida en ``Accept`` (``None`` = contrato por defecto).
+
+    Gana el primer tipo reconocido de la cabecera cuya librería esté
+    disponible; los factores ``q`` se ignoran.
+    """
+    for part in request.headers.get("accept", "").split(","):
+        media_type = part.split(";", 1)[0].strip().lower()
+        if media_type == ORJSON_MEDIA_TYPE and orjson is not None:
+            return ORJSON
+        if media_type in MSGPACK_MEDIA_TYPES and msgpack is not None:
+            return MSGPACK
+    return None
+
+
+def records(keys: Sequence[str], rows: Iterable[Sequence[Any]]) -> list[dict[str, Any]]:
+    """Filas (tuplas de una consulta por columnas) a la forma del contrato JSON."""
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def encode(encoding: str, content: Any) -> Response:
+    """Respuesta ya serializada: FastAPI no la valida contra ``response_model``."""
+    if encoding == MSGPACK:
+        return Response(msgpack.packb(content, default=_msgpack_default), media_type=MSGPACK_MEDIA_TYPES[0])
+    body = orjson.dumps(content, default=_orjson_default, option=orjson.OPT_UTC_Z)
+    return Response(body, media_type="application/json")
+
+
+def _orjson_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (dt.datetime, dt.date)):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
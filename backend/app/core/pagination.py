@@ -0,0 +1,54 @@
+"""Cursores opacos para paginación por clave (*keyset*).
+
+Un cursor codifica los valores de la clave de ordenación de la última fila
+de una página; la página siguiente se pide con ``WHERE (clave) < (cursor)``
+(o ``>``), que usa el índice compuesto y cuesta lo mismo en cualquier
+profundidad, a diferencia de ``OFFSET``.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import datetime as dt
+import json
+from collections.abc import Callable, Sequence
+from decimal import Decimal
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Cursor URL-safe con los valores de la clave (fechas en ISO 8601)."""
+    raw = json.dumps([_plain(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list[Any]:
+    """Valores del cursor; ``ValueError`` si no es un cursor válido de ``size`` valores."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as err:
+        raise ValueError("Cursor no válido") from err
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Cursor no válido")
+    return values
+
+
+def page(items: Sequence[T], limit: int, key: Callable[[T], Sequence[Any]]) -> tuple[Sequence[T], str | None]:
+    """Recorta a ``limit`` las ``limit + 1`` filas leídas y genera el cursor siguiente."""
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(key(items[-1]))
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
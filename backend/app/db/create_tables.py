@@ -19,6 +19,7 @@ from app.db.session import engine  # noqa: WPS433 (import inside pkg)
 from app.models import fermentation  # noqa: F401
 from app.inventory import models as inventory_models  # noqa: F401
 from app.providers import models as provider_models  # noqa: F401
+from app.services.partition_manager import partition_manager
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +33,8 @@ async def _create_all(db_engine: aSyncEngine) -> None:
         await conn.run_sync(fermentation.Base.metadata.create_all)
         await conn.run_sync(inventory_models.Base.metadata.create_all)
         await conn.run_sync(provider_models.Base.metadata.create_all)
+        # fermentation_readings es particionada: sin particiones no admite inserts
+        await partition_manager.ensure_partitions(conn)
         logger.info("Tablas creadas o ya existentes.")
 
 
@@ -0,0 +1,225 @@
+"""Difusión de eventos de inventario a los clientes WebSocket de todos los workers.
+
+:class:`InventoryEventHub` reparte cada evento (``ALTA``, ``UPDATE``,
+``CONSUMO``, ``IMPORT``...) a los clientes conectados a este proceso y lo
+reenvía a los demás workers de la API por ``NOTIFY`` de PostgreSQL; cada
+proceso mantiene una conexión ``LISTEN`` propia y descarta sus propios
+mensajes (ya entregados en local).
+
+Cada cliente tiene un buzón acotado (:class:`EventSubscriber`) que coalesce
+por lote (o por importación): si aún no ha enviado un evento de un lote y
+llega otro, sólo se envía el último. Los eventos con ``delta`` (``CONSUMO``)
+son incrementales: dos seguidos se suman en uno solo, y uno que llega detrás
+de un evento completo (``ALTA``, ``UPDATE``...) se descarta porque el
+cliente ya recarga el lote al recibir ese. Si el buzón se llena con lotes
+distintos, o si se pierde la conexión ``LISTEN``, se vacía y el cliente
+recibe ``{"event": "RESYNC"}`` para que recargue el inventario completo.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import uuid
+from collections import OrderedDict
+from collections.abc import Hashable
+from decimal import Decimal
+from typing import Any
+
+import asyncpg
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+RESYNC_MESSAGE = json.dumps({"event": "RESYNC"}, separators=(",", ":"))
+
+# Espera entre intentos de (re)conexión del LISTEN (segundos)
+RECONNECT_SECONDS = 5.0
+
+
+class EventSubscriber:
+    """Buzón coalescente y acotado de un cliente WebSocket."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._pending: OrderedDict[Hashable, str] = OrderedDict()
+        # evento y delta acumulado de las entradas pendientes que son incrementales
+        self._deltas: dict[Hashable, tuple[dict[str, Any], Decimal]] = {}
+        self._resync = False
+        self._ready = asyncio.Event()
+        self.sent = 0
+        self.coalesced = 0
+        self.overflows = 0
+
+    def offer(self, key: Hashable, message: str, event: dict[str, Any] | None = None) -> None:
+        """Encola ``message`` (``event`` ya codificado) coalesciendo con lo pendiente de ``key``."""
+        delta = Decimal(event["delta"]) if event is not None and "delta" in event else None
+        if key in self._pending:
+            self.coalesced += 1
+            if delta is not None:
+                if key not in self._deltas:
+                    # el evento pendiente ya hace recargar el lote
+                    return
+                event, pending = self._deltas[key]
+                delta += pending
+                message = json.dumps({**event, "delta": str(delta)}, separators=(",", ":"))
+            del self._pending[key]
+        elif len(self._pending) >= self.maxsize:
+            self.overflows += 1
+            self.resync()
+            return
+        self._pending[key] = message
+        if delta is not None:
+            self._deltas[key] = (event, delta)
+        else:
+            self._deltas.pop(key, None)
+        self._ready.set()
+
+    def resync(self) -> None:
+        """Descarta lo pendiente: el cliente debe recargar el estado completo."""
+        self._pending.clear()
+        self._deltas.clear()
+        self._resync = True
+        self._ready.set()
+
+    async def next_message(self) -> str:
+        while not (self._pending or self._resync):
+            self._ready.clear()
+            await self._ready.wait()
+        if self._resync:
+            self._resync = False
+            message = RESYNC_MESSAGE
+        else:
+            key, message = self._pending.popitem(last=False)
+            self._deltas.pop(key, None)
+        self.sent += 1
+        return message
+
+
+class InventoryEventHub:
+    """Suscriptores locales y reenvío entre procesos por LISTEN/NOTIFY."""
+
+    def __init__(self, channel: str, queue_size: int) -> None:
+        self.channel = channel
+        self.queue_size = queue_size
+        self.origin = uuid.uuid4().hex
+        self._subscribers: set[EventSubscriber] = set()
+        # eventos sin clave de coalescencia: cada uno ocupa su propia entrada
+        self._unkeyed = itertools.count()
+        self._conn: asyncpg.Connection | None = None
+        self._notify_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self.published = 0
+        self.received = 0
+        self.notify_errors = 0
+
+    def subscribe(self) -> EventSubscriber:
+        subscriber = EventSubscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: EventSubscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    async def publish(self, message: dict[str, Any]) -> None:
+        """Entrega ``message`` en este proceso y lo reenvía al resto de workers."""
+        self.published += 1
+        self._deliver(message)
+        if self._conn is None:
+            return
+        payload = json.dumps({"origin": self.origin, "message": message}, separators=(",", ":"))
+        try:
+            async with self._notify_lock:
+                await self._conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError):
+            self.notify_errors += 1
+            logger.warning("No se pudo reenviar el evento de inventario a otros workers", exc_info=True)
+
+    def _deliver(self, message: dict[str, Any]) -> None:
+        if not self._subscribers:
+            return
+        key = message.get("import_id") or message.get("lot_number") or ("unkeyed", next(self._unkeyed))
+        encoded = json.dumps(message, separators=(",", ":"))
+        for subscriber in self._subscribers:
+            subscriber.offer(key, encoded, message)
+
+    def _on_notify(self, _conn: Any, _pid: int, _channel: str, payload: str) -> None:
+        try:
+            envelope = json.loads(payload)
+            origin, message = envelope["origin"], envelope["message"]
+            if not isinstance(message, dict):
+                raise TypeError("message no es un objeto")
+            if not all(isinstance(message.get(field, ""), str) for field in ("import_id", "lot_number")):
+                raise TypeError("clave de coalescencia no válida")
+            if "delta" in message and not Decimal(message["delta"]).is_finite():
+                raise ValueError("delta no es finito")
+        except (ValueError, KeyError, TypeError, ArithmeticError):
+            logger.warning("Notificación de inventario no válida: %.200s", payload)
+            return
+        if origin == self.origin:
+            return
+        self.received += 1
+        self._deliver(message)
+
+    # ------------------------------------------------------------------
+    # Conexión LISTEN
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="inventory-events")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        connected_before = False
+        while True:
+            try:
+                conn = await asyncpg.connect(settings.database_dsn)
+            except (OSError, asyncpg.PostgresError) as exc:
+                logger.warning("LISTEN de inventario sin conexión (%s); reintentando", exc)
+                await asyncio.sleep(RECONNECT_SECONDS)
+                continue
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _conn: lost.set())
+            try:
+                await conn.add_listener(self.channel, self._on_notify)
+                self._conn = conn
+                if connected_before:
+                    # lo publicado por otros workers mientras tanto se ha perdido
+                    for subscriber in self._subscribers:
+                        subscriber.resync()
+                connected_before = True
+                await lost.wait()
+                logger.warning("Conexión LISTEN de inventario perdida; reconectando")
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+                logger.exception("Error en la conexión LISTEN de inventario")
+            finally:
+                self._conn = None
+                if not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "clients": len(self._subscribers),
+            "listening": self._conn is not None,
+            "published": self.published,
+            "received": self.received,
+            "notify_errors": self.notify_errors,
+            "sent": sum(subscriber.sent for subscriber in self._subscribers),
+            "coalesced": sum(subscriber.coalesced for subscriber in self._subscribers),
+            "overflows": sum(subscriber.overflows for subscriber in self._subscribers),
+        }
+
+
+inventory_events = InventoryEventHub(settings.inventory_events_channel, settings.inventory_ws_queue_size)
@@ -0,0 +1,193 @@
+"""Exportación del inventario por streaming en .csv, .xlsx y .parquet.
+
+Los ítems llegan por lotes desde un cursor de servidor
+(:meth:`InventoryService.iter_item_rows`) y cada lote se codifica en un hilo
+aparte y se envía en cuanto está listo, así que la memoria no depende del
+tamaño del inventario:
+
+* CSV: la cabecera sale de inmediato y cada lote se envía como bloque de texto.
+* Parquet: un *row group* por lote; los bytes se envían según se escriben.
+* XLSX: hoja en modo ``write_only`` de openpyxl (filas en un temporal en
+  disco). El formato es un zip con el índice al final, así que el archivo
+  sólo puede enviarse, por bloques, una vez cerrado; además openpyxl escribe
+  celda a celda (~0,5 ms por fila), así que para volúmenes grandes conviene
+  CSV o Parquet.
+"""
+from __future__ import annotations
+
+import asyncio
+import csv
+import datetime as dt
+import io
+import tempfile
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any
+
+import openpyxl
+from sqlalchemy import Date, DateTime, Numeric
+
+from app.inventory.models import InventoryItem
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dependencia opcional
+    pa = pq = None
+
+# formato -> (media type, extensión)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Tamaño de los bloques en que se envía el .xlsx terminado
+FILE_CHUNK_BYTES = 64 * 1024
+
+
+def format_available(fmt: str) -> bool:
+    """``False`` si el formato necesita una librería que no está instalada."""
+    return fmt != "parquet" or pq is not None
+
+
+async def export_stream(
+    fmt: str, columns: Sequence[str], batches: AsyncIterator[list[tuple[Any, ...]]]
+) -> AsyncIterator[bytes]:
+    """Bytes del archivo ``fmt`` con las filas de ``batches`` (tuplas en el orden de ``columns``)."""
+    encoder = _ENCODERS[fmt](columns)
+    try:
+        if head := encoder.head():
+            yield head
+        async for rows in batches:
+            if chunk := await asyncio.to_thread(encoder.write, rows):
+                yield chunk
+        tail = encoder.close()
+        while (chunk := await asyncio.to_thread(next, tail, None)) is not None:
+            yield chunk
+    finally:
+        encoder.discard()
+
+
+class _CsvEncoder:
+    def __init__(self, columns: Sequence[str]) -> None:
+        self.columns = columns
+
+    def head(self) -> bytes:
+        return self._encode([self.columns])
+
+    def write(self, rows: list[tuple[Any, ...]]) -> bytes:
+        return self._encode([[_csv_value(value) for value in row] for row in rows])
+
+    def close(self) -> Iterator[bytes]:
+        return iter(())
+
+    def discard(self) -> None:
+        pass
+
+    @staticmethod
+    def _encode(rows: Sequence[Sequence[Any]]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+
+class _XlsxEncoder:
+    def __init__(self, columns: Sequence[str]) -> None:
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("inventory")
+        self.sheet.append(list(columns))
+        self.file: Any = None
+
+    def head(self) -> bytes:
+        return b""
+
+    def write(self, rows: list[tuple[Any, ...]]) -> bytes:
+        for row in rows:
+            self.sheet.append([_xlsx_value(value) for value in row])
+        return b""
+
+    def close(self) -> Iterator[bytes]:
+        self.file = tempfile.TemporaryFile()
+        self.workbook.save(self.file)
+        self.file.seek(0)
+        return iter(lambda: self.file.read(FILE_CHUNK_BYTES), b"")
+
+    def discard(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+
+class _ParquetEncoder:
+    def __init__(self, columns: Sequence[str]) -> None:
+        self.schema = pa.schema([(name, _arrow_type(InventoryItem.__table__.c[name].type)) for name in columns])
+        self.sink = _DrainableSink()
+        self.writer = pq.ParquetWriter(pa.PythonFile(self.sink, mode="w"), self.schema)
+
+    def head(self) -> bytes:
+        return self.sink.drain()
+
+    def write(self, rows: list[tuple[Any, ...]]) -> bytes:
+        if rows:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+            self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        return self.sink.drain()
+
+    def close(self) -> Iterator[bytes]:
+        self.writer.close()
+        return iter((self.sink.drain(),))
+
+    def discard(self) -> None:
+        if self.writer.is_open:
+            self.writer.close()
+
+
+class _DrainableSink:
+    """Destino de escritura que entrega lo escrito y lo olvida (``tell`` sigue contando)."""
+
+    closed = False
+
+    def __init__(self) -> None:
+        self._parts: list[bytes] = []
+        self._written = 0
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        self._written += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._written
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def _arrow_type(column_type: Any) -> Any:
+    if isinstance(column_type, Numeric):
+        return pa.decimal128(column_type.precision, column_type.scale)
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(column_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def _csv_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, (dt.date, dt.datetime)) else value
+
+
+def _xlsx_value(value: Any) -> Any:
+    # Excel no admite zonas horarias: se exporta en UTC sin zona
+    if isinstance(value, dt.datetime) and value.tzinfo is not None:
+        return value.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+_ENCODERS = {"csv": _CsvEncoder, "xlsx": _XlsxEncoder, "parquet": _ParquetEncoder}
@@ -1,15 +1,28 @@
 """Módulo de importación masiva de inventario.
 
-Acepta archivos .csv, .xlsx, .json y devuelve filas parseadas como dicts.
+Acepta archivos .csv, .xlsx, .json y devuelve filas validadas como dicts.
+La validación (:func:`validate_frame`) se hace por columnas sobre el
+DataFrame completo, sin construir un esquema Pydantic por fila.
+
+Para archivos grandes, :func:`iter_validated` lee .csv y .xlsx por trozos de
+tamaño fijo desde el archivo temporal de la subida, de modo que la memoria
+no depende del tamaño del archivo.
 """
 from __future__ import annotations
 
 import io
+import itertools
 import pathlib
-from typing import Any, List
+from collections.abc import Iterator
+from decimal import Decimal
+from typing import IO, Any
 
+import numpy as np
+import openpyxl
 import pandas as pd
 
+from app.inventory.models import CATEGORY_ENUM, InventoryItem
+
 REQUIRED_COLUMNS = {
     "lot_number",
     "name",
@@ -32,6 +45,21 @@ OPTIONAL_COLUMNS = {
 
 ALL_COLUMNS = REQUIRED_COLUMNS | OPTIONAL_COLUMNS
 
+# Mismas restricciones que app.inventory.schemas.ItemCreate
+MAX_LENGTHS = {"lot_number": 64, "name": 120, "unit": 16}
+ORIGIN_OPTIONS = ("nacional", "importada")
+NUMERIC_COLUMNS = ("quantity_available", "safety_stock", "min_order_qty", "cost")
+NON_NEGATIVE_COLUMNS = ("quantity_available", "safety_stock", "min_order_qty")
+TEXT_COLUMNS = tuple(sorted(ALL_COLUMNS - set(NUMERIC_COLUMNS) - {"expiry_date"}))
+# (precisión, escala) de las columnas Numeric: fuera de rango el INSERT de todo el lote falla
+NUMERIC_LIMITS = {
+    column: (InventoryItem.__table__.c[column].type.precision, InventoryItem.__table__.c[column].type.scale)
+    for column in NUMERIC_COLUMNS
+}
+
+# Filas por trozo en la importación por streaming
+STREAM_CHUNK_ROWS = 5000
+
 
 class ImportErrorReport(Exception):
     """Se lanza cuando el archivo carece de columnas requeridas."""
@@ -41,28 +69,120 @@ class ImportErrorReport(Exception):
         self.missing = missing
 
 
-async def parse_upload(filename: str, data: bytes) -> list[dict[str, Any]]:  # noqa: D401
+def read_frame(filename: str, data: bytes) -> pd.DataFrame:
+    """Lee el archivo como texto (los lotes numéricos no pierden ceros ni ganan ``.0``)."""
     ext = pathlib.Path(filename).suffix.lower()
     if ext == ".csv":
-        df = pd.read_csv(io.BytesIO(data))
+        df = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False, na_values=[""])
     elif ext in {".xlsx", ".xls"}:
-        df = pd.read_excel(io.BytesIO(data), engine="openpyxl")
+        df = pd.read_excel(io.BytesIO(data), engine="openpyxl", dtype=str)
     elif ext == ".json":
-        df = pd.read_json(io.BytesIO(data))
+        df = pd.read_json(io.BytesIO(data), dtype=False)
     else:
         raise ValueError("Extensión de archivo no soportada")
 
-    missing = REQUIRED_COLUMNS - set(df.columns)
+    df.columns = _header(df.columns)
+    return df
+
+
+def iter_validated(
+    filename: str, fileobj: IO[bytes], chunk_rows: int = STREAM_CHUNK_ROWS
+) -> Iterator[tuple[list[tuple[int, dict[str, Any]]], list[dict[str, Any]]]]:
+    """Trozos ``(filas válidas, errores)`` de :func:`validate_frame` leídos de uno en uno.
+
+    Es bloqueante: el llamador debe pedir cada trozo fuera del *event loop*.
+    """
+    first_row = 1
+    for frame in _iter_frames(filename, fileobj, chunk_rows):
+        yield validate_frame(frame, first_row)
+        first_row += len(frame)
+
+
+def _iter_frames(filename: str, fileobj: IO[bytes], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    ext = pathlib.Path(filename).suffix.lower()
+    if ext == ".csv":
+        reader = pd.read_csv(fileobj, dtype=str, keep_default_na=False, na_values=[""], chunksize=chunk_rows)
+        with reader:
+            for frame in reader:
+                frame.columns = _header(frame.columns)
+                yield frame
+    elif ext == ".xlsx":
+        workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            columns = _header(next(rows, ()))
+            while batch := list(itertools.islice(rows, chunk_rows)):
+                yield pd.DataFrame(batch, columns=columns, dtype=object)
+        finally:
+            workbook.close()
+    else:
+        raise ValueError("La importación por trozos admite archivos .csv y .xlsx")
+
+
+def _header(columns: Any) -> list[str]:
+    header = [str(c).strip() for c in columns]
+    missing = REQUIRED_COLUMNS - set(header)
     if missing:
         raise ImportErrorReport(missing)
+    return header
+
+
+def validate_frame(
+    df: pd.DataFrame, first_row: int = 1
+) -> tuple[list[tuple[int, dict[str, Any]]], list[dict[str, Any]]]:
+    """Valida y normaliza todas las filas a la vez.
+
+    Devuelve las filas válidas como ``(nº de fila, valores)`` listas para
+    insertar y el informe de las inválidas (``{"row", "lot_number",
+    "error"}``). ``first_row`` es el número de la primera fila del frame
+    (para frames leídos por trozos).
+    """
+    df = df.reindex(columns=sorted(ALL_COLUMNS)).reset_index(drop=True)
+    errors = pd.Series("", index=df.index, dtype=object)
+
+    def fail(mask: pd.Series, message: str) -> None:
+        errors[mask] += message + "; "
+
+    for column in TEXT_COLUMNS:
+        text = df[column].astype("string").str.strip()
+        df[column] = text.mask(text == "")
+    for column in sorted(REQUIRED_COLUMNS - set(NUMERIC_COLUMNS)):
+        fail(df[column].isna(), f"{column} es obligatorio")
+    for column, length in MAX_LENGTHS.items():
+        fail(df[column].str.len() > length, f"{column} supera {length} caracteres")
+    df["category"] = df["category"].str.lower()
+    fail(df["category"].notna() & ~df["category"].isin(CATEGORY_ENUM), "categoría no válida")
+    df["origin"] = df["origin"].str.lower()
+    fail(df["origin"].notna() & ~df["origin"].isin(ORIGIN_OPTIONS), "origen no válido")
+
+    fail(df["quantity_available"].isna(), "quantity_available es obligatorio")
+    for column in NUMERIC_COLUMNS:
+        values = pd.to_numeric(df[column], errors="coerce")
+        fail(df[column].notna() & values.isna(), f"{column} no es numérico")
+        fail(values.notna() & ~np.isfinite(values), f"{column} no es un número finito")
+        # PostgreSQL redondea a la escala de la columna antes de comprobar la precisión
+        precision, scale = NUMERIC_LIMITS[column]
+        digits = precision - scale
+        out_of_range = np.isfinite(values) & (values.round(scale).abs() >= 10**digits)
+        fail(out_of_range, f"{column} supera {digits} dígitos enteros")
+        values = values.where(np.isfinite(values))
+        if column in NON_NEGATIVE_COLUMNS:
+            fail(values < 0, f"{column} no puede ser negativo")
+        df[column] = values
 
-    # Filtrar solo columnas relevantes y renombrar a strings
-    df = df[[c for c in df.columns if c in ALL_COLUMNS]].copy()
-    df.columns = [c.strip() for c in df.columns]
+    expiry = pd.to_datetime(df["expiry_date"], errors="coerce")
+    fail(df["expiry_date"].notna() & expiry.isna(), "expiry_date no es una fecha")
+    df["expiry_date"] = expiry.dt.date
 
-    # Garantizar tipos
-    df["quantity_available"] = pd.to_numeric(df["quantity_available"], errors="coerce")
-    df["cost"] = pd.to_numeric(df["cost"], errors="coerce") if "cost" in df else None
+    fail(df["lot_number"].notna() & df["lot_number"].duplicated(), "lote duplicado en el archivo")
 
-    records: List[dict[str, Any]] = df.to_dict(orient="records")
-    return records
+    invalid = errors != ""
+    skipped = [
+        {"row": int(idx) + first_row, "lot_number": lot if isinstance(lot, str) else "", "error": message[:-2]}
+        for idx, lot, message in zip(df.index[invalid], df["lot_number"][invalid], errors[invalid])
+    ]
+    valid = df[~invalid].astype(object).where(df[~invalid].notna(), None)
+    for column in NUMERIC_COLUMNS:
+        valid[column] = [None if v is None else Decimal(repr(v)) for v in valid[column]]
+    rows = [(int(idx) + first_row, row) for idx, row in zip(valid.index, valid.to_dict(orient="records"))]
+    return rows, skipped
@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import datetime as dt
 
-from sqlalchemy import CheckConstraint, Column, Date, DateTime, Enum, ForeignKey, Numeric, String, Text
+from sqlalchemy import BigInteger, CheckConstraint, Column, Date, DateTime, Enum, ForeignKey, Index, Numeric, String, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -46,24 +46,68 @@ class InventoryItem(Base):
     location: str | None = Column(String)
     created_at: dt.datetime = Column(DateTime(timezone=True), default=dt.datetime.utcnow)
 
+    # el historial de un lote crece sin límite: se consulta paginado
+    # (InventoryService.get_transactions), nunca a través de la relación.
+    # Sin FK ni cascada: el libro sobrevive al borrado del ítem
     transactions = relationship(
-        "InventoryTransaction", back_populates="item", cascade="all,delete", lazy="selectin"
+        "InventoryTransaction",
+        primaryjoin="InventoryItem.lot_number == foreign(InventoryTransaction.lot_number)",
+        back_populates="item",
+        lazy="raise",
+        viewonly=True,
     )
 
     __table_args__ = (
         CheckConstraint("quantity_available >= 0", name="ck_inventory_items_qty_nonnegative"),
+        # orden del listado paginado: (columna, lot_number)
+        Index("ix_inventory_items_name_lot_number", "name", "lot_number"),
+        Index("ix_inventory_items_category_lot_number", "category", "lot_number"),
+        Index("ix_inventory_items_expiry_date_lot_number", "expiry_date", "lot_number"),
+        Index("ix_inventory_items_created_at_lot_number", "created_at", "lot_number"),
     )
 
 
 class InventoryTransaction(Base):
     __tablename__ = "inventory_transactions"
+    # el libro de movimientos se pagina por (timestamp, id): un índice por filtro
+    __table_args__ = (
+        Index("ix_inventory_transactions_lot_number_timestamp_id", "lot_number", "timestamp", "id"),
+        Index("ix_inventory_transactions_timestamp_id", "timestamp", "id"),
+        Index("ix_inventory_transactions_event_type_timestamp_id", "event_type", "timestamp", "id"),
+        Index("ix_inventory_transactions_batch_id_timestamp_id", "batch_id", "timestamp", "id"),
+    )
 
     id = Column(Numeric(18, 0), primary_key=True, autoincrement=True)
-    lot_number: str = Column(String, ForeignKey("inventory_items.lot_number", ondelete="CASCADE"))
+    # sin FK: los movimientos de un lote borrado se conservan (cerrados con un AJUSTE)
+    lot_number: str = Column(String)
     event_type: str = Column(Enum(*EVENT_ENUM, name="inventory_event_enum"), nullable=False)
     quantity_delta = Column(Numeric(12, 3), nullable=False)
     batch_id: str | None = Column(String)
     user: str | None = Column(String)
     timestamp: dt.datetime = Column(DateTime(timezone=True), default=dt.datetime.utcnow, index=True)
 
-    item = relationship("InventoryItem", back_populates="transactions")
+    item = relationship(
+        "InventoryItem",
+        primaryjoin="InventoryItem.lot_number == foreign(InventoryTransaction.lot_number)",
+        back_populates="transactions",
+        viewonly=True,
+    )
+
+
+class InventorySnapshot(Base):
+    """Saldos de todos los lotes según el libro de movimientos hasta ``taken_at`` (incluido)."""
+
+    __tablename__ = "inventory_snapshots"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    taken_at: dt.datetime = Column(DateTime(timezone=True), nullable=False, unique=True)
+    created_at: dt.datetime = Column(DateTime(timezone=True), nullable=False, default=dt.datetime.utcnow)
+
+
+class InventorySnapshotBalance(Base):
+    # sin FK a inventory_items: la foto conserva los lotes borrados después
+    __tablename__ = "inventory_snapshot_balances"
+
+    snapshot_id = Column(BigInteger, ForeignKey("inventory_snapshots.id", ondelete="CASCADE"), primary_key=True)
+    lot_number: str = Column(String, primary_key=True)
+    quantity = Column(Numeric(12, 3), nullable=False)
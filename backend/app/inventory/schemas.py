@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import datetime as dt
 from decimal import Decimal
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field, validator
 
@@ -72,3 +72,45 @@ class TransactionDTO(BaseModel):
 
     class Config:  # noqa: D401
         orm_mode = True
+
+
+class LedgerEntryDTO(TransactionDTO):
+    lot_number: Optional[str]
+
+
+class ConsumptionLine(BaseModel):
+    """Línea de la lista de materiales: un ingrediente (por nombre) y la cantidad a consumir."""
+
+    name: str
+    quantity: Decimal = Field(..., gt=0)
+    category: Optional[str] = Field(None, pattern=f"^({'|'.join(CATEGORY_OPTIONS)})$")
+    unit: Optional[str] = None
+
+
+class ConsumptionRequest(BaseModel):
+    batch_id: Optional[str] = None
+    user: Optional[str] = None
+    lines: List[ConsumptionLine] = Field(..., min_length=1)
+
+
+class AllocationDTO(BaseModel):
+    name: str
+    lot_number: str
+    quantity: Decimal
+    expiry_date: Optional[dt.date]
+
+
+class ConsumptionDTO(BaseModel):
+    batch_id: Optional[str]
+    allocations: List[AllocationDTO]
+
+
+class BalanceDTO(BaseModel):
+    lot_number: str
+    quantity: Decimal
+
+
+class StockAsOfDTO(BaseModel):
+    at: dt.datetime
+    snapshot_at: Optional[dt.datetime]
+    balances: List[BalanceDTO]
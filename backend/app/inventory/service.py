@@ -2,24 +2,133 @@
 from __future__ import annotations
 
 import asyncio
+import datetime as dt
+import uuid
+from collections.abc import AsyncIterator, Iterator, Sequence
 from decimal import Decimal
-from typing import List
+from typing import Any, List
 
-from sqlalchemy import select, update, delete
+from sqlalchemy import BigInteger, Select, and_, bindparam, cast, delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.pagination import decode_cursor, page
+from app.inventory.events import inventory_events
 from app.inventory.models import InventoryItem, InventoryTransaction
-from app.inventory.schemas import ItemCreate, ItemUpdate
+from app.inventory.schemas import ConsumptionLine, ItemCreate, ItemUpdate
 
+# Campos de ItemDTO / TransactionDTO (en su orden) para respuestas construidas desde tuplas
+ITEM_COLUMNS = (
+    "name",
+    "category",
+    "unit",
+    "supplier",
+    "cost",
+    "expiry_date",
+    "location",
+    "manufacturer",
+    "origin",
+    "safety_stock",
+    "min_order_qty",
+    "package_size",
+    "lot_number",
+    "quantity_available",
+    "created_at",
+)
+# Columnas del archivo exportado (mismo orden que la tabla del frontend)
+EXPORT_COLUMNS = (
+    "lot_number",
+    "name",
+    "category",
+    "quantity_available",
+    "unit",
+    "manufacturer",
+    "location",
+    "expiry_date",
+    "supplier",
+    "safety_stock",
+    "min_order_qty",
+    "package_size",
+    "origin",
+    "cost",
+    "created_at",
+)
+TRANSACTION_COLUMNS = ("id", "event_type", "quantity_delta", "batch_id", "user", "timestamp")
+LEDGER_COLUMNS = (*TRANSACTION_COLUMNS, "lot_number")
+
+LEDGER_PAGE_SIZE = 200
+# 15 columnas por ítem; asyncpg admite como máximo 32767 parámetros por sentencia
+IMPORT_CHUNK_ROWS = 2000
+# Errores por fila que devuelve como máximo una importación por streaming
+IMPORT_MAX_REPORTED_ERRORS = 1000
+ITEM_PAGE_SIZE = 500
+# Filas por lote leídas del cursor de servidor al exportar
+EXPORT_BATCH_ROWS = 2000
+# Columnas por las que se puede ordenar el listado (desempate por lot_number)
+ITEM_SORT_FIELDS = (
+    "lot_number",
+    "name",
+    "category",
+    "quantity_available",
+    "expiry_date",
+    "location",
+    "supplier",
+    "created_at",
+)
 
-class InventoryService:  # pylint: disable=too-few-public-methods
-    def __init__(self) -> None:
-        self._listeners: list[asyncio.Queue] = []
 
+class InventoryService:  # pylint: disable=too-few-public-methods
     # ------------------ CRUD Items ------------------
-    async def list_items(self, db: AsyncSession) -> List[InventoryItem]:
-        res = await db.execute(select(InventoryItem))
-        return res.scalars().all()
+    async def iter_item_rows(
+        self, db: AsyncSession, batch_rows: int = EXPORT_BATCH_ROWS
+    ) -> AsyncIterator[list[tuple[Any, ...]]]:
+        """Todo el inventario (``EXPORT_COLUMNS``) por lotes, leído con un cursor de servidor."""
+        stmt = (
+            select(*(getattr(InventoryItem, name) for name in EXPORT_COLUMNS))
+            .order_by(InventoryItem.lot_number)
+            .execution_options(yield_per=batch_rows)
+        )
+        result = await db.stream(stmt)
+        async for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+
+    async def search_items(
+        self,
+        db: AsyncSession,
+        *,
+        limit: int = ITEM_PAGE_SIZE,
+        cursor: str | None = None,
+        sort: str = "lot_number",
+        descending: bool = False,
+        **filters: Any,
+    ) -> tuple[List[InventoryItem], str | None]:
+        """Página de ítems filtrada y ordenada en BD.
+
+        ``filters`` admite ``category``, ``location``, ``supplier``,
+        ``expiry_from``/``expiry_to`` y ``low_stock`` (existencia por debajo
+        del stock de seguridad). Paginación por clave sobre ``(sort,
+        lot_number)``; la consulta no toca las transacciones. ``ValueError``
+        si el cursor no es válido.
+        """
+        stmt = _items_select(select(InventoryItem), limit, cursor, sort, descending, **filters)
+        res = await db.execute(stmt)
+        return page(res.scalars().all(), limit, lambda item: (getattr(item, sort), item.lot_number))
+
+    async def item_rows(
+        self,
+        db: AsyncSession,
+        *,
+        limit: int = ITEM_PAGE_SIZE,
+        cursor: str | None = None,
+        sort: str = "lot_number",
+        descending: bool = False,
+        **filters: Any,
+    ) -> tuple[list[tuple], str | None]:
+        """Como :meth:`search_items`, en tuplas de ``ITEM_COLUMNS`` (sin objetos ORM)."""
+        columns = [getattr(InventoryItem, column) for column in ITEM_COLUMNS]
+        stmt = _items_select(select(*columns), limit, cursor, sort, descending, **filters)
+        res = await db.execute(stmt)
+        return page(res.all(), limit, lambda row: (getattr(row, sort), row.lot_number))
 
     async def create_item(self, db: AsyncSession, data: ItemCreate) -> InventoryItem:
         item = InventoryItem(**data.dict(exclude_none=True))
@@ -34,6 +143,96 @@ class InventoryService:  # pylint: disable=too-few-public-methods
         await self._broadcast({"event": "ALTA", "lot_number": item.lot_number})
         return item
 
+    async def write_import_rows(
+        self,
+        db: AsyncSession,
+        rows: Sequence[tuple[int, dict[str, Any]]],
+        skipped: list[dict[str, Any]],
+    ) -> int:
+        """Inserta ítems nuevos y su transacción ``IMPORT`` sin confirmar (commit del llamador).
+
+        ``rows`` son las filas ya validadas (``importer.validate_frame``). Se
+        escriben por trozos con ``INSERT ... ON CONFLICT DO NOTHING
+        RETURNING``: los lotes que ya existen se añaden a ``skipped``, igual
+        que cuando se daban de alta uno a uno. Devuelve los insertados.
+        """
+        now = dt.datetime.now(dt.timezone.utc)
+        inserted = 0
+        for start in range(0, len(rows), IMPORT_CHUNK_ROWS):
+            chunk = rows[start : start + IMPORT_CHUNK_ROWS]
+            stmt = (
+                pg_insert(InventoryItem)
+                .values([{**values, "created_at": now} for _, values in chunk])
+                .on_conflict_do_nothing(index_elements=[InventoryItem.lot_number])
+                .returning(InventoryItem.lot_number)
+            )
+            created = set((await db.execute(stmt)).scalars().all())
+            movements = []
+            for row, values in chunk:
+                if values["lot_number"] in created:
+                    movements.append(
+                        {
+                            "lot_number": values["lot_number"],
+                            "event_type": "IMPORT",
+                            "quantity_delta": values["quantity_available"],
+                            "timestamp": now,
+                        }
+                    )
+                else:
+                    skipped.append({"row": row, "lot_number": values["lot_number"], "error": "El lote ya existe"})
+            if movements:
+                await db.execute(insert(InventoryTransaction).values(movements))
+            inserted += len(created)
+        return inserted
+
+    async def import_items(
+        self,
+        db: AsyncSession,
+        rows: Sequence[tuple[int, dict[str, Any]]],
+        skipped: list[dict[str, Any]],
+    ) -> dict[str, Any]:
+        """Importación masiva en una única transacción y con un único aviso por WebSocket."""
+        try:
+            inserted = await self.write_import_rows(db, rows, skipped)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        skipped.sort(key=lambda error: error["row"])
+        await self._broadcast({"event": "IMPORT", "inserted": inserted, "skipped": len(skipped)})
+        return {"inserted": inserted, "skipped": skipped}
+
+    async def import_stream(
+        self,
+        db: AsyncSession,
+        batches: Iterator[tuple[list[tuple[int, dict[str, Any]]], list[dict[str, Any]]]],
+    ) -> dict[str, Any]:
+        """Importación por trozos (``importer.iter_validated``).
+
+        Cada trozo se lee y valida en un hilo aparte, se escribe y se confirma
+        antes de leer el siguiente, y su avance se anuncia por WebSocket
+        (``IMPORT_PROGRESS``). Un fallo de BD deja confirmados los trozos
+        anteriores. Sólo se devuelven los primeros
+        ``IMPORT_MAX_REPORTED_ERRORS`` errores por fila.
+        """
+        progress = {"import_id": uuid.uuid4().hex, "rows": 0, "inserted": 0, "skipped": 0}
+        report: list[dict[str, Any]] = []
+        while (batch := await asyncio.to_thread(next, batches, None)) is not None:
+            rows, skipped = batch
+            progress["rows"] += len(rows) + len(skipped)
+            try:
+                progress["inserted"] += await self.write_import_rows(db, rows, skipped)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+            progress["skipped"] += len(skipped)
+            report.extend(skipped[: IMPORT_MAX_REPORTED_ERRORS - len(report)])
+            await self._broadcast({"event": "IMPORT_PROGRESS", **progress})
+        await self._broadcast({"event": "IMPORT", **progress})
+        report.sort(key=lambda error: error["row"])
+        return {**progress, "skipped": report, "skipped_total": progress["skipped"]}
+
     async def update_item(self, db: AsyncSession, lot_number: str, data: ItemUpdate) -> InventoryItem:
         stmt = (
             update(InventoryItem)
@@ -48,21 +247,69 @@ class InventoryService:  # pylint: disable=too-few-public-methods
         return item
 
     async def delete_item(self, db: AsyncSession, lot_number: str) -> None:
+        """Borra el ítem y cierra su saldo en el libro con un ``AJUSTE``.
+
+        El libro del lote se conserva: las consultas de stock a fechas
+        anteriores siguen viéndolo y, si el lote se da de alta de nuevo, sólo
+        cuentan sus movimientos nuevos.
+        """
+        # bloquea el lote: ningún consumo se cuela entre el saldo y el cierre
+        item = await db.get(InventoryItem, lot_number, with_for_update=True)
+        if item is None:
+            await db.rollback()
+            return
+        tx = InventoryTransaction
+        balance_select = select(func.coalesce(func.sum(tx.quantity_delta), 0)).where(tx.lot_number == lot_number)
+        balance = (await db.execute(balance_select)).scalar_one()
+        if balance:
+            db.add(InventoryTransaction(lot_number=lot_number, event_type="AJUSTE", quantity_delta=-balance))
         await db.execute(delete(InventoryItem).where(InventoryItem.lot_number == lot_number))
         await db.commit()
         await self._broadcast({"event": "DELETE", "lot_number": lot_number})
 
     # ------------------ Transacciones ------------------
-    async def get_transactions(self, db: AsyncSession, lot_number: str):
-        res = await db.execute(
-            select(InventoryTransaction).where(InventoryTransaction.lot_number == lot_number).order_by(
-                InventoryTransaction.timestamp.desc()
-            )
-        )
-        return res.scalars().all()
+    async def get_transactions(
+        self,
+        db: AsyncSession,
+        lot_number: str | None = None,
+        *,
+        limit: int = LEDGER_PAGE_SIZE,
+        cursor: str | None = None,
+        **filters: Any,
+    ) -> tuple[List[InventoryTransaction], str | None]:
+        """Página del libro de movimientos, del más reciente al más antiguo.
+
+        Paginación por clave sobre ``(timestamp, id)``: devuelve como mucho
+        ``limit`` movimientos y el cursor de la página siguiente (``None`` si
+        no hay más). ``filters`` admite ``event_type``, ``batch_id``,
+        ``start`` y ``end``. ``ValueError`` si el cursor no es válido.
+        """
+        stmt = _ledger_select(select(InventoryTransaction), lot_number, limit, cursor, **filters)
+        res = await db.execute(stmt)
+        return page(res.scalars().all(), limit, lambda tx: (tx.timestamp, tx.id))
+
+    async def transaction_rows(
+        self,
+        db: AsyncSession,
+        lot_number: str | None = None,
+        *,
+        limit: int = LEDGER_PAGE_SIZE,
+        cursor: str | None = None,
+        columns: tuple[str, ...] = TRANSACTION_COLUMNS,
+        **filters: Any,
+    ) -> tuple[list[tuple], str | None]:
+        """Como :meth:`get_transactions`, en tuplas de ``columns``."""
+        selected = [
+            cast(InventoryTransaction.id, BigInteger).label("id") if column == "id"
+            else getattr(InventoryTransaction, column)
+            for column in columns
+        ]
+        stmt = _ledger_select(select(*selected), lot_number, limit, cursor, **filters)
+        res = await db.execute(stmt)
+        return page(res.all(), limit, lambda row: (row.timestamp, row.id))
 
     async def consume(self, db: AsyncSession, lot_number: str, qty: Decimal, batch_id: str | None = None):
-        item = await db.get(InventoryItem, lot_number)
+        item = await db.get(InventoryItem, lot_number, with_for_update=True)
         if not item:
             raise ValueError("Item not found")
         if item.quantity_available - qty < 0:
@@ -76,15 +323,209 @@ class InventoryService:  # pylint: disable=too-few-public-methods
         await db.commit()
         await self._broadcast({"event": "CONSUMO", "lot_number": lot_number, "delta": str(-qty)})
 
-    # ------------------ WS broadcast ------------------
-    async def register_ws(self) -> asyncio.Queue:
-        q: asyncio.Queue = asyncio.Queue()
-        self._listeners.append(q)
-        return q
+    async def consume_batch(
+        self,
+        db: AsyncSession,
+        lines: Sequence[ConsumptionLine],
+        batch_id: str | None = None,
+        user: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """Consume una lista de materiales repartiendo cada ingrediente entre lotes FEFO.
+
+        Cada línea se sirve de los lotes con ese nombre (y categoría/unidad si
+        se indican), del que caduca antes al que caduca después (sin caducidad
+        al final). Los lotes candidatos se bloquean en una sola consulta con
+        ``FOR UPDATE SKIP LOCKED``: los que está consumiendo otra sesión se
+        saltan en lugar de esperar. Todo se escribe en una transacción; si
+        alguna línea no se cubre con el stock libre no se consume nada y se
+        lanza ``ValueError``. Devuelve las asignaciones por lote.
+        """
+        item = InventoryItem
+        stmt = (
+            select(item.lot_number, item.name, item.category, item.unit, item.quantity_available, item.expiry_date)
+            .where(or_(*(_line_filter(line) for line in lines)), item.quantity_available > 0)
+            .order_by(item.expiry_date.asc().nulls_last(), item.created_at, item.lot_number)
+            .with_for_update(skip_locked=True)
+        )
+        try:
+            lots = (await db.execute(stmt)).all()
+            remaining = {lot.lot_number: lot.quantity_available for lot in lots}
+            allocations: list[dict[str, Any]] = []
+            for line in lines:
+                needed = line.quantity
+                for lot in lots:
+                    if needed <= 0:
+                        break
+                    if not _line_matches(line, lot) or remaining[lot.lot_number] <= 0:
+                        continue
+                    taken = min(needed, remaining[lot.lot_number])
+                    remaining[lot.lot_number] -= taken
+                    needed -= taken
+                    allocations.append(
+                        {
+                            "name": lot.name,
+                            "lot_number": lot.lot_number,
+                            "quantity": taken,
+                            "expiry_date": lot.expiry_date,
+                        }
+                    )
+                if needed > 0:
+                    raise ValueError(f"Stock libre insuficiente de {line.name}: faltan {needed}")
 
+            consumed: dict[str, Decimal] = {}
+            for allocation in allocations:
+                lot_number = allocation["lot_number"]
+                consumed[lot_number] = consumed.get(lot_number, Decimal(0)) + allocation["quantity"]
+            table = item.__table__
+            await db.execute(
+                update(table)
+                .where(table.c.lot_number == bindparam("b_lot_number"))
+                .values(quantity_available=table.c.quantity_available - bindparam("b_quantity")),
+                [{"b_lot_number": lot_number, "b_quantity": qty} for lot_number, qty in consumed.items()],
+            )
+            now = dt.datetime.now(dt.timezone.utc)
+            await db.execute(
+                insert(InventoryTransaction).values(
+                    [
+                        {
+                            "lot_number": allocation["lot_number"],
+                            "event_type": "CONSUMO",
+                            "quantity_delta": -allocation["quantity"],
+                            "batch_id": batch_id,
+                            "user": user,
+                            "timestamp": now,
+                        }
+                        for allocation in allocations
+                    ]
+                )
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        for lot_number, qty in consumed.items():
+            await self._broadcast({"event": "CONSUMO", "lot_number": lot_number, "delta": str(-qty)})
+        return allocations
+
+    # ------------------ WS broadcast ------------------
     async def _broadcast(self, msg: dict) -> None:
-        for q in self._listeners:
-            await q.put(msg)
+        await inventory_events.publish(msg)
+
+
+def _line_filter(line: ConsumptionLine) -> Any:
+    conditions = [InventoryItem.name == line.name]
+    if line.category is not None:
+        conditions.append(InventoryItem.category == line.category)
+    if line.unit is not None:
+        conditions.append(InventoryItem.unit == line.unit)
+    return and_(*conditions)
+
+
+def _line_matches(line: ConsumptionLine, lot: Any) -> bool:
+    return (
+        lot.name == line.name
+        and (line.category is None or lot.category == line.category)
+        and (line.unit is None or lot.unit == line.unit)
+    )
+
+
+def _items_select(
+    stmt: Select,
+    limit: int,
+    cursor: str | None,
+    sort: str,
+    descending: bool,
+    category: str | None = None,
+    location: str | None = None,
+    supplier: str | None = None,
+    expiry_from: dt.date | None = None,
+    expiry_to: dt.date | None = None,
+    low_stock: bool = False,
+) -> Select:
+    """Filtros, orden ``(sort, lot_number)`` (nulos al final) y ``limit + 1`` filas."""
+    item = InventoryItem
+    if category is not None:
+        stmt = stmt.where(item.category == category)
+    if location is not None:
+        stmt = stmt.where(item.location == location)
+    if supplier is not None:
+        stmt = stmt.where(item.supplier == supplier)
+    if expiry_from is not None:
+        stmt = stmt.where(item.expiry_date >= expiry_from)
+    if expiry_to is not None:
+        stmt = stmt.where(item.expiry_date <= expiry_to)
+    if low_stock:
+        stmt = stmt.where(item.quantity_available <= item.safety_stock)
+
+    column = getattr(item, sort)
+    lot = item.lot_number
+    after = (lambda col, value: col < value) if descending else (lambda col, value: col > value)
+    if cursor is not None:
+        value, last_lot = decode_cursor(cursor, 2)
+        if not isinstance(last_lot, str):
+            raise ValueError("Cursor no válido")
+        if sort == "lot_number":
+            stmt = stmt.where(after(lot, last_lot))
+        elif value is None:
+            # ya en la cola de nulos: sólo quedan nulos con lote posterior
+            stmt = stmt.where(column.is_(None), after(lot, last_lot))
+        else:
+            # comparación de filas: el índice (columna, lot_number) arranca en el cursor
+            following = after(tuple_(column, lot), tuple_(_cursor_value(column, value), last_lot))
+            if column.nullable:
+                # tras los valores no nulos viene la cola de nulos
+                following = or_(following, column.is_(None))
+            stmt = stmt.where(following)
+    direction = (lambda col: col.desc()) if descending else (lambda col: col.asc())
+    order = [direction(lot)] if sort == "lot_number" else [direction(column).nulls_last(), direction(lot)]
+    return stmt.order_by(*order).limit(limit + 1)
+
+
+def _cursor_value(column: Any, value: Any) -> Any:
+    """Valor del cursor (JSON) convertido al tipo de la columna."""
+    python_type = column.type.python_type
+    try:
+        if python_type is dt.datetime:
+            return dt.datetime.fromisoformat(value)
+        if python_type is dt.date:
+            return dt.date.fromisoformat(value)
+        if python_type is Decimal:
+            return Decimal(value)
+    except (TypeError, ValueError, ArithmeticError) as err:
+        raise ValueError("Cursor no válido") from err
+    return str(value)
+
+
+def _ledger_select(
+    stmt: Select,
+    lot_number: str | None,
+    limit: int,
+    cursor: str | None,
+    event_type: str | None = None,
+    batch_id: str | None = None,
+    start: dt.datetime | None = None,
+    end: dt.datetime | None = None,
+) -> Select:
+    """Filtros, orden ``(timestamp, id) DESC`` y ``limit + 1`` filas para saber si hay más."""
+    tx = InventoryTransaction
+    if lot_number is not None:
+        stmt = stmt.where(tx.lot_number == lot_number)
+    if event_type is not None:
+        stmt = stmt.where(tx.event_type == event_type)
+    if batch_id is not None:
+        stmt = stmt.where(tx.batch_id == batch_id)
+    if start is not None:
+        stmt = stmt.where(tx.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(tx.timestamp <= end)
+    if cursor is not None:
+        timestamp, tx_id = decode_cursor(cursor, 2)
+        try:
+            key = (dt.datetime.fromisoformat(timestamp), Decimal(tx_id))
+        except (TypeError, ValueError, ArithmeticError) as err:
+            raise ValueError("Cursor no válido") from err
+        stmt = stmt.where(tuple_(tx.timestamp, tx.id) < tuple_(*key))
+    return stmt.order_by(tx.timestamp.desc(), tx.id.desc()).limit(limit + 1)
 
 
 inventory_service = InventoryService()
@@ -0,0 +1,153 @@
+"""Fotos periódicas de saldos por lote y consultas de stock a una fecha.
+
+Una tarea en segundo plano guarda cada ``INVENTORY_SNAPSHOT_SECONDS`` el saldo
+de cada lote según ``inventory_transactions``. Cada foto se calcula a partir
+de la anterior más los movimientos posteriores, y el stock a una fecha parte
+de la última foto anterior a esa fecha y suma sólo los movimientos desde
+entonces: el coste es O(lotes + movimientos recientes) en lugar de recorrer
+todo el libro.
+
+Las fotos se toman ``SNAPSHOT_SETTLE_SECONDS`` por detrás del reloj para no
+dejar fuera movimientos con marca de tiempo anterior que aún no se han
+confirmado. Con varios workers, un *advisory lock* evita fotos duplicadas.
+
+El libro es la única fuente: al borrar un lote se cierra su saldo con un
+``AJUSTE`` y sus movimientos se conservan.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+from typing import Any
+
+from sqlalchemy import BigInteger, Select, func, insert, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db.session import AsyncSessionLocal
+from app.inventory.models import InventorySnapshot, InventorySnapshotBalance, InventoryTransaction
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+SNAPSHOT_SETTLE_SECONDS = 300
+# Cada cuánto se comprueba si toca una foto nueva (segundos)
+SNAPSHOT_CHECK_SECONDS = 600
+# Clave de pg_try_advisory_xact_lock para serializar las fotos entre workers
+SNAPSHOT_LOCK_KEY = 0x494E5653
+
+
+async def latest_snapshot(db: AsyncSession, at: dt.datetime | None = None) -> InventorySnapshot | None:
+    """Última foto tomada en ``at`` o antes (la más reciente si ``at`` es ``None``)."""
+    stmt = select(InventorySnapshot).order_by(InventorySnapshot.taken_at.desc()).limit(1)
+    if at is not None:
+        stmt = stmt.where(InventorySnapshot.taken_at <= at)
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+
+async def take_snapshot(db: AsyncSession, taken_at: dt.datetime) -> InventorySnapshot | None:
+    """Guarda los saldos hasta ``taken_at`` y confirma.
+
+    Devuelve ``None`` sin escribir si otro worker está tomando una foto o si
+    ya hay una igual o posterior.
+    """
+    locked = (await db.execute(select(func.pg_try_advisory_xact_lock(SNAPSHOT_LOCK_KEY)))).scalar()
+    previous = await latest_snapshot(db) if locked else None
+    if not locked or (previous is not None and previous.taken_at >= taken_at):
+        await db.rollback()
+        return None
+    snapshot = InventorySnapshot(taken_at=taken_at, created_at=dt.datetime.now(dt.timezone.utc))
+    db.add(snapshot)
+    await db.flush()
+    balances = _balances_select(previous, taken_at).subquery()
+    await db.execute(
+        insert(InventorySnapshotBalance).from_select(
+            ["snapshot_id", "lot_number", "quantity"],
+            select(literal(snapshot.id, BigInteger), balances.c.lot_number, balances.c.quantity),
+        )
+    )
+    await db.commit()
+    return snapshot
+
+
+async def stock_as_of(
+    db: AsyncSession, at: dt.datetime, lot_number: str | None = None
+) -> tuple[InventorySnapshot | None, list[Any]]:
+    """Saldos no nulos por lote en ``at``: (foto de partida, filas ``(lot_number, quantity)``)."""
+    snapshot = await latest_snapshot(db, at)
+    stmt = _balances_select(snapshot, at, lot_number)
+    rows = (await db.execute(stmt.order_by(stmt.selected_columns.lot_number))).all()
+    return snapshot, rows
+
+
+def _balances_select(
+    snapshot: InventorySnapshot | None, until: dt.datetime, lot_number: str | None = None
+) -> Select:
+    """Saldos de ``snapshot`` más los movimientos en ``(snapshot.taken_at, until]``."""
+    tx = InventoryTransaction
+    deltas = select(tx.lot_number, tx.quantity_delta.label("quantity")).where(
+        tx.lot_number.is_not(None), tx.timestamp <= until
+    )
+    if lot_number is not None:
+        deltas = deltas.where(tx.lot_number == lot_number)
+    if snapshot is None:
+        movements = deltas.subquery()
+    else:
+        base = select(InventorySnapshotBalance.lot_number, InventorySnapshotBalance.quantity).where(
+            InventorySnapshotBalance.snapshot_id == snapshot.id
+        )
+        if lot_number is not None:
+            base = base.where(InventorySnapshotBalance.lot_number == lot_number)
+        movements = union_all(base, deltas.where(tx.timestamp > snapshot.taken_at)).subquery()
+    total = func.sum(movements.c.quantity)
+    return (
+        select(movements.c.lot_number, total.label("quantity"))
+        .group_by(movements.c.lot_number)
+        .having(total != 0)
+    )
+
+
+class InventorySnapshotScheduler:
+    """Toma una foto cuando la última tiene más de ``interval_seconds``."""
+
+    def __init__(self, interval_seconds: int) -> None:
+        self.interval_seconds = interval_seconds
+        self._task: asyncio.Task | None = None
+
+    async def run_once(self, db: AsyncSession) -> InventorySnapshot | None:
+        taken_at = dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=SNAPSHOT_SETTLE_SECONDS)
+        latest = await latest_snapshot(db)
+        if latest is not None and (taken_at - latest.taken_at).total_seconds() < self.interval_seconds:
+            return None
+        snapshot = await take_snapshot(db, taken_at)
+        if snapshot is not None:
+            logger.info("Foto de inventario tomada a %s", taken_at.isoformat())
+        return snapshot
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.run_once(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - se reintenta en el siguiente ciclo
+                logger.exception("Error tomando la foto de inventario")
+            await asyncio.sleep(min(self.interval_seconds, SNAPSHOT_CHECK_SECONDS))
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever(), name="inventory-snapshots")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+snapshot_scheduler = InventorySnapshotScheduler(settings.inventory_snapshot_seconds)
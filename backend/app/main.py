@@ -5,10 +5,25 @@ Este archivo define la aplicación FastAPI y registra las rutas principales.
 Toda la documentación y comentarios están en español técnico.
 """
 
+import asyncio
+from functools import partial
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.core.config import get_settings
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.inventory.events import inventory_events
+from app.inventory.snapshots import snapshot_scheduler
 from app.routers import routers as app_routers
+from app.services.alarms import alarm_engine
+from app.services.fermentation_service import fermentation_service
+from app.services.leader import leader_election
+from app.services.mqtt import mqtt_manager
+from app.services.partition_manager import partition_manager
+from app.services.profiles import profile_scheduler
+
+settings = get_settings()
 
 # Creamos la instancia principal de FastAPI
 app = FastAPI(
@@ -24,6 +39,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Incluimos todos los routers declarados
@@ -31,4 +47,48 @@ for rtr in app_routers:
     app.include_router(rtr, prefix="/api")
 
 
+@app.on_event("startup")
+async def start_background_tasks() -> None:
+    """Arranca las tareas de mantenimiento en segundo plano.
+
+    En modo ``embedded`` la ingesta MQTT de fermentación corre dentro de la
+    API, que entonces debe tener un único worker; en modo ``external`` la
+    persisten los workers de :mod:`app.services.ingestion_worker` y la API
+    sólo escucha para la caché en memoria y el stream en vivo.
+
+    Con varios workers las tareas únicas del despliegue (particiones, fotos
+    de inventario, publicación de alarmas y consignas) sólo corren en el
+    líder (:mod:`app.services.leader`).
+    """
+    if settings.ingestion_mode == "embedded" and settings.api_workers > 1:
+        raise RuntimeError(
+            f"INGESTION_MODE=embedded con WEB_CONCURRENCY={settings.api_workers}: cada worker "
+            "persistiría todas las lecturas; usar INGESTION_MODE=external o un único worker"
+        )
+    leader_election.add_job(partition_manager.start, partition_manager.stop)
+    leader_election.add_job(snapshot_scheduler.start, snapshot_scheduler.stop)
+    leader_election.add_job(
+        partial(alarm_engine.set_publishing, True), partial(alarm_engine.set_publishing, False)
+    )
+    leader_election.add_job(
+        partial(profile_scheduler.set_publishing, True), partial(profile_scheduler.set_publishing, False)
+    )
+    leader_election.start()
+    alarm_engine.start()
+    profile_scheduler.start()
+    inventory_events.start()
+    fermentation_service.setup(persist=settings.ingestion_mode == "embedded")
+    app.state.mqtt_task = asyncio.create_task(mqtt_manager.run_forever())
+
 
+@app.on_event("shutdown")
+async def stop_background_tasks() -> None:
+    """Detiene las tareas en segundo plano."""
+    # al dejar de ser líder se detienen también sus tareas
+    await leader_election.stop()
+    await alarm_engine.stop()
+    await profile_scheduler.stop()
+    await inventory_events.stop()
+    mqtt_task = getattr(app.state, "mqtt_task", None)
+    if mqtt_task is not None:
+        mqtt_task.cancel()
@@ -4,7 +4,7 @@ from __future__ import annotations
 import datetime as dt
 from typing import Optional
 
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import JSON, BigInteger, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -19,21 +19,181 @@ class FermentationTank(Base):
     id: str = Column(String, primary_key=True, index=True)
     name: str = Column(String, nullable=False)
     profile: Optional[str] = Column(String, nullable=True)
+    # inicio de la ejecución del perfil asignado (lo fija assign_profile)
+    profile_started_at: Optional[dt.datetime] = Column(DateTime(timezone=True), nullable=True)
 
-    readings = relationship("FermentationReading", back_populates="tank", cascade="all,delete", lazy="selectin")
+    # el histórico nunca se carga a través de la relación (crece sin límite):
+    # se consulta con sentencias acotadas y el borrado lo resuelve la BD
+    readings = relationship(
+        "FermentationReading", back_populates="tank", cascade="all,delete", lazy="raise", passive_deletes=True
+    )
 
 
 class FermentationReading(Base):
-    """Lectura instantánea ligada a un tanque."""
+    """Lectura instantánea ligada a un tanque.
+
+    La tabla está particionada por rango de ``timestamp`` (una partición por
+    día UTC); las particiones las crea y retira
+    :mod:`app.services.partition_manager`. La clave primaria incluye
+    ``timestamp`` porque PostgreSQL exige la clave de partición en ella.
+    """
 
     __tablename__ = "fermentation_readings"
+    __table_args__ = (
+        Index("ix_fermentation_readings_tank_id_timestamp", "tank_id", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
-    id: int = Column(Integer, primary_key=True, autoincrement=True)
-    tank_id: str = Column(String, ForeignKey("fermentation_tanks.id"), index=True)
-    timestamp: dt.datetime = Column(DateTime(timezone=True), default=dt.datetime.utcnow, index=True)
+    id: int = Column(BigInteger, primary_key=True, autoincrement=True)
+    tank_id: str = Column(String, ForeignKey("fermentation_tanks.id", ondelete="CASCADE"), nullable=False)
+    timestamp: dt.datetime = Column(DateTime(timezone=True), primary_key=True, default=dt.datetime.utcnow)
 
     temperature: float = Column(Float)
     pressure: float = Column(Float)
     co2: float = Column(Float)
 
     tank = relationship("FermentationTank", back_populates="readings")
+
+
+class FermentationLatestReading(Base):
+    """Última lectura de cada tanque.
+
+    La mantiene la ingesta con un *upsert* en la misma transacción que las
+    lecturas, de modo que la vista general de tanques no toca el histórico.
+    """
+
+    __tablename__ = "fermentation_latest_readings"
+
+    tank_id: str = Column(String, ForeignKey("fermentation_tanks.id", ondelete="CASCADE"), primary_key=True)
+    timestamp: dt.datetime = Column(DateTime(timezone=True), nullable=False)
+
+    temperature: float = Column(Float)
+    pressure: float = Column(Float)
+    co2: float = Column(Float)
+
+
+class FermentationSpoolCheckpoint(Base):
+    """Posición del spool de ingesta hasta la que se han persistido lecturas.
+
+    El drenador la actualiza en la misma transacción que las lecturas y sus
+    agregados; así un lote confirmado en BD pero no en el checkpoint local
+    (caída entre ambos) no se vuelve a escribir.
+    """
+
+    __tablename__ = "fermentation_spool_checkpoints"
+
+    spool_id: str = Column(String, primary_key=True)
+    segment: int = Column(BigInteger, nullable=False)
+    offset: int = Column(BigInteger, nullable=False)
+    updated_at: dt.datetime = Column(DateTime(timezone=True), nullable=False, default=dt.datetime.utcnow)
+
+
+class FermentationProfile(Base):
+    """Perfil de fermentación: secuencia de rampas y mesetas de consigna.
+
+    ``steps`` es una lista de ``{"kind": "ramp" | "hold", "hours": float,
+    "temperature": float, "pressure": float | None, "label": str | None}``;
+    una rampa va linealmente desde la consigna anterior hasta la suya y una
+    meseta (p. ej. reposo de diacetilo) la mantiene durante ``hours``.
+    """
+
+    __tablename__ = "fermentation_profiles"
+
+    name: str = Column(String, primary_key=True)
+    description: Optional[str] = Column(String, nullable=True)
+    steps: list = Column(JSON, nullable=False)
+
+
+class FermentationScheduleVersion(Base):
+    """Versión de los perfiles y sus asignaciones (una sola fila, ``id = 1``).
+
+    Se incrementa en la misma transacción que cada cambio; los planificadores
+    de todos los procesos la consultan y recargan cuando avanza.
+    """
+
+    __tablename__ = "fermentation_schedule_version"
+
+    id: int = Column(Integer, primary_key=True)
+    version: int = Column(BigInteger, nullable=False, default=0)
+
+
+# Resoluciones (segundos) de los agregados mantenidos por la ingesta
+ROLLUP_RESOLUTIONS = (60, 900, 3600)
+
+
+class FermentationRollup(Base):
+    """Agregado por intervalo (1 min, 15 min, 1 h) de las lecturas de un tanque.
+
+    ``bucket`` es el inicio del intervalo (alineado a UTC) y ``count`` el
+    número de lecturas agregadas; por variable se guardan min, max, media y
+    último valor.
+    """
+
+    __tablename__ = "fermentation_rollups"
+
+    tank_id: str = Column(String, ForeignKey("fermentation_tanks.id"), primary_key=True)
+    resolution: int = Column(Integer, primary_key=True)
+    bucket: dt.datetime = Column(DateTime(timezone=True), primary_key=True)
+    count: int = Column(Integer, nullable=False)
+
+    temperature_min: float = Column(Float)
+    temperature_max: float = Column(Float)
+    temperature_mean: float = Column(Float)
+    temperature_last: float = Column(Float)
+
+    pressure_min: float = Column(Float)
+    pressure_max: float = Column(Float)
+    pressure_mean: float = Column(Float)
+    pressure_last: float = Column(Float)
+
+    co2_min: float = Column(Float)
+    co2_max: float = Column(Float)
+    co2_mean: float = Column(Float)
+    co2_last: float = Column(Float)
+
+
+# Tipos de regla de alarma: umbral alto/bajo, velocidad de cambio (unidades/min)
+# y sensor sin datos (segundos desde la última lectura)
+ALARM_KINDS = ("high", "low", "rate", "stale")
+
+
+class AlarmRule(Base):
+    """Regla de alarma de proceso para una variable de un tanque.
+
+    ``limit`` se interpreta según ``kind`` y ``deadband`` es la histéresis:
+    una alarma activa sólo se normaliza cuando la medida vuelve ``deadband``
+    por dentro del límite.
+    """
+
+    __tablename__ = "fermentation_alarm_rules"
+
+    id: int = Column(Integer, primary_key=True, autoincrement=True)
+    tank_id: str = Column(
+        String, ForeignKey("fermentation_tanks.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    variable: str = Column(String, nullable=False)
+    kind: str = Column(String, nullable=False)
+    limit: float = Column(Float, nullable=False)
+    deadband: float = Column(Float, nullable=False, default=0.0)
+    severity: str = Column(String, nullable=False, default="warning")
+    enabled: bool = Column(Boolean, nullable=False, default=True)
+
+
+class AlarmEvent(Base):
+    """Transición de una alarma (``raised`` o ``cleared``)."""
+
+    __tablename__ = "fermentation_alarm_events"
+    __table_args__ = (Index("ix_fermentation_alarm_events_tank_id_timestamp", "tank_id", "timestamp"),)
+
+    id: int = Column(BigInteger, primary_key=True, autoincrement=True)
+    rule_id: int = Column(
+        Integer, ForeignKey("fermentation_alarm_rules.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    tank_id: str = Column(String, nullable=False)
+    variable: str = Column(String, nullable=False)
+    kind: str = Column(String, nullable=False)
+    state: str = Column(String, nullable=False)
+    value: Optional[float] = Column(Float, nullable=True)
+    limit: float = Column(Float, nullable=False)
+    severity: str = Column(String, nullable=False)
+    timestamp: dt.datetime = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,120 @@
+"""Rutas REST de reglas y eventos de alarma de fermentación."""
+from __future__ import annotations
+
+import datetime as dt
+from typing import Any, List
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import get_db
+from app.models.fermentation import ALARM_KINDS, AlarmEvent, AlarmRule, FermentationTank
+from app.services.alarms import alarm_engine
+from app.services.hot_cache import COLUMNS
+
+router = APIRouter(prefix="/alarms", tags=["Alarms"])
+
+
+class AlarmRuleIn(BaseModel):
+    tank_id: str
+    variable: str = Field(..., pattern=f"^({'|'.join(COLUMNS)})$")
+    kind: str = Field(
+        ..., pattern=f"^({'|'.join(ALARM_KINDS)})$", description="high | low | rate (unid./min) | stale (s)"
+    )
+    limit: float
+    deadband: float = Field(0.0, ge=0, description="Histéresis para normalizar la alarma")
+    severity: str = "warning"
+    enabled: bool = True
+
+
+class AlarmRuleDTO(AlarmRuleIn):
+    id: int
+
+    class Config:  # noqa: D401
+        orm_mode = True
+
+
+class AlarmEventDTO(BaseModel):
+    id: int
+    rule_id: int
+    tank_id: str
+    variable: str
+    kind: str
+    state: str
+    value: float | None = None
+    limit: float
+    severity: str
+    timestamp: dt.datetime
+
+    class Config:  # noqa: D401
+        orm_mode = True
+
+
+async def _reload(db: AsyncSession) -> None:
+    await alarm_engine.load_rules(db)
+
+
+@router.get("/rules", response_model=List[AlarmRuleDTO], summary="Lista reglas de alarma")
+async def list_rules(tank_id: str | None = None, db: AsyncSession = Depends(get_db)) -> List[AlarmRule]:
+    stmt = select(AlarmRule).order_by(AlarmRule.id)
+    if tank_id is not None:
+        stmt = stmt.where(AlarmRule.tank_id == tank_id)
+    return (await db.execute(stmt)).scalars().all()
+
+
+@router.post("/rules", response_model=AlarmRuleDTO, status_code=201, summary="Crear regla de alarma")
+async def create_rule(data: AlarmRuleIn, db: AsyncSession = Depends(get_db)) -> AlarmRule:
+    if await db.get(FermentationTank, data.tank_id) is None:
+        raise HTTPException(status_code=404, detail="Tanque no encontrado")
+    rule = AlarmRule(**data.dict())
+    db.add(rule)
+    await db.commit()
+    await db.refresh(rule)
+    await _reload(db)
+    return rule
+
+
+@router.put("/rules/{rule_id}", response_model=AlarmRuleDTO, summary="Actualizar regla de alarma")
+async def update_rule(
+    data: AlarmRuleIn,
+    rule_id: int = Path(..., description="ID de la regla"),
+    db: AsyncSession = Depends(get_db),
+) -> AlarmRule:
+    rule = await db.get(AlarmRule, rule_id)
+    if rule is None:
+        raise HTTPException(status_code=404, detail="Regla no encontrada")
+    for key, value in data.dict().items():
+        setattr(rule, key, value)
+    await db.commit()
+    await _reload(db)
+    return rule
+
+
+@router.delete("/rules/{rule_id}", status_code=204, summary="Eliminar regla de alarma")
+async def delete_rule(rule_id: int = Path(..., description="ID de la regla"), db: AsyncSession = Depends(get_db)):
+    rule = await db.get(AlarmRule, rule_id)
+    if rule is None:
+        raise HTTPException(status_code=404, detail="Regla no encontrada")
+    await db.delete(rule)
+    await db.commit()
+    await _reload(db)
+
+
+@router.get("/active", summary="Alarmas activas")
+async def active_alarms() -> List[dict[str, Any]]:
+    """Estado en memoria del motor: alarmas levantadas y no normalizadas."""
+    return alarm_engine.active()
+
+
+@router.get("/events", response_model=List[AlarmEventDTO], summary="Histórico de eventos de alarma")
+async def list_events(
+    tank_id: str | None = None,
+    limit: int = Query(200, ge=1, le=5000),
+    db: AsyncSession = Depends(get_db),
+) -> List[AlarmEvent]:
+    stmt = select(AlarmEvent).order_by(AlarmEvent.timestamp.desc(), AlarmEvent.id.desc()).limit(limit)
+    if tank_id is not None:
+        stmt = stmt.where(AlarmEvent.tank_id == tank_id)
+    return (await db.execute(stmt)).scalars().all()
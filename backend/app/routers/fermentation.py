@@ -1,14 +1,26 @@
 """Rutas REST del subsistema de fermentación."""
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, Path
+import asyncio
+import datetime as dt
+import logging
+from typing import Any, List
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import get_settings
+from app.core.encoding import encode, negotiate
 from app.db.session import get_db
-from app.models.fermentation import FermentationReading, FermentationTank
-from app.services.fermentation_service import fermentation_service
-from pydantic import BaseModel, Field
-from typing import List
+from app.models.fermentation import FermentationProfile
+from app.services.fermentation_service import BULK_HISTORY_MAX_TANKS, fermentation_service
+from app.services.live_telemetry import LiveClient, live_hub
+from app.services.profiles import STEP_KINDS, CompiledProfile, profile_scheduler
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
 
 router = APIRouter(prefix="/fermentation", tags=["Fermentation"])
 
@@ -17,15 +29,40 @@ class TankDTO(BaseModel):
     id: str
     name: str
     profile: str | None = None
+    profile_started_at: dt.datetime | None = None
 
     class Config:  # noqa: D401
         orm_mode = True
 
 
+class TankOverviewDTO(TankDTO):
+    last_seen: dt.datetime | None = None
+    temperature: float | None = None
+    pressure: float | None = None
+    co2: float | None = None
+
+
 class ProfileAssignment(BaseModel):
     profile_name: str = Field(..., description="Nombre del perfil de fermentación")
 
 
+class ProfileStepDTO(BaseModel):
+    kind: str = Field(..., pattern=f"^({'|'.join(STEP_KINDS)})$", description="ramp | hold")
+    hours: float = Field(..., gt=0)
+    temperature: float
+    pressure: float | None = Field(None, description="Sin valor mantiene la presión anterior")
+    label: str | None = Field(None, description="Etiqueta del paso (p. ej. reposo de diacetilo)")
+
+
+class ProfileDTO(BaseModel):
+    name: str
+    description: str | None = None
+    steps: List[ProfileStepDTO] = Field(..., min_length=1)
+
+    class Config:  # noqa: D401
+        orm_mode = True
+
+
 class ReadingDTO(BaseModel):
     timestamp: str
     temperature: float
@@ -43,6 +80,12 @@ async def list_tanks(db: AsyncSession = Depends(get_db)) -> List[TankDTO]:
     return tanks
 
 
+@router.get("/tanks/overview", response_model=List[TankOverviewDTO], summary="Vista general de tanques")
+async def tanks_overview(db: AsyncSession = Depends(get_db)) -> List[dict[str, Any]]:
+    """Cada tanque con su última lectura y la hora en que se recibió."""
+    return await fermentation_service.tanks_overview(db)
+
+
 @router.post(
     "/tanks/{tank_id}/profile",
     summary="Asignar perfil a tanque",
@@ -57,16 +100,205 @@ async def assign_profile(
     return {"detail": "Profile assigned"}
 
 
+@router.get("/profiles", response_model=List[ProfileDTO], summary="Lista perfiles de fermentación")
+async def list_profiles(db: AsyncSession = Depends(get_db)) -> List[FermentationProfile]:
+    result = await db.execute(select(FermentationProfile).order_by(FermentationProfile.name))
+    return result.scalars().all()
+
+
+@router.get("/profiles/scheduler", summary="Estado del planificador de consignas")
+async def scheduler_stats() -> dict[str, Any]:
+    """Tanques planificados, ticks perdidos, *jitter* y coste de cálculo por tick."""
+    return profile_scheduler.stats()
+
+
+@router.put("/profiles/{name}", response_model=ProfileDTO, summary="Crear o reemplazar un perfil")
+async def put_profile(
+    data: ProfileDTO,
+    name: str = Path(..., description="Nombre del perfil"),
+    db: AsyncSession = Depends(get_db),
+) -> FermentationProfile:
+    steps = [step.dict() for step in data.steps]
+    try:
+        CompiledProfile(name, steps)
+    except ValueError as err:
+        raise HTTPException(status_code=422, detail=str(err)) from err
+    profile = await db.get(FermentationProfile, name)
+    if profile is None:
+        profile = FermentationProfile(name=name)
+        db.add(profile)
+    profile.description = data.description
+    profile.steps = steps
+    await profile_scheduler.touch(db)
+    await db.commit()
+    await profile_scheduler.reload(db)
+    return profile
+
+
+@router.delete("/profiles/{name}", status_code=204, summary="Eliminar un perfil")
+async def delete_profile(name: str = Path(..., description="Nombre del perfil"), db: AsyncSession = Depends(get_db)):
+    profile = await db.get(FermentationProfile, name)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    await db.delete(profile)
+    await profile_scheduler.touch(db)
+    await db.commit()
+    await profile_scheduler.reload(db)
+
+
+@router.get("/tanks/{tank_id}/setpoint", summary="Consigna actual del perfil de un tanque")
+async def get_setpoint(tank_id: str = Path(..., description="ID de tanque")) -> dict[str, Any]:
+    setpoint = profile_scheduler.setpoint(tank_id)
+    if setpoint is None:
+        raise HTTPException(status_code=404, detail="Tanque sin perfil en ejecución")
+    return setpoint._asdict()
+
+
 @router.get(
     "/tanks/{tank_id}/history",
     response_model=List[ReadingDTO],
     summary="Histórico de lecturas de un tanque",
 )
 async def get_history(
+    request: Request,
     tank_id: str = Path(..., description="ID de tanque"),
+    start: dt.datetime | None = Query(None, alias="from", description="Inicio del rango (UTC si no hay zona)"),
+    end: dt.datetime | None = Query(None, alias="to", description="Fin del rango (por defecto ahora)"),
+    max_points: int | None = Query(None, ge=3, le=20000, description="Puntos máximos de la respuesta (LTTB)"),
     db: AsyncSession = Depends(get_db),
 ) -> List[ReadingDTO]:
-    history = await fermentation_service.get_history(db, tank_id)
+    """Sin parámetros devuelve las últimas 2880 lecturas crudas.
+
+    Con ``from``/``to``/``max_points`` la respuesta queda acotada: se lee la
+    resolución adecuada y cada serie se submuestrea con LTTB. Admite
+    codificación rápida (orjson / MessagePack) vía ``Accept``.
+    """
+    history = await fermentation_service.get_history(db, tank_id, start=start, end=end, max_points=max_points)
     if history is None:
         raise HTTPException(status_code=404, detail="Tank not found")
+    encoding = negotiate(request)
+    if encoding is not None:
+        return encode(encoding, history)
     return history
+
+
+@router.get("/history", summary="Histórico columnar de varios tanques")
+async def get_bulk_history(
+    request: Request,
+    tank_ids: str = Query(..., description="IDs de tanque separados por comas"),
+    start: dt.datetime | None = Query(None, alias="from", description="Inicio del rango (UTC si no hay zona)"),
+    end: dt.datetime | None = Query(None, alias="to", description="Fin del rango (por defecto ahora)"),
+    max_points: int = Query(2000, ge=3, le=20000, description="Puntos máximos del eje de tiempo"),
+    db: AsyncSession = Depends(get_db),
+) -> dict[str, Any]:
+    """Una sola consulta para todos los tanques pedidos.
+
+    Respuesta ``{"resolution_seconds", "timestamp": [epoch s...], "tanks":
+    {tank_id: {"temperature": [...], "pressure": [...], "co2": [...]}}}``;
+    todas las series comparten el eje ``timestamp`` y los huecos son ``null``.
+    Admite codificación rápida (orjson / MessagePack) vía ``Accept``.
+    """
+    ids = list(dict.fromkeys(tank.strip() for tank in tank_ids.split(",") if tank.strip()))
+    if not 0 < len(ids) <= BULK_HISTORY_MAX_TANKS:
+        raise HTTPException(status_code=422, detail=f"Se admiten de 1 a {BULK_HISTORY_MAX_TANKS} tanques")
+    history = await fermentation_service.bulk_history(db, ids, start, end, max_points)
+    encoding = negotiate(request)
+    if encoding is not None:
+        return encode(encoding, history)
+    return history
+
+
+@router.get("/tanks/{tank_id}/analytics", summary="Métricas derivadas de un tanque")
+async def get_analytics(
+    tank_id: str = Path(..., description="ID de tanque"),
+    start: dt.datetime | None = Query(None, alias="from", description="Inicio del rango (por defecto, 24 h antes)"),
+    end: dt.datetime | None = Query(None, alias="to", description="Fin del rango (por defecto ahora)"),
+    window: float = Query(3600, gt=0, description="Ventana (s) de medias móviles y tasa de CO₂"),
+    tolerance: float = Query(0.5, ge=0, description="Desviación máxima (°C) respecto al perfil"),
+    max_points: int | None = Query(None, ge=3, le=20000, description="Incluir series con N puntos"),
+    db: AsyncSession = Depends(get_db),
+) -> dict[str, Any]:
+    """Medias móviles, tasa de evolución de CO₂ y, si el tanque tiene perfil,
+    desviación de temperatura y tiempo dentro de especificación."""
+    return await fermentation_service.get_analytics(db, tank_id, start, end, window, tolerance, max_points)
+
+
+@router.get("/analytics-cache", summary="Estado de la caché de analítica")
+async def analytics_cache_stats() -> dict[str, Any]:
+    return fermentation_service.analytics_cache_stats()
+
+
+@router.get("/hot-cache", summary="Estado de la caché de lecturas recientes")
+async def hot_cache_stats() -> dict[str, Any]:
+    """Tanques, muestras y memoria usada (y máxima) por la caché en memoria."""
+    return fermentation_service.hot_cache_stats()
+
+
+@router.get("/spool", summary="Estado del spool local de ingesta")
+async def spool_stats() -> dict[str, Any]:
+    """Posición de lectura/escritura, bytes pendientes de drenar y segmentos descartados."""
+    stats = fermentation_service.spool_stats()
+    return {"enabled": stats is not None, **(stats or {})}
+
+
+# ---------------------- Stream en vivo ----------------------
+
+
+def _live_config(tanks: Any, max_rate: Any) -> tuple[list[str] | None, float]:
+    """Valida la suscripción pedida por el cliente (``tanks=None`` = todos)."""
+    if isinstance(tanks, str):
+        tanks = [tank.strip() for tank in tanks.split(",") if tank.strip()]
+    if tanks is not None and not (isinstance(tanks, list) and all(isinstance(t, str) for t in tanks)):
+        raise ValueError("tanks debe ser una lista de ids de tanque")
+    rate = float(max_rate)
+    if not 0 < rate <= settings.live_max_rate:
+        raise ValueError(f"max_rate debe estar en (0, {settings.live_max_rate}]")
+    return tanks or None, rate
+
+
+async def _live_sender(ws: WebSocket, client: LiveClient) -> None:
+    while True:
+        await ws.send_text(await client.next_message())
+
+
+@router.get("/live", summary="Estado del stream en vivo")
+async def live_stats() -> dict[str, Any]:
+    """Clientes conectados, mensajes enviados y lecturas coalescidas."""
+    return live_hub.stats()
+
+
+@router.websocket("/ws")
+async def ws_telemetry(ws: WebSocket, tanks: str | None = None, max_rate: float = 1.0) -> None:
+    """Telemetría en vivo de los tanques suscritos.
+
+    Parámetros iniciales por query (``?tanks=T1,T2&max_rate=2``); el cliente
+    puede cambiarlos enviando ``{"tanks": [...], "max_rate": 2}``. Cada
+    mensaje es ``{"type": "telemetry", "readings": [...]}`` con la última
+    lectura de cada tanque desde el envío anterior.
+    """
+    await ws.accept()
+    try:
+        client = live_hub.connect(*_live_config(tanks, max_rate))
+    except ValueError as err:
+        await ws.close(code=1008, reason=str(err))
+        return
+    sender = asyncio.create_task(_live_sender(ws, client))
+    try:
+        while True:
+            try:
+                # JSON mal formado (ValueError) o trama binaria (KeyError)
+                request = await ws.receive_json()
+                client.configure(*_live_config(request.get("tanks"), request.get("max_rate", 1.0)))
+            except (AttributeError, KeyError, TypeError, ValueError) as err:
+                await ws.send_json({"type": "error", "detail": str(err)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_hub.disconnect(client)
+        sender.cancel()
+        try:
+            await sender
+        except (asyncio.CancelledError, WebSocketDisconnect):
+            pass
+        except Exception:  # noqa: BLE001 - el envío falla si el socket ya se cerró
+            logger.debug("Envío en vivo terminado con error", exc_info=True)
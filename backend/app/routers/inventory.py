@@ -2,81 +2,125 @@
 from __future__ import annotations
 
 import asyncio
+import datetime as dt
+import logging
+from collections.abc import Awaitable, Callable
 from decimal import Decimal
-from typing import List
+from functools import partial
+from typing import Any, List
 
-from fastapi import APIRouter, Depends, File, HTTPException, Path, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
 from fastapi.responses import StreamingResponse
-import csv
-from io import StringIO
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.session import get_db
-from app.inventory.schemas import ItemCreate, ItemDTO, ItemUpdate, TransactionDTO
-from app.inventory.service import inventory_service
+from app.core.encoding import encode, negotiate, records
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.db.session import AsyncSessionLocal, get_db
+from app.inventory import snapshots
+from app.inventory.events import EventSubscriber, inventory_events
+from app.inventory.exporter import EXPORT_FORMATS, export_stream, format_available
+from app.inventory.models import EVENT_ENUM
+from app.inventory.schemas import (
+    CATEGORY_OPTIONS,
+    ConsumptionDTO,
+    ConsumptionRequest,
+    ItemCreate,
+    ItemDTO,
+    ItemUpdate,
+    LedgerEntryDTO,
+    StockAsOfDTO,
+    TransactionDTO,
+)
+from app.inventory.service import (
+    EXPORT_COLUMNS,
+    ITEM_COLUMNS,
+    ITEM_PAGE_SIZE,
+    ITEM_SORT_FIELDS,
+    LEDGER_COLUMNS,
+    LEDGER_PAGE_SIZE,
+    TRANSACTION_COLUMNS,
+    inventory_service,
+)
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/inventory", tags=["Inventory"])
 
 
 # ---------------------- REST ----------------------
 
 
-@router.get("/export", response_class=StreamingResponse, name="Export inventory as CSV")
-async def export_csv(db: AsyncSession = Depends(get_db)) -> StreamingResponse:  # noqa: D401
-    """Devuelve todo el inventario como archivo CSV."""
-    items = await inventory_service.list_items(db)
-
-    # CSV in memory
-    buffer = StringIO()
-    writer = csv.writer(buffer)
-
-    # Header matches frontend table ordering
-    header = [
-        "lot_number",
-        "name",
-        "category",
-        "quantity_available",
-        "unit",
-        "manufacturer",
-        "location",
-        "expiry_date",
-        "supplier",
-        "safety_stock",
-        "min_order_qty",
-        "package_size",
-        "origin",
-        "cost",
-        "created_at",
-    ]
-    writer.writerow(header)
-    for it in items:
-        writer.writerow([
-            it.lot_number,
-            it.name,
-            it.category,
-            it.quantity_available,
-            it.unit,
-            it.manufacturer,
-            it.location,
-            it.expiry_date.isoformat() if it.expiry_date else None,
-            it.supplier,
-            it.safety_stock,
-            it.min_order_qty,
-            it.package_size,
-            it.origin,
-            it.cost,
-            it.created_at.isoformat() if it.created_at else None,
-        ])
-
-    buffer.seek(0)
-    return StreamingResponse(buffer, media_type="text/csv", headers={
-        "Content-Disposition": "attachment; filename=inventory_export.csv"
-    })
+@router.get("/export", response_class=StreamingResponse, name="Export inventory")
+async def export_inventory(
+    fmt: str = Query("csv", alias="format", pattern=f"^({'|'.join(EXPORT_FORMATS)})$"),
+) -> StreamingResponse:  # noqa: D401
+    """Devuelve todo el inventario como archivo .csv, .xlsx o .parquet, generado por streaming."""
+    if not format_available(fmt):
+        raise HTTPException(status_code=400, detail=f"Formato {fmt} no disponible en este servidor")
+
+    async def batches():
+        # sesión propia: la de get_db se cierra antes de que termine de enviarse la respuesta
+        async with AsyncSessionLocal() as db:
+            async for rows in inventory_service.iter_item_rows(db):
+                yield rows
+
+    media_type, extension = EXPORT_FORMATS[fmt]
+    return StreamingResponse(
+        export_stream(fmt, EXPORT_COLUMNS, batches()),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=inventory_export.{extension}"},
+    )
 
 
 @router.get("/items", response_model=List[ItemDTO])
-async def list_items(db: AsyncSession = Depends(get_db)) -> List[ItemDTO]:
-    return await inventory_service.list_items(db)
+async def list_items(
+    request: Request,
+    response: Response,
+    category: str | None = Query(None, pattern=f"^({'|'.join(CATEGORY_OPTIONS)})$"),
+    location: str | None = None,
+    supplier: str | None = None,
+    expiry_from: dt.date | None = Query(None, description="Caducidad desde (incluida)"),
+    expiry_to: dt.date | None = Query(None, description="Caducidad hasta (incluida)"),
+    low_stock: bool = Query(False, description="Sólo ítems en o por debajo del stock de seguridad"),
+    sort: str = Query("lot_number", pattern=f"^({'|'.join(ITEM_SORT_FIELDS)})$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(ITEM_PAGE_SIZE, ge=1, le=5000),
+    cursor: str | None = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    db: AsyncSession = Depends(get_db),
+) -> List[ItemDTO]:
+    """Ítems filtrados, ordenados y paginados en BD (cabecera ``X-Next-Cursor``).
+
+    Admite codificación rápida (orjson / MessagePack) vía ``Accept``, ver app.core.encoding.
+    """
+    return await _paged(
+        request,
+        response,
+        ITEM_COLUMNS,
+        inventory_service.item_rows,
+        inventory_service.search_items,
+        db,
+        limit=limit,
+        cursor=cursor,
+        sort=sort,
+        descending=order == "desc",
+        category=category,
+        location=location,
+        supplier=supplier,
+        expiry_from=expiry_from,
+        expiry_to=expiry_to,
+        low_stock=low_stock,
+    )
 
 
 @router.post("/items", response_model=ItemDTO, status_code=201)
@@ -99,22 +143,152 @@ async def delete_item(lot_number: str, db: AsyncSession = Depends(get_db)) -> di
     return {"detail": "Item deleted"}
 
 
+@router.post("/consume", response_model=ConsumptionDTO)
+async def consume_batch(data: ConsumptionRequest, db: AsyncSession = Depends(get_db)) -> ConsumptionDTO:
+    """Consumo de una lista de materiales en una transacción, repartido entre lotes FEFO.
+
+    Responde 409 si algún ingrediente no tiene stock libre suficiente (los
+    lotes bloqueados por otro consumo en curso no cuentan); en ese caso no
+    se consume nada.
+    """
+    try:
+        allocations = await inventory_service.consume_batch(db, data.lines, data.batch_id, data.user)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return ConsumptionDTO(batch_id=data.batch_id, allocations=allocations)
+
+
+@router.get("/stock", response_model=StockAsOfDTO)
+async def stock_as_of(
+    at: dt.datetime = Query(..., description="Instante de la consulta"),
+    lot_number: str | None = None,
+    db: AsyncSession = Depends(get_db),
+) -> StockAsOfDTO:
+    """Saldo de cada lote en ``at`` según el libro de movimientos (lotes con saldo no nulo).
+
+    Parte de la última foto de saldos anterior a ``at`` (``snapshot_at``) y
+    suma sólo los movimientos posteriores.
+    """
+    snapshot, rows = await snapshots.stock_as_of(db, at, lot_number)
+    return StockAsOfDTO(
+        at=at,
+        snapshot_at=snapshot.taken_at if snapshot is not None else None,
+        balances=[{"lot_number": row.lot_number, "quantity": row.quantity} for row in rows],
+    )
+
+
+@router.post("/snapshots", status_code=201)
+async def take_snapshot(db: AsyncSession = Depends(get_db)) -> dict:
+    """Toma una foto de saldos ahora (además de las periódicas).
+
+    Como las periódicas, se toma ``SNAPSHOT_SETTLE_SECONDS`` por detrás del reloj.
+    """
+    taken_at = dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=snapshots.SNAPSHOT_SETTLE_SECONDS)
+    snapshot = await snapshots.take_snapshot(db, taken_at)
+    if snapshot is None:
+        raise HTTPException(status_code=409, detail="Hay otra foto de inventario en curso o ya hay una posterior")
+    return {"id": snapshot.id, "taken_at": snapshot.taken_at}
+
+
 @router.get("/items/{lot_number}/transactions", response_model=List[TransactionDTO])
-async def item_transactions(lot_number: str, db: AsyncSession = Depends(get_db)) -> List[TransactionDTO]:
-    txs = await inventory_service.get_transactions(db, lot_number)
-    if txs is None:
-        raise HTTPException(status_code=404, detail="Lot not found")
-    return txs
+async def item_transactions(
+    lot_number: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(LEDGER_PAGE_SIZE, ge=1, le=5000),
+    cursor: str | None = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    db: AsyncSession = Depends(get_db),
+) -> List[TransactionDTO]:
+    """Movimientos del lote, del más reciente al más antiguo.
+
+    Paginado por clave: si hay más, la cabecera ``X-Next-Cursor`` trae el
+    ``cursor`` de la página siguiente.
+    """
+    return await _paged(
+        request,
+        response,
+        TRANSACTION_COLUMNS,
+        partial(inventory_service.transaction_rows, columns=TRANSACTION_COLUMNS),
+        inventory_service.get_transactions,
+        db,
+        lot_number,
+        limit=limit,
+        cursor=cursor,
+    )
+
+
+@router.get("/transactions", response_model=List[LedgerEntryDTO])
+async def ledger(
+    request: Request,
+    response: Response,
+    event_type: str | None = Query(None, pattern=f"^({'|'.join(EVENT_ENUM)})$"),
+    batch_id: str | None = None,
+    start: dt.datetime | None = Query(None, alias="from"),
+    end: dt.datetime | None = Query(None, alias="to"),
+    limit: int = Query(LEDGER_PAGE_SIZE, ge=1, le=5000),
+    cursor: str | None = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    db: AsyncSession = Depends(get_db),
+) -> List[LedgerEntryDTO]:
+    """Libro global de movimientos, filtrable por tipo, lote de producción y fechas.
+
+    Misma paginación que los movimientos de un lote (cabecera ``X-Next-Cursor``).
+    """
+    return await _paged(
+        request,
+        response,
+        LEDGER_COLUMNS,
+        partial(inventory_service.transaction_rows, columns=LEDGER_COLUMNS),
+        inventory_service.get_transactions,
+        db,
+        limit=limit,
+        cursor=cursor,
+        event_type=event_type,
+        batch_id=batch_id,
+        start=start,
+        end=end,
+    )
+
+
+async def _paged(
+    request: Request,
+    response: Response,
+    columns: tuple[str, ...],
+    fetch_rows: Callable[..., Awaitable[tuple[list, str | None]]],
+    fetch_models: Callable[..., Awaitable[tuple[list, str | None]]],
+    *args: Any,
+    **kwargs: Any,
+):
+    """Página con el cursor siguiente en la cabecera.
+
+    Con codificación rápida se serializan las tuplas de ``fetch_rows``; si
+    no, los objetos ORM de ``fetch_models`` pasan por ``response_model``.
+    """
+    encoding = negotiate(request)
+    try:
+        if encoding is not None:
+            rows, next_cursor = await fetch_rows(*args, **kwargs)
+            # la respuesta ya serializada sustituye a la inyectada: la cabecera va en ella
+            content = response = encode(encoding, records(columns, rows))
+        else:
+            content, next_cursor = await fetch_models(*args, **kwargs)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return content
 
 
 @router.post("/import", status_code=201)
 async def import_bulk(
     file: UploadFile = File(...),
+    mode: str = Query("batch", pattern="^(batch|stream)$", description="stream: por trozos, para archivos grandes"),
     db: AsyncSession = Depends(get_db),
 ) -> dict:
     """
     Importación masiva de inventario.
     El archivo debe contener columnas mínimas definidas en importer.REQUIRED_COLUMNS.
+    Se valida por columnas y se escribe en una única transacción; los lotes
+    que ya existen se informan como errores.
     Devuelve resumen de filas insertadas y errores ignorados.
     Respuesta:
         {
@@ -123,41 +297,64 @@ async def import_bulk(
                 {"row": int, "lot_number": str, "error": str}, ...
             ]
         }
+
+    Con ``mode=stream`` (.csv y .xlsx) el archivo se lee por trozos desde el
+    temporal de la subida y cada trozo se confirma por separado; el avance
+    se publica en el WebSocket de inventario (``IMPORT_PROGRESS``) y la
+    respuesta añade ``import_id``, ``rows`` y ``skipped_total``.
     """
-    contents = await file.read()
-    from app.inventory.importer import ImportErrorReport, parse_upload  # local para evitar ciclo
+    from app.inventory.importer import (  # local para evitar ciclo
+        ImportErrorReport,
+        iter_validated,
+        read_frame,
+        validate_frame,
+    )
     try:
-        rows = await parse_upload(file.filename, contents)
+        if mode == "stream":
+            return await inventory_service.import_stream(db, iter_validated(file.filename, file.file))
+        contents = await file.read()
+        rows, skipped = validate_frame(read_frame(file.filename, contents))
     except ImportErrorReport as exc:
         raise HTTPException(status_code=422, detail=str(exc)) from exc
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
-
-    inserted = 0
-    skipped = []
-    for idx, row in enumerate(rows):
-        try:
-            await inventory_service.create_item(db, ItemCreate(**row))
-            inserted += 1
-        except Exception as err:
-            skipped.append({
-                "row": idx + 1,
-                "lot_number": row.get("lot_number", ""),
-                "error": str(err)
-            })
-    return {"inserted": inserted, "skipped": skipped}
+    return await inventory_service.import_items(db, rows, skipped)
 
 
 # ---------------------- WebSocket ----------------------
 
 
+@router.get("/events", summary="Estado del hub de eventos de inventario")
+async def events_stats() -> dict[str, Any]:
+    """Clientes conectados, eventos publicados/recibidos de otros workers y coalescidos."""
+    return inventory_events.stats()
+
+
+async def _event_sender(ws: WebSocket, subscriber: EventSubscriber) -> None:
+    while True:
+        await ws.send_text(await subscriber.next_message())
+
+
 @router.websocket("/ws/inventory")
 async def ws_inventory(ws: WebSocket) -> None:  # noqa: D401
+    """Eventos de inventario de todos los workers (``{"event": ..., ...}``).
+
+    Un ``{"event": "RESYNC"}`` indica que se han descartado eventos y que el
+    cliente debe recargar el inventario.
+    """
     await ws.accept()
-    queue = await inventory_service.register_ws()
+    subscriber = inventory_events.subscribe()
+    sender = asyncio.create_task(_event_sender(ws, subscriber))
     try:
-        while True:
-            msg = await queue.get()
-            await ws.send_json(msg)
-    except WebSocketDisconnect:
-        pass
+        # el cliente no envía nada; se lee sólo para detectar la desconexión
+        while (await ws.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        inventory_events.unsubscribe(subscriber)
+        sender.cancel()
+        try:
+            await sender
+        except (asyncio.CancelledError, WebSocketDisconnect):
+            pass
+        except Exception:  # noqa: BLE001 - el envío falla si el socket ya se cerró
+            logger.debug("Envío de eventos de inventario terminado con error", exc_info=True)
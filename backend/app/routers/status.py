@@ -7,6 +7,8 @@ operativa. Es útil para monitoreo y pruebas de conectividad.
 
 from fastapi import APIRouter
 
+from app.services.mqtt import mqtt_manager
+
 router = APIRouter()
 
 
@@ -23,3 +25,9 @@ async def status() -> dict[str, str]:
 @router.get("/status/ping", summary="Ping healthcheck", tags=["Status"])
 async def ping() -> dict:
     return {"pong": True}
+
+
+@router.get("/status/mqtt", summary="Colas de despacho MQTT", tags=["Status"])
+async def mqtt_status() -> dict:
+    """Profundidad de cola y mensajes descartados/coalescidos por listener MQTT."""
+    return {"listeners": mqtt_manager.stats()}
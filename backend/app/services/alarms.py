@@ -0,0 +1,315 @@
+"""Motor de alarmas de proceso evaluado en la ruta de ingesta.
+
+Las reglas (umbral alto/bajo, velocidad de cambio y sensor sin datos) se
+compilan en arrays NumPy con una fila por regla. En cada ciclo de ingesta se
+actualiza el último valor de cada tanque y se evalúan **todas** las reglas de
+una vez; el estado activo de cada alarma y la histéresis viven en memoria.
+Las transiciones se publican de inmediato por MQTT en
+``brewpi/alarms/<tank_id>/<rule_id>`` y se persisten en lotes en
+``fermentation_alarm_events``.
+
+Con varios workers de la API todos evalúan (``/alarms/active`` responde en
+cualquiera y un nuevo líder arranca con el estado al día), pero sólo el líder
+(:mod:`app.services.leader`) publica y persiste las transiciones. Las reglas
+se recargan cada ``RULES_RELOAD_SECONDS`` para recoger cambios hechos a
+través de otro worker.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import json
+import logging
+import time
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db.session import AsyncSessionLocal
+from app.models.fermentation import ALARM_KINDS, AlarmEvent, AlarmRule
+from app.services.fermentation_writer import ReadingRow
+from app.services.hot_cache import COLUMNS, to_epoch
+from app.services.mqtt import mqtt_manager
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+ALARM_TOPIC_PREFIX = "brewpi/alarms"
+
+HIGH, LOW, RATE, STALE = range(len(ALARM_KINDS))
+
+# Eventos pendientes de persistir como máximo si la BD no responde
+MAX_PENDING_EVENTS = 100_000
+# Recarga periódica de reglas (cambios hechos a través de otro worker)
+RULES_RELOAD_SECONDS = 10.0
+
+
+class AlarmEngine:
+    """Estado de tanques y reglas en arrays; evaluación vectorizada."""
+
+    def __init__(self, rate_window_seconds: float) -> None:
+        self.rate_window_seconds = rate_window_seconds
+        # --- estado por tanque (filas) y variable (columnas) ---
+        self._tank_index: dict[str, int] = {}
+        self._values = np.full((0, len(COLUMNS)), np.nan)
+        self._rates = np.full((0, len(COLUMNS)), np.nan)
+        self._ref_values = np.full((0, len(COLUMNS)), np.nan)
+        self._ref_ts = np.full(0, np.nan)
+        self._last_ts = np.full(0, np.nan)
+        # --- reglas compiladas ---
+        self._rules: list[AlarmRule] = []
+        self._rule_tank = np.zeros(0, dtype=np.int64)
+        self._rule_var = np.zeros(0, dtype=np.int64)
+        self._rule_kind = np.zeros(0, dtype=np.int64)
+        self._rule_limit = np.zeros(0)
+        self._rule_deadband = np.zeros(0)
+        # cuándo se cargó cada regla: edad de referencia si su tanque nunca ha informado
+        self._rule_loaded_at = np.zeros(0)
+        self._loaded_at: dict[int, float] = {}
+        self._active = np.zeros(0, dtype=bool)
+        self._active_since: dict[int, dt.datetime] = {}
+
+        self._pending: list[dict[str, Any]] = []
+        self._running = False
+        # sólo el líder publica y persiste las transiciones
+        self.publishing = False
+        self._task: asyncio.Task | None = None
+        self.evaluations = 0
+
+    # ------------------------------------------------------------------
+    # Tanques
+    # ------------------------------------------------------------------
+    def _index(self, tank_id: str) -> int:
+        idx = self._tank_index.get(tank_id)
+        if idx is not None:
+            return idx
+        idx = self._tank_index[tank_id] = len(self._tank_index)
+        if idx >= len(self._last_ts):
+            grow = max(16, len(self._last_ts))
+            self._values = np.vstack((self._values, np.full((grow, len(COLUMNS)), np.nan)))
+            self._rates = np.vstack((self._rates, np.full((grow, len(COLUMNS)), np.nan)))
+            self._ref_values = np.vstack((self._ref_values, np.full((grow, len(COLUMNS)), np.nan)))
+            self._ref_ts = np.append(self._ref_ts, np.full(grow, np.nan))
+            self._last_ts = np.append(self._last_ts, np.full(grow, np.nan))
+        return idx
+
+    # ------------------------------------------------------------------
+    # Reglas
+    # ------------------------------------------------------------------
+    def set_rules(self, rules: Sequence[AlarmRule], active_ids: set[int] | None = None) -> None:
+        """Compila las reglas habilitadas conservando el estado de las activas."""
+        previous = {rule.id for rule, active in zip(self._rules, self._active) if active}
+        if active_ids is not None:
+            previous |= active_ids
+        self._rules = [rule for rule in rules if rule.enabled]
+        self._rule_tank = np.array([self._index(r.tank_id) for r in self._rules], dtype=np.int64)
+        self._rule_var = np.array(
+            [COLUMNS.index(r.variable) if r.variable in COLUMNS else 0 for r in self._rules], dtype=np.int64
+        )
+        self._rule_kind = np.array([ALARM_KINDS.index(r.kind) for r in self._rules], dtype=np.int64)
+        self._rule_limit = np.array([r.limit for r in self._rules], dtype=np.float64)
+        self._rule_deadband = np.array([r.deadband or 0.0 for r in self._rules], dtype=np.float64)
+        now = time.time()
+        self._loaded_at = {r.id: self._loaded_at.get(r.id, now) for r in self._rules}
+        self._rule_loaded_at = np.array([self._loaded_at[r.id] for r in self._rules], dtype=np.float64)
+        self._active = np.array([r.id in previous for r in self._rules], dtype=bool)
+        self._active_since = {rid: ts for rid, ts in self._active_since.items() if rid in previous}
+
+    async def load_rules(self, db: AsyncSession) -> None:
+        """Carga las reglas y recupera las alarmas que quedaron activas en BD."""
+        rules = (await db.execute(select(AlarmRule))).scalars().all()
+        if self._running:
+            # recarga tras editar reglas: el estado en memoria manda (la BD
+            # puede ir por detrás de los eventos aún sin volcar)
+            self.set_rules(rules)
+            return
+        latest = (
+            select(AlarmEvent.rule_id, AlarmEvent.state, AlarmEvent.timestamp)
+            .distinct(AlarmEvent.rule_id)
+            .order_by(AlarmEvent.rule_id, AlarmEvent.timestamp.desc(), AlarmEvent.id.desc())
+        )
+        for rule_id, state, timestamp in (await db.execute(latest)).all():
+            if state == "raised":
+                self._active_since.setdefault(rule_id, timestamp)
+        self.set_rules(rules, set(self._active_since))
+        logger.info("Motor de alarmas: %s reglas, %s activas", len(self._rules), int(self._active.sum()))
+
+    # ------------------------------------------------------------------
+    # Ingesta y evaluación
+    # ------------------------------------------------------------------
+    def ingest(self, rows: Sequence[ReadingRow]) -> None:
+        """Actualiza el estado con las lecturas del ciclo y evalúa las reglas."""
+        if not self._running or not rows:
+            return
+        idx = np.fromiter((self._index(row.tank_id) for row in rows), dtype=np.int64, count=len(rows))
+        ts = np.fromiter((to_epoch(row.timestamp) for row in rows), dtype=np.float64, count=len(rows))
+        values = np.array([(row.temperature, row.pressure, row.co2) for row in rows], dtype=np.float64)
+        self._values[idx] = values
+        self._last_ts[idx] = ts
+
+        # velocidad de cambio (unidades/min) sobre ventanas de rate_window_seconds
+        elapsed = ts - self._ref_ts[idx]
+        ready = np.isnan(elapsed) | (elapsed >= self.rate_window_seconds)
+        has_ref = ready & ~np.isnan(elapsed)
+        rate_idx = idx[has_ref]
+        self._rates[rate_idx] = (
+            (values[has_ref] - self._ref_values[rate_idx]) / elapsed[has_ref, None] * 60.0
+        )
+        self._ref_values[idx[ready]] = values[ready]
+        self._ref_ts[idx[ready]] = ts[ready]
+
+        self.evaluate(time.time())
+
+    def evaluate(self, now: float) -> None:
+        """Evalúa todas las reglas a la vez y emite las transiciones."""
+        if not len(self._rules):
+            return
+        self.evaluations += 1
+        kind = self._rule_kind
+        value = self._values[self._rule_tank, self._rule_var]
+        rate = np.abs(self._rates[self._rule_tank, self._rule_var])
+        last_ts = self._last_ts[self._rule_tank]
+        # un sensor que nunca ha informado envejece desde que se cargó la regla
+        age = now - np.where(np.isnan(last_ts), self._rule_loaded_at, last_ts)
+        # se normaliza todo a "medida > límite": la regla LOW se evalúa cambiada de signo
+        measure = np.select([kind == HIGH, kind == LOW, kind == RATE], [value, -value, rate], age)
+        limit = np.where(kind == LOW, -self._rule_limit, self._rule_limit)
+        with np.errstate(invalid="ignore"):
+            raised = ~self._active & (measure > limit)
+            cleared = self._active & (measure <= limit - self._rule_deadband)
+        if not (raised.any() or cleared.any()):
+            return
+        self._active[raised] = True
+        self._active[cleared] = False
+        now_dt = dt.datetime.fromtimestamp(now, dt.timezone.utc)
+        reported = np.where(kind == STALE, age, np.where(kind == RATE, rate, value))
+        events = [
+            self._event(i, "raised", reported[i], now_dt) for i in np.flatnonzero(raised)
+        ] + [self._event(i, "cleared", reported[i], now_dt) for i in np.flatnonzero(cleared)]
+        if not self.publishing:
+            return
+        self._pending.extend(events)
+        if len(self._pending) > MAX_PENDING_EVENTS:
+            del self._pending[: len(self._pending) - MAX_PENDING_EVENTS]
+        asyncio.get_running_loop().create_task(self._publish(events))
+
+    def _event(self, i: int, state: str, value: float, now: dt.datetime) -> dict[str, Any]:
+        rule = self._rules[i]
+        if state == "raised":
+            self._active_since[rule.id] = now
+        else:
+            self._active_since.pop(rule.id, None)
+        return {
+            "rule_id": rule.id,
+            "tank_id": rule.tank_id,
+            "variable": rule.variable,
+            "kind": rule.kind,
+            "state": state,
+            "value": None if np.isnan(value) else float(value),
+            "limit": rule.limit,
+            "severity": rule.severity,
+            "timestamp": now,
+        }
+
+    async def _publish(self, events: list[dict[str, Any]]) -> None:
+        for event in events:
+            payload = json.dumps({**event, "timestamp": event["timestamp"].isoformat()})
+            try:
+                await mqtt_manager.publish(f"{ALARM_TOPIC_PREFIX}/{event['tank_id']}/{event['rule_id']}", payload)
+            except Exception:  # noqa: BLE001 - el evento se persiste igualmente
+                logger.warning("No se pudo publicar la alarma %s por MQTT", event["rule_id"])
+
+    def set_publishing(self, publishing: bool) -> None:
+        self.publishing = publishing
+
+    def active(self) -> list[dict[str, Any]]:
+        """Alarmas activas con su valor actual."""
+        out = []
+        for i in np.flatnonzero(self._active):
+            rule = self._rules[i]
+            out.append(
+                {
+                    "rule_id": rule.id,
+                    "tank_id": rule.tank_id,
+                    "variable": rule.variable,
+                    "kind": rule.kind,
+                    "limit": rule.limit,
+                    "severity": rule.severity,
+                    "since": self._active_since.get(rule.id),
+                }
+            )
+        return out
+
+    # ------------------------------------------------------------------
+    # Persistencia y ciclo de vida
+    # ------------------------------------------------------------------
+    async def flush(self, db: AsyncSession) -> int:
+        """Persiste en un único INSERT los eventos pendientes."""
+        events, self._pending = self._pending, []
+        if not events:
+            return 0
+        try:
+            await db.execute(insert(AlarmEvent), events)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            self._pending[:0] = events
+            raise
+        return len(events)
+
+    async def _run(self) -> None:
+        while not self._running:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.load_rules(db)
+                self._running = True
+            except Exception:  # noqa: BLE001 - la BD puede no estar lista al arrancar
+                logger.exception("No se pudieron cargar las reglas de alarma; reintentando")
+                await asyncio.sleep(settings.alarm_check_seconds * 5)
+        next_flush = 0.0
+        loop = asyncio.get_running_loop()
+        next_reload = loop.time() + RULES_RELOAD_SECONDS
+        while True:
+            await asyncio.sleep(settings.alarm_check_seconds)
+            # las reglas "stale" necesitan evaluarse aunque no lleguen lecturas
+            self.evaluate(time.time())
+            if loop.time() >= next_reload:
+                next_reload = loop.time() + RULES_RELOAD_SECONDS
+                try:
+                    async with AsyncSessionLocal() as db:
+                        await self.load_rules(db)
+                except Exception:  # noqa: BLE001 - se reintenta en la siguiente recarga
+                    logger.exception("Error recargando las reglas de alarma")
+            if loop.time() >= next_flush:
+                next_flush = loop.time() + settings.alarm_flush_seconds
+                try:
+                    async with AsyncSessionLocal() as db:
+                        await self.flush(db)
+                except Exception:  # noqa: BLE001 - se reintenta en el siguiente volcado
+                    logger.exception("Error persistiendo eventos de alarma")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="alarm-engine")
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            async with AsyncSessionLocal() as db:
+                await self.flush(db)
+        except Exception:  # noqa: BLE001
+            logger.exception("Eventos de alarma sin persistir al detener el motor")
+
+
+alarm_engine = AlarmEngine(settings.alarm_rate_window_seconds)
@@ -0,0 +1,184 @@
+"""Analítica de fermentación vectorizada sobre ventanas arbitrarias.
+
+Las lecturas de un tanque se leen una sola vez como columnas NumPy y todas las
+métricas se calculan sobre arrays:
+
+* medias móviles por ventana de tiempo (sumas acumuladas + ``searchsorted``);
+* tasa de evolución de CO₂ (%/h) sobre la media móvil;
+* desviación de temperatura respecto a la consigna del perfil asignado;
+* tiempo dentro de especificación (desviación ≤ tolerancia), ponderado por el
+  intervalo entre muestras.
+
+Los resultados se guardan por (tanque, rango, parámetros) en
+:class:`AnalyticsCache`, que la ingesta invalida sólo cuando llegan lecturas
+dentro del rango de una entrada.
+"""
+from __future__ import annotations
+
+import math
+from collections import OrderedDict
+from collections.abc import Hashable, Sequence
+from typing import Any
+
+import numpy as np
+
+from app.services.downsampling import downsample_columns
+from app.services.fermentation_writer import ReadingRow
+from app.services.hot_cache import COLUMNS, to_epoch
+from app.services.profiles import CompiledProfile
+
+# Muestras máximas que se leen por consulta (a partir de ahí se usan rollups)
+ANALYTICS_MAX_SAMPLES = 200_000
+
+# Un hueco mayor que este múltiplo de la mediana de intervalos no cuenta como
+# tiempo en especificación (el sensor no reportó)
+GAP_FACTOR = 5.0
+
+
+def moving_average(ts: np.ndarray, values: np.ndarray, window: float) -> np.ndarray:
+    """Media de las muestras en ``(t - window, t]`` para cada ``t``."""
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    lo = np.searchsorted(ts, ts - window, side="right")
+    hi = np.arange(1, len(ts) + 1)
+    return (csum[hi] - csum[lo]) / (hi - lo)
+
+
+def rate_per_hour(ts: np.ndarray, values: np.ndarray, window: float) -> np.ndarray:
+    """Pendiente (unidades/h) entre cada muestra y la primera de su ventana."""
+    lo = np.searchsorted(ts, ts - window, side="left")
+    elapsed = ts - ts[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = (values - values[lo]) / elapsed * 3600.0
+    rate[elapsed <= 0] = np.nan
+    return rate
+
+
+def compute_analytics(
+    columns: dict[str, np.ndarray],
+    window: float,
+    tolerance: float,
+    profile: tuple[CompiledProfile, float] | None = None,
+    max_points: int | None = None,
+) -> dict[str, Any]:
+    """Métricas del rango; con ``max_points`` incluye series submuestreadas."""
+    ts = columns["timestamp"]
+    result: dict[str, Any] = {"samples": int(len(ts)), "window_seconds": window}
+    if not len(ts):
+        return result
+
+    averages = {name: moving_average(ts, columns[name], window) for name in COLUMNS}
+    co2_rate = rate_per_hour(ts, averages["co2"], window)
+    result["moving_average"] = {name: float(series[-1]) for name, series in averages.items()}
+    result["co2_rate_per_hour"] = {"last": _nan_to_none(co2_rate[-1]), "max": _nanmax(co2_rate)}
+
+    series: dict[str, np.ndarray] = {"timestamp": ts, "co2_rate_per_hour": co2_rate}
+    series.update({f"{name}_ma": values for name, values in averages.items()})
+
+    if profile is not None:
+        compiled, started = profile
+        setpoints = compiled.temperatures_at(ts - started)
+        deviation = columns["temperature"] - setpoints
+        dt_samples = np.diff(ts, append=ts[-1])
+        if len(ts) > 1:
+            dt_samples[dt_samples > GAP_FACTOR * np.median(dt_samples[:-1])] = 0.0
+        valid = ~np.isnan(deviation)
+        in_spec = valid & (np.abs(deviation) <= tolerance)
+        covered = float(dt_samples[valid].sum())
+        in_spec_seconds = float(dt_samples[in_spec].sum())
+        result["profile"] = compiled.name
+        result["temperature_deviation"] = {
+            "last": _nan_to_none(deviation[-1]),
+            "mean": _nanmean(deviation),
+            "max_abs": _nanmax(np.abs(deviation)),
+        }
+        result["time_in_spec"] = {
+            "tolerance": tolerance,
+            "seconds": in_spec_seconds,
+            "fraction": in_spec_seconds / covered if covered else None,
+        }
+        series["setpoint"] = setpoints
+        series["temperature_deviation"] = deviation
+
+    if max_points is not None:
+        keep = downsample_columns(
+            {**columns, "index": np.arange(len(ts), dtype=np.float64)}, max_points
+        )["index"].astype(np.int64)
+        result["series"] = {name: _json_array(values[keep]) for name, values in series.items()}
+    return result
+
+
+class AnalyticsCache:
+    """Resultados por (tanque, clave) con invalidación por rango de tiempo."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        # (tank_id, clave) -> (inicio, fin, resultado); fin=None significa "hasta ahora"
+        self._entries: OrderedDict[tuple[str, Hashable], tuple[float, float | None, Any]] = OrderedDict()
+        self._by_tank: dict[str, set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, tank_id: str, key: Hashable) -> Any | None:
+        entry = self._entries.get((tank_id, key))
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((tank_id, key))
+        self.hits += 1
+        return entry[2]
+
+    def put(self, tank_id: str, key: Hashable, start: float, end: float | None, value: Any) -> None:
+        self._entries[(tank_id, key)] = (start, end, value)
+        self._by_tank.setdefault(tank_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            (old_tank, old_key), _ = self._entries.popitem(last=False)
+            self._by_tank[old_tank].discard(old_key)
+
+    def invalidate(self, rows: Sequence[ReadingRow]) -> None:
+        """Descarta las entradas cuyo rango contiene alguna lectura nueva."""
+        spans: dict[str, tuple[float, float]] = {}
+        for row in rows:
+            if row.tank_id not in self._by_tank:
+                continue
+            ts = to_epoch(row.timestamp)
+            lo, hi = spans.get(row.tank_id, (ts, ts))
+            spans[row.tank_id] = (min(lo, ts), max(hi, ts))
+        for tank_id, (lo, hi) in spans.items():
+            keys = self._by_tank[tank_id]
+            for key in list(keys):
+                start, end, _ = self._entries[(tank_id, key)]
+                if start <= hi and (end is None or end >= lo):
+                    del self._entries[(tank_id, key)]
+                    keys.discard(key)
+                    self.invalidations += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+def _nan_to_none(value: float) -> float | None:
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _nanmax(values: np.ndarray) -> float | None:
+    finite = values[~np.isnan(values)]
+    return float(finite.max()) if len(finite) else None
+
+
+def _nanmean(values: np.ndarray) -> float | None:
+    finite = values[~np.isnan(values)]
+    return float(finite.mean()) if len(finite) else None
+
+
+def _json_array(values: np.ndarray) -> list[float | None]:
+    return [None if math.isnan(v) else v for v in values.tolist()]
+
+
+analytics_cache = AnalyticsCache(max_entries=1024)
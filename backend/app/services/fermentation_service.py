@@ -6,18 +6,78 @@ from __future__ import annotations
 
 import asyncio
 import datetime as dt
-import re
-from typing import List
+import logging
+import math
+from collections.abc import Iterable, Sequence
+from typing import Any, List
 
+import asyncpg
+import numpy as np
 from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DataError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import get_settings
 from app.db.session import get_db
-from app.models.fermentation import FermentationReading, FermentationTank
+from app.models.fermentation import (
+    FermentationLatestReading,
+    FermentationReading,
+    FermentationRollup,
+    FermentationSpoolCheckpoint,
+    FermentationTank,
+)
+from app.services.alarms import alarm_engine
+from app.services.analytics import ANALYTICS_MAX_SAMPLES, analytics_cache, compute_analytics
+from app.services.downsampling import downsample_columns
+from app.services.fermentation_writer import FermentationBulkWriter, ReadingRow
+from app.services.hot_cache import COLUMNS, HotCache
+from app.services.live_telemetry import live_hub
+from app.services.rollups import RAW_RESOLUTION, RollupAccumulator, choose_resolution
 from app.services.mqtt import mqtt_manager
+from app.services.mqtt_dispatch import ListenerChannel, OverflowPolicy
+from app.services.profiles import profile_scheduler
+from app.services.spool import SpoolPosition, WriteAheadSpool
+from app.services.telemetry_codec import decode_telemetry
 
-# Patrón de tópico esperado
-TOPIC_REGEX = re.compile(r"brewpi/fermentation/(?P<tank_id>[^/]+)/(?P<var>temperature|pressure|co2)")
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+VARIABLES = ("temperature", "pressure", "co2")
+
+# Filtros de tópico esperados: brewpi/fermentation/<tank_id>/<variable> (un
+# float ASCII por variable) o brewpi/fermentation/<tank_id>/telemetry (todas las
+# variables en un mensaje binario, ver app.services.telemetry_codec)
+TOPIC_PREFIX = "brewpi/fermentation"
+TELEMETRY_SUFFIX = "telemetry"
+TOPIC_SUFFIXES = (*VARIABLES, TELEMETRY_SUFFIX)
+TOPIC_FILTERS = tuple(f"{TOPIC_PREFIX}/+/{suffix}" for suffix in TOPIC_SUFFIXES)
+
+
+def tank_topic_filters(tank_ids: Iterable[str]) -> list[str]:
+    """Filtros de tópico de un conjunto concreto de tanques."""
+    return [f"{TOPIC_PREFIX}/{tank_id}/{suffix}" for tank_id in sorted(tank_ids) for suffix in TOPIC_SUFFIXES]
+
+
+# Se leen hasta max_points × LTTB_OVERSAMPLE puntos antes de submuestrear con LTTB
+LTTB_OVERSAMPLE = 8
+
+# Tanques como máximo por consulta de histórico múltiple
+BULK_HISTORY_MAX_TANKS = 64
+
+# Redondeo (s) del inicio por defecto de la analítica sin rango explícito
+ANALYTICS_OPEN_START_STEP = 60
+
+# Desfase admitido entre la hora del dispositivo (telemetry) y la del servidor;
+# fuera de él (reloj sin sincronizar o adelantado) se usa la hora del servidor
+DEVICE_CLOCK_MAX_AGE_SECONDS = 3600.0
+DEVICE_CLOCK_MAX_AHEAD_SECONDS = 60.0
+
+# Intentos de un mismo lote del spool que la BD rechaza (p. ej. sin partición
+# para su fecha) antes de apartarlo a cuarentena y seguir con el siguiente
+DRAIN_MAX_ATTEMPTS = 5
+# Errores por los datos del lote (no de conexión); COPY usa asyncpg directamente
+REJECTED_ERRORS = (DataError, IntegrityError, asyncpg.DataError, asyncpg.IntegrityConstraintViolationError)
 
 
 class FermentationService:  # pylint: disable=too-few-public-methods
@@ -26,8 +86,22 @@ class FermentationService:  # pylint: disable=too-few-public-methods
     def __init__(self) -> None:
         # buffer temporal: {tank_id: {var: valor}}
         self._buffer: dict[str, dict[str, float]] = {}
+        # lecturas completas recibidas en formato telemetry (con hora del dispositivo)
+        self._telemetry: list[ReadingRow] = []
+        # última marca de tiempo telemetry aceptada por tanque (se descartan las no crecientes)
+        self._telemetry_last: dict[str, float] = {}
         # task para flush periódico
         self._flush_task: asyncio.Task | None = None
+        # escritor masivo con registro en memoria de tanques conocidos
+        self._writer = FermentationBulkWriter()
+        # ventana reciente por tanque para responder históricos sin ir a BD
+        self._hot_cache = HotCache(settings.hot_cache_samples, settings.hot_cache_max_tanks)
+        # deltas de agregados 1 min / 15 min / 1 h pendientes de volcar
+        self._rollups = RollupAccumulator()
+        self._rollups_flushed_at = 0.0
+        # spool local entre el listener y la BD (None = escritura directa)
+        self._spool: WriteAheadSpool | None = None
+        self._drain_task: asyncio.Task | None = None
 
     # ---------------------------------------------------------------------
     # API pública
@@ -37,68 +111,612 @@ class FermentationService:  # pylint: disable=too-few-public-methods
         result = await db.execute(stmt)
         return result.scalars().all()
 
+    async def tanks_overview(self, db: AsyncSession) -> list[dict[str, Any]]:
+        """Tanques con su última lectura en una sola consulta.
+
+        Lee ``fermentation_latest_readings`` (una fila por tanque, mantenida
+        por la ingesta): el coste no depende del tamaño del histórico.
+        """
+        latest = FermentationLatestReading
+        stmt = (
+            select(
+                FermentationTank.id,
+                FermentationTank.name,
+                FermentationTank.profile,
+                FermentationTank.profile_started_at,
+                latest.timestamp.label("last_seen"),
+                latest.temperature,
+                latest.pressure,
+                latest.co2,
+            )
+            .outerjoin(latest, latest.tank_id == FermentationTank.id)
+            .order_by(FermentationTank.id)
+        )
+        result = await db.execute(stmt)
+        return [dict(row) for row in result.mappings().all()]
+
     async def assign_profile(self, db: AsyncSession, tank_id: str, profile_name: str) -> None:
         tank = await db.get(FermentationTank, tank_id)
         if not tank:
             tank = FermentationTank(id=tank_id, name=tank_id)
             db.add(tank)
         tank.profile = profile_name
+        tank.profile_started_at = dt.datetime.now(dt.timezone.utc)
+        await profile_scheduler.touch(db)
         await db.commit()
+        self._writer.register_known([tank_id])
+        await profile_scheduler.reload(db)
+
+    async def get_history(
+        self,
+        db: AsyncSession,
+        tank_id: str,
+        limit: int = 2880,
+        start: dt.datetime | None = None,
+        end: dt.datetime | None = None,
+        max_points: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """Histórico de lecturas en orden cronológico.
+
+        Sin rango devuelve las últimas ``limit`` lecturas crudas. Con rango
+        (``start``/``end``) o ``max_points`` (por defecto ``limit``) se lee la
+        resolución adecuada (lecturas crudas o medias de 1 min, 15 min o 1 h)
+        y se submuestrea con LTTB a ``max_points`` puntos por serie.
+        """
+        if start is None and end is None and max_points is None:
+            return _rows_from_columns(await self._recent_columns(db, tank_id, limit))
+        if start is None:
+            # misma ventana que el modo sin rango: ``limit`` lecturas crudas
+            reference = _as_utc(end) if end is not None else dt.datetime.now(dt.timezone.utc)
+            start = reference - dt.timedelta(seconds=limit * RAW_RESOLUTION)
+        max_points = max_points or limit
+        columns, _ = await self.history_columns(db, tank_id, start, end, max_points)
+        return _rows_from_columns(downsample_columns(columns, max_points))
+
+    async def history_columns(
+        self,
+        db: AsyncSession,
+        tank_id: str,
+        start: dt.datetime | None,
+        end: dt.datetime | None,
+        max_points: int,
+    ) -> tuple[dict[str, np.ndarray], int]:
+        """Columnas NumPy del rango y resolución (s) con que se obtuvieron.
+
+        La resolución se elige para ``max_points`` × ``LTTB_OVERSAMPLE``
+        puntos: margen suficiente para que LTTB conserve picos que una media
+        más gruesa aplanaría.
+        """
+        end = _as_utc(end) if end is not None else dt.datetime.now(dt.timezone.utc)
+        if start is None:
+            start = end - dt.timedelta(seconds=max_points * RAW_RESOLUTION)
+        start = _as_utc(start)
+        resolution = choose_resolution((end - start).total_seconds(), max_points * LTTB_OVERSAMPLE)
+        if resolution == RAW_RESOLUTION:
+            return await self._raw_columns(db, tank_id, start, end), resolution
+        return await self._rollup_columns(db, tank_id, resolution, start, end), resolution
+
+    async def bulk_history(
+        self,
+        db: AsyncSession,
+        tank_ids: Sequence[str],
+        start: dt.datetime | None,
+        end: dt.datetime | None,
+        max_points: int,
+    ) -> dict[str, Any]:
+        """Histórico de varios tanques en columnas sobre un eje de tiempo común.
+
+        Se elige la resolución (lecturas crudas o rollups) que deja como
+        mucho ``max_points`` intervalos en el rango y todos los tanques se
+        leen en **una** consulta; los que la caché en memoria cubre enteros
+        no van a BD. Cada lectura cae en el intervalo de su resolución (la
+        última del intervalo gana) y los huecos quedan a ``None``.
+        """
+        end = _as_utc(end) if end is not None else dt.datetime.now(dt.timezone.utc)
+        start = _as_utc(start) if start is not None else end - dt.timedelta(seconds=max_points * RAW_RESOLUTION)
+        resolution = choose_resolution((end - start).total_seconds(), max_points)
+
+        series: dict[str, dict[str, np.ndarray]] = {}
+        pending = list(tank_ids)
+        if resolution == RAW_RESOLUTION:
+            pending = []
+            for tank_id in tank_ids:
+                buffer = self._hot_cache.get(tank_id)
+                if buffer is not None and len(buffer) and buffer.oldest_ts <= start.timestamp():
+                    series[tank_id] = buffer.columns(start.timestamp(), end.timestamp())
+                else:
+                    pending.append(tank_id)
+        if pending:
+            result = await db.execute(_bulk_select(pending, resolution, start, end))
+            grouped: dict[str, list] = {}
+            for tank_id, *row in result.all():
+                grouped.setdefault(tank_id, []).append(row)
+            series.update({tank_id: _columns_from_rows(rows) for tank_id, rows in grouped.items()})
+
+        axis, aligned = _align_columns(series, tank_ids, resolution)
+        return {
+            "resolution_seconds": resolution,
+            "timestamp": axis.tolist(),
+            "tanks": {
+                tank_id: {name: _nullable_list(values) for name, values in aligned[tank_id].items()}
+                for tank_id in tank_ids
+            },
+        }
+
+    async def get_analytics(
+        self,
+        db: AsyncSession,
+        tank_id: str,
+        start: dt.datetime | None,
+        end: dt.datetime | None,
+        window: float,
+        tolerance: float,
+        max_points: int | None = None,
+    ) -> dict[str, Any]:
+        """Métricas derivadas del rango (por defecto, las últimas 24 h).
+
+        El resultado se cachea por rango y parámetros hasta que la ingesta
+        reciba lecturas del tanque dentro del rango.
+        """
+        end_ts = _as_utc(end).timestamp() if end is not None else None
+        if start is not None:
+            start = _as_utc(start)
+        elif end is not None:
+            start = _as_utc(end) - dt.timedelta(days=1)
+        else:
+            # "últimas 24 h": el inicio se redondea para que la clave de caché
+            # no cambie en cada petición
+            now = dt.datetime.now(dt.timezone.utc).timestamp()
+            start = _from_epoch(now - 86400 - now % ANALYTICS_OPEN_START_STEP)
+        profile = profile_scheduler.assignment(tank_id)
+        # el perfil compilado forma parte de la clave: editarlo o reasignarlo cambia el resultado
+        key = (start.timestamp(), end_ts, window, tolerance, max_points, profile)
+        cached = analytics_cache.get(tank_id, key)
+        if cached is not None:
+            return cached
+        columns, resolution = await self.history_columns(
+            db, tank_id, start, end, ANALYTICS_MAX_SAMPLES // LTTB_OVERSAMPLE
+        )
+        result = compute_analytics(columns, window, tolerance, profile, max_points)
+        result["resolution_seconds"] = resolution
+        analytics_cache.put(tank_id, key, start.timestamp(), end_ts, result)
+        return result
+
+    def analytics_cache_stats(self) -> dict[str, Any]:
+        return analytics_cache.stats()
+
+    async def _recent_columns(self, db: AsyncSession, tank_id: str, limit: int) -> dict[str, np.ndarray]:
+        """Últimas ``limit`` lecturas: caché en memoria + BD para lo anterior."""
+        cached: dict[str, np.ndarray] | None = None
+        buffer = self._hot_cache.get(tank_id)
+        if buffer is not None and len(buffer):
+            cached = buffer.columns(last=limit)
+        missing = limit - (len(cached["timestamp"]) if cached is not None else 0)
+        if missing <= 0:
+            return cached
 
-    async def get_history(self, db: AsyncSession, tank_id: str, limit: int = 2880):
-        # devuelve últimas 2 días a 1 lectura/min por defecto
         stmt = (
-            select(FermentationReading)
-            .where(FermentationReading.tank_id == tank_id)
+            _raw_select(tank_id)
             .order_by(FermentationReading.timestamp.desc())
-            .limit(limit)
+            .limit(missing)
+        )
+        if cached is not None:
+            stmt = stmt.where(FermentationReading.timestamp < _from_epoch(cached["timestamp"][0]))
+        result = await db.execute(stmt)
+        return _concat_columns(_columns_from_rows(reversed(result.all())), cached)
+
+    async def _raw_columns(
+        self, db: AsyncSession, tank_id: str, start: dt.datetime, end: dt.datetime
+    ) -> dict[str, np.ndarray]:
+        """Lecturas crudas del rango; sólo va a BD por lo que no está en caché."""
+        cached: dict[str, np.ndarray] | None = None
+        stmt = _raw_select(tank_id).where(FermentationReading.timestamp >= start)
+        buffer = self._hot_cache.get(tank_id)
+        if buffer is not None and len(buffer) and buffer.oldest_ts <= end.timestamp():
+            cached = buffer.columns(start.timestamp(), end.timestamp())
+            if buffer.oldest_ts <= start.timestamp():
+                return cached
+            stmt = stmt.where(FermentationReading.timestamp < _from_epoch(buffer.oldest_ts))
+        else:
+            stmt = stmt.where(FermentationReading.timestamp <= end)
+        result = await db.execute(stmt.order_by(FermentationReading.timestamp))
+        return _concat_columns(_columns_from_rows(result.all()), cached)
+
+    async def _rollup_columns(
+        self, db: AsyncSession, tank_id: str, resolution: int, start: dt.datetime, end: dt.datetime
+    ) -> dict[str, np.ndarray]:
+        """Medias por intervalo desde ``fermentation_rollups``."""
+        bucket_start = start - dt.timedelta(seconds=start.timestamp() % resolution)
+        stmt = (
+            select(
+                FermentationRollup.bucket,
+                FermentationRollup.temperature_mean,
+                FermentationRollup.pressure_mean,
+                FermentationRollup.co2_mean,
+            )
+            .where(FermentationRollup.tank_id == tank_id)
+            .where(FermentationRollup.resolution == resolution)
+            .where(FermentationRollup.bucket >= bucket_start)
+            .where(FermentationRollup.bucket <= end)
+            .order_by(FermentationRollup.bucket)
         )
         result = await db.execute(stmt)
-        return list(reversed(result.scalars().all()))
+        return _columns_from_rows(result.all())
+
+    def hot_cache_stats(self) -> dict[str, Any]:
+        return self._hot_cache.stats()
+
+    def spool_stats(self) -> dict[str, Any] | None:
+        return self._spool.stats() if self._spool is not None else None
 
     # ------------------------------------------------------------------
     # MQTT
     # ------------------------------------------------------------------
     async def _mqtt_listener(self, topic: str, payload: bytes) -> None:
-        match = TOPIC_REGEX.fullmatch(topic)
-        if not match:
+        # el enrutado por TOPIC_FILTERS garantiza la forma del tópico
+        tank_id, var = topic.rsplit("/", 2)[1:]
+        if var == TELEMETRY_SUFFIX:
+            try:
+                sample = decode_telemetry(payload)
+            except ValueError:
+                return
+            timestamp = self._device_timestamp(tank_id, sample.timestamp)
+            if timestamp is not None:
+                self._telemetry.append(
+                    ReadingRow(tank_id, timestamp, sample.temperature, sample.pressure, sample.co2)
+                )
             return
-        tank_id = match.group("tank_id")
-        var = match.group("var")
         try:
             value = float(payload.decode())
         except ValueError:
             return
         self._buffer.setdefault(tank_id, {})[var] = value
 
+    def _device_timestamp(self, tank_id: str, ts: float) -> dt.datetime | None:
+        """Hora de la lectura telemetry, o ``None`` si debe descartarse.
+
+        Una marca no finita se descarta; una fuera de
+        ``[ahora - DEVICE_CLOCK_MAX_AGE_SECONDS, ahora + DEVICE_CLOCK_MAX_AHEAD_SECONDS]``
+        se sustituye por la hora del servidor (no tendría partición en BD).
+        Las lecturas no posteriores a la última del tanque se descartan para
+        que la caché caliente siga ordenada.
+        """
+        if not math.isfinite(ts):
+            logger.debug("Telemetry de %s con marca de tiempo no válida: %r", tank_id, ts)
+            return None
+        now = dt.datetime.now(dt.timezone.utc).timestamp()
+        if not now - DEVICE_CLOCK_MAX_AGE_SECONDS <= ts <= now + DEVICE_CLOCK_MAX_AHEAD_SECONDS:
+            logger.debug("Reloj de %s desfasado (%.0f s); se usa la hora del servidor", tank_id, ts - now)
+            ts = now
+        if ts <= self._telemetry_last.get(tank_id, -math.inf):
+            return None
+        self._telemetry_last[tank_id] = ts
+        return _from_epoch(ts)
+
+    def _collect_rows(self, now: dt.datetime) -> list[ReadingRow]:
+        """Extrae las lecturas telemetry y los tanques con las tres variables recibidas."""
+        rows, self._telemetry = self._telemetry, []
+        for tank_id, values in list(self._buffer.items()):
+            if len(values) == len(VARIABLES):
+                rows.append(ReadingRow(tank_id, now, *(values[var] for var in VARIABLES)))
+                del self._buffer[tank_id]
+        return rows
+
+    def _publish_in_memory(self, rows: list[ReadingRow]) -> None:
+        """Lleva las lecturas del ciclo a las cachés, al motor de alarmas y a los clientes en vivo."""
+        self._hot_cache.append_rows(rows)
+        alarm_engine.ingest(rows)
+        live_hub.publish(rows)
+
     async def _flush_loop(self) -> None:
-        """Cada segundo escribe los datos completos recibidos en la BD."""
+        """Cada segundo escribe los datos completos recibidos en la BD.
+
+        Todas las lecturas del ciclo viajan en una sola sentencia; los tanques
+        nuevos se registran en un único *upsert* previo.
+        """
         async for db in get_db():  # type: ignore[misc]
             while True:
                 await asyncio.sleep(1)
-                if not self._buffer:
+                rows = self._collect_rows(dt.datetime.utcnow())
+                if not rows:
                     continue
-                now = dt.datetime.utcnow()
-                for tank_id, values in list(self._buffer.items()):
-                    if {"temperature", "pressure", "co2"}.issubset(values.keys()):
-                        reading = FermentationReading(
-                            tank_id=tank_id,
-                            timestamp=now,
-                            temperature=values["temperature"],
-                            pressure=values["pressure"],
-                            co2=values["co2"],
-                        )
-                        db.add(reading)
-                        # Ensure tank exists
-                        tank = await db.get(FermentationTank, tank_id)
-                        if not tank:
-                            db.add(FermentationTank(id=tank_id, name=tank_id))
-                        del self._buffer[tank_id]
-                await db.commit()
-
-    def setup(self) -> None:
-        mqtt_manager.add_listener(self._mqtt_listener)
-        self._flush_task = asyncio.create_task(self._flush_loop())
+                self._publish_in_memory(rows)
+                flushed_rollups = None
+                loop_time = asyncio.get_running_loop().time()
+                try:
+                    await self._writer.write(db, rows)
+                    if loop_time - self._rollups_flushed_at >= settings.rollup_flush_seconds:
+                        flushed_rollups = await self._rollups.flush(db)
+                    await db.commit()
+                    analytics_cache.invalidate(rows)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:  # noqa: BLE001 - un fallo puntual de BD no detiene la ingesta
+                    await db.rollback()
+                    self._writer.reset()
+                    if flushed_rollups:
+                        self._rollups.restore(flushed_rollups)
+                    logger.exception("Error escribiendo lecturas de fermentación; se descartan las del ciclo")
+                    continue
+                # sólo lecturas ya confirmadas: los agregados no cuentan las descartadas
+                self._rollups.add_rows(rows)
+                if flushed_rollups is not None:
+                    self._rollups_flushed_at = loop_time
+
+    async def _spool_loop(self) -> None:
+        """Cada segundo anexa los datos completos recibidos al spool.
+
+        El ciclo sólo toca memoria y disco local; la BD es cosa del drenador
+        (:meth:`_drain_loop`).
+        """
+        while True:
+            await asyncio.sleep(1)
+            rows = self._collect_rows(dt.datetime.utcnow())
+            if rows:
+                self._publish_in_memory(rows)
+                self._spool.append(rows)
+
+    async def _live_loop(self) -> None:
+        """Cada segundo publica en memoria los datos recibidos, sin persistir."""
+        while True:
+            await asyncio.sleep(1)
+            rows = self._collect_rows(dt.datetime.utcnow())
+            if rows:
+                self._publish_in_memory(rows)
+                # las persiste otro proceso: no hay commit local tras el que invalidar
+                analytics_cache.invalidate(rows)
+
+    async def _drain_loop(self) -> None:
+        """Vuelca el spool a la BD en lotes grandes.
+
+        Si la BD no está disponible el lote se descarta de memoria y se
+        reintenta desde el mismo checkpoint en el siguiente ciclo: las
+        lecturas siguen acumulándose en el spool sin frenar la ingesta. Un
+        lote que la BD rechaza por sus datos ``DRAIN_MAX_ATTEMPTS`` veces
+        seguidas se escribe por mitades hasta aislar las lecturas rechazadas,
+        que se apartan a la cuarentena del spool sin bloquear el resto.
+        """
+        rejected = 0
+        async for db in get_db():  # type: ignore[misc]
+            while True:
+                await asyncio.sleep(settings.spool_drain_seconds)
+                try:
+                    # sólo el lote que viene fallando se escribe aislando lecturas
+                    isolate = rejected >= DRAIN_MAX_ATTEMPTS
+                    while await self._drain_batch(db, isolate):
+                        isolate = False
+                    rejected = 0
+                except asyncio.CancelledError:
+                    raise
+                except REJECTED_ERRORS:
+                    await db.rollback()
+                    self._writer.reset()
+                    rejected += 1
+                    logger.exception("La BD rechaza el lote del spool (intento %s)", rejected)
+                except Exception:  # noqa: BLE001 - se reintenta en el siguiente ciclo
+                    await db.rollback()
+                    self._writer.reset()
+                    logger.exception("Error drenando el spool de lecturas; se reintentará")
+
+    async def _drain_batch(self, db: AsyncSession, isolate: bool = False) -> bool:
+        """Persiste un lote del spool; devuelve ``True`` si quedó lleno.
+
+        Con ``isolate`` las lecturas que la BD rechaza van a la cuarentena en
+        lugar de hacer fallar el lote.
+        """
+        self._spool.sync()
+        # lo ya confirmado en BD (p. ej. caída antes del checkpoint local) no se repite
+        checkpoint_table = FermentationSpoolCheckpoint
+        stored = (
+            await db.execute(
+                select(checkpoint_table.segment, checkpoint_table.offset)
+                .where(checkpoint_table.spool_id == self._spool.spool_id)
+                .with_for_update()
+            )
+        ).first()
+        if stored is not None:
+            self._spool.commit(SpoolPosition(*stored))
+        rows, position = self._spool.read_batch(settings.spool_batch_rows)
+        if not rows:
+            await db.rollback()
+            return False
+        if isolate:
+            written, refused = await self._write_isolating(db, rows)
+            if refused:
+                # antes del commit: si éste falla, repetir la cuarentena es mejor que perderla
+                self._spool.quarantine(refused)
+                logger.error("%s lecturas del spool rechazadas por la BD, apartadas a cuarentena", len(refused))
+        else:
+            await self._writer.write(db, rows)
+            written = rows
+        # agregados del propio lote: se confirman en la misma transacción que
+        # las lecturas y la posición del spool, así un reintento no los
+        # duplica ni los pierde
+        rollups = RollupAccumulator()
+        rollups.add_rows(written)
+        await rollups.flush(db)
+        checkpoint = pg_insert(FermentationSpoolCheckpoint).values(
+            spool_id=self._spool.spool_id,
+            segment=position.segment,
+            offset=position.offset,
+            updated_at=dt.datetime.now(dt.timezone.utc),
+        )
+        await db.execute(
+            checkpoint.on_conflict_do_update(
+                index_elements=[FermentationSpoolCheckpoint.spool_id],
+                set_={name: checkpoint.excluded[name] for name in ("segment", "offset", "updated_at")},
+            )
+        )
+        await db.commit()
+        self._spool.commit(position)
+        # una analítica calculada desde BD antes de este commit no incluía estas lecturas
+        analytics_cache.invalidate(written)
+        return len(rows) >= settings.spool_batch_rows
+
+    async def _write_isolating(
+        self, db: AsyncSession, rows: Sequence[ReadingRow]
+    ) -> tuple[list[ReadingRow], list[ReadingRow]]:
+        """Escribe ``rows`` en *savepoints*, partiendo por la mitad lo rechazado.
+
+        Devuelve ``(escritas, rechazadas)``; O(log n) reintentos por lectura mala.
+        """
+        try:
+            async with db.begin_nested():
+                await self._writer.write(db, rows)
+            return list(rows), []
+        except REJECTED_ERRORS:
+            # los tanques auto-registrados en el savepoint deshecho no existen
+            self._writer.reset()
+            if len(rows) == 1:
+                return [], list(rows)
+        middle = len(rows) // 2
+        written, refused = await self._write_isolating(db, rows[:middle])
+        more_written, more_refused = await self._write_isolating(db, rows[middle:])
+        return written + more_written, refused + more_refused
+
+    def setup(
+        self,
+        topics: Iterable[str] = TOPIC_FILTERS,
+        *,
+        share_group: str | None = None,
+        spool_dir: str | None = None,
+        persist: bool = True,
+    ) -> ListenerChannel:
+        """Registra el listener MQTT y arranca las tareas de ingesta.
+
+        Los workers de ingesta (ver :mod:`app.services.ingestion_worker`)
+        pasan sólo los filtros de sus tanques, su grupo de suscripción
+        compartida y un directorio de spool propio. Con ``persist=False``
+        (API con ingesta externa) las lecturas sólo alimentan la caché en
+        memoria y los clientes en vivo.
+        """
+        # el buffer sólo guarda el último valor por variable: coalescer por tópico
+        # no pierde información y acota la cola ante ráfagas
+        channel = mqtt_manager.add_listener(
+            self._mqtt_listener, topics, policy=OverflowPolicy.COALESCE, share_group=share_group
+        )
+        if not persist:
+            self._flush_task = asyncio.create_task(self._live_loop())
+        elif settings.spool_enabled:
+            self._spool = WriteAheadSpool(
+                spool_dir or settings.spool_dir, settings.spool_segment_bytes, settings.spool_max_segments
+            )
+            self._flush_task = asyncio.create_task(self._spool_loop())
+            self._drain_task = asyncio.create_task(self._drain_loop())
+        else:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        return channel
+
+
+def _as_utc(timestamp: dt.datetime) -> dt.datetime:
+    """Normaliza a UTC; las fechas *naive* se interpretan como UTC."""
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=dt.timezone.utc)
+    return timestamp.astimezone(dt.timezone.utc)
+
+
+def _from_epoch(ts: float) -> dt.datetime:
+    return dt.datetime.fromtimestamp(float(ts), dt.timezone.utc)
+
+
+def _raw_select(tank_id: str):
+    return select(
+        FermentationReading.timestamp,
+        FermentationReading.temperature,
+        FermentationReading.pressure,
+        FermentationReading.co2,
+    ).where(FermentationReading.tank_id == tank_id)
+
+
+def _bulk_select(tank_ids: Sequence[str], resolution: int, start: dt.datetime, end: dt.datetime):
+    """Consulta única de varios tanques: lecturas crudas o medias del rollup."""
+    if resolution == RAW_RESOLUTION:
+        return (
+            select(
+                FermentationReading.tank_id,
+                FermentationReading.timestamp,
+                FermentationReading.temperature,
+                FermentationReading.pressure,
+                FermentationReading.co2,
+            )
+            .where(FermentationReading.tank_id.in_(tank_ids))
+            .where(FermentationReading.timestamp >= start)
+            .where(FermentationReading.timestamp <= end)
+            .order_by(FermentationReading.timestamp)
+        )
+    bucket_start = start - dt.timedelta(seconds=start.timestamp() % resolution)
+    return (
+        select(
+            FermentationRollup.tank_id,
+            FermentationRollup.bucket,
+            FermentationRollup.temperature_mean,
+            FermentationRollup.pressure_mean,
+            FermentationRollup.co2_mean,
+        )
+        .where(FermentationRollup.tank_id.in_(tank_ids))
+        .where(FermentationRollup.resolution == resolution)
+        .where(FermentationRollup.bucket >= bucket_start)
+        .where(FermentationRollup.bucket <= end)
+        .order_by(FermentationRollup.bucket)
+    )
+
+
+def _align_columns(
+    series: dict[str, dict[str, np.ndarray]], tank_ids: Sequence[str], resolution: int
+) -> tuple[np.ndarray, dict[str, dict[str, np.ndarray]]]:
+    """Lleva las series de cada tanque a un eje común de intervalos de ``resolution`` s."""
+    buckets = {
+        tank_id: np.floor(columns["timestamp"] / resolution) * resolution for tank_id, columns in series.items()
+    }
+    axis = np.unique(np.concatenate(list(buckets.values()))) if buckets else np.zeros(0)
+    aligned = {}
+    for tank_id in tank_ids:
+        out = {name: np.full(len(axis), np.nan) for name in COLUMNS}
+        if tank_id in series:
+            positions = np.searchsorted(axis, buckets[tank_id])
+            for name in COLUMNS:
+                out[name][positions] = series[tank_id][name]
+        aligned[tank_id] = out
+    return axis, aligned
+
+
+def _nullable_list(values: np.ndarray) -> list[float | None]:
+    return [None if v != v else v for v in values.tolist()]
+
+
+def _columns_from_rows(rows) -> dict[str, np.ndarray]:
+    """Filas ``(timestamp, temperature, pressure, co2)`` a columnas NumPy."""
+    rows = list(rows)
+    columns = {"timestamp": np.array([ts.timestamp() for ts, *_ in rows], dtype=np.float64)}
+    for idx, name in enumerate(COLUMNS, start=1):
+        columns[name] = np.array([row[idx] for row in rows], dtype=np.float64)
+    return columns
+
+
+def _concat_columns(
+    first: dict[str, np.ndarray], second: dict[str, np.ndarray] | None
+) -> dict[str, np.ndarray]:
+    if second is None:
+        return first
+    return {name: np.concatenate((first[name], second[name])) for name in first}
+
+
+def _rows_from_columns(columns: dict[str, np.ndarray]) -> list[dict[str, Any]]:
+    """Convierte columnas al formato de ``ReadingDTO``."""
+    return [
+        {
+            "timestamp": dt.datetime.fromtimestamp(ts, dt.timezone.utc).isoformat(),
+            "temperature": temp,
+            "pressure": press,
+            "co2": co2,
+        }
+        for ts, temp, press, co2 in zip(
+            columns["timestamp"].tolist(),
+            columns["temperature"].tolist(),
+            columns["pressure"].tolist(),
+            columns["co2"].tolist(),
+        )
+    ]
 
 
 fermentation_service = FermentationService()
@@ -0,0 +1,143 @@
+"""Escritor masivo de lecturas de fermentación.
+
+Agrupa las lecturas de cada ciclo de *flush* en una única sentencia ``INSERT``
+multi-fila (o ``COPY`` para lotes grandes) y mantiene en memoria el registro de
+tanques conocidos, de modo que nunca se consulta la tabla de tanques lectura a
+lectura. En la misma transacción actualiza la última lectura de cada tanque
+(``fermentation_latest_readings``).
+"""
+from __future__ import annotations
+
+import datetime as dt
+import logging
+from collections.abc import Iterable, Sequence
+from typing import NamedTuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.fermentation import FermentationLatestReading, FermentationReading, FermentationTank
+
+logger = logging.getLogger(__name__)
+
+# asyncpg admite como máximo 32767 parámetros por sentencia (5 por lectura)
+INSERT_CHUNK_ROWS = 5000
+# A partir de este tamaño se usa COPY en lugar de INSERT multi-fila
+COPY_THRESHOLD_ROWS = 20000
+
+READING_COLUMNS = ("tank_id", "timestamp", "temperature", "pressure", "co2")
+
+
+class ReadingRow(NamedTuple):
+    """Lectura completa de un tanque lista para persistir."""
+
+    tank_id: str
+    timestamp: dt.datetime
+    temperature: float
+    pressure: float
+    co2: float
+
+
+class FermentationBulkWriter:
+    """Persiste lotes de lecturas con el mínimo de viajes a la BD."""
+
+    def __init__(self) -> None:
+        # ids de tanques que sabemos existen en BD
+        self._known_tanks: set[str] = set()
+        self._primed = False
+
+    # ------------------------------------------------------------------
+    # Registro de tanques
+    # ------------------------------------------------------------------
+    @property
+    def known_tanks(self) -> frozenset[str]:
+        return frozenset(self._known_tanks)
+
+    def register_known(self, tank_ids: Iterable[str]) -> None:
+        """Marca tanques creados por otras vías (p. ej. asignación de perfil)."""
+        self._known_tanks.update(tank_ids)
+
+    def reset(self) -> None:
+        """Olvida el registro; se recarga desde BD en la siguiente escritura.
+
+        Debe llamarse tras un *rollback*, ya que los tanques auto-registrados
+        en la transacción fallida no llegaron a existir.
+        """
+        self._known_tanks.clear()
+        self._primed = False
+
+    async def _prime(self, db: AsyncSession) -> None:
+        result = await db.execute(select(FermentationTank.id))
+        self._known_tanks.update(result.scalars().all())
+        self._primed = True
+        logger.info("Registro de tanques cargado: %s tanques", len(self._known_tanks))
+
+    async def ensure_tanks(self, db: AsyncSession, tank_ids: Iterable[str]) -> None:
+        """Registra en un único *upsert* los tanques aún desconocidos."""
+        if not self._primed:
+            await self._prime(db)
+        new_ids = sorted(set(tank_ids) - self._known_tanks)
+        if not new_ids:
+            return
+        stmt = (
+            pg_insert(FermentationTank)
+            .values([{"id": tank_id, "name": tank_id} for tank_id in new_ids])
+            .on_conflict_do_nothing(index_elements=[FermentationTank.id])
+        )
+        await db.execute(stmt)
+        self._known_tanks.update(new_ids)
+        logger.info("Auto-registrados %s tanques nuevos", len(new_ids))
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+    async def write(self, db: AsyncSession, rows: Sequence[ReadingRow]) -> None:
+        """Inserta las lecturas sin confirmar la transacción (commit del llamador)."""
+        if not rows:
+            return
+        await self.ensure_tanks(db, (row.tank_id for row in rows))
+        if len(rows) >= COPY_THRESHOLD_ROWS:
+            await self._copy(db, rows)
+        else:
+            for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+                chunk = rows[start : start + INSERT_CHUNK_ROWS]
+                await db.execute(insert(FermentationReading).values([row._asdict() for row in chunk]))
+        await self.upsert_latest(db, rows)
+
+    async def upsert_latest(self, db: AsyncSession, rows: Sequence[ReadingRow]) -> None:
+        """Actualiza la última lectura de los tanques del lote.
+
+        Sólo avanza: una lectura más antigua que la guardada (p. ej. un lote
+        del spool reintentado) no la sobrescribe.
+        """
+        latest: dict[str, ReadingRow] = {}
+        for row in rows:
+            current = latest.get(row.tank_id)
+            if current is None or _utc(row.timestamp) >= _utc(current.timestamp):
+                latest[row.tank_id] = row
+        values = [latest[tank_id]._asdict() for tank_id in sorted(latest)]
+        table = FermentationLatestReading.__table__
+        for start in range(0, len(values), INSERT_CHUNK_ROWS):
+            stmt = pg_insert(table).values(values[start : start + INSERT_CHUNK_ROWS])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.tank_id],
+                set_={column: stmt.excluded[column] for column in READING_COLUMNS[1:]},
+                where=table.c.timestamp <= stmt.excluded.timestamp,
+            )
+            await db.execute(stmt)
+
+    async def _copy(self, db: AsyncSession, rows: Sequence[ReadingRow]) -> None:
+        """Carga mediante ``COPY`` usando la conexión asyncpg de la sesión."""
+        conn = await db.connection()
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            FermentationReading.__tablename__,
+            records=rows,
+            columns=READING_COLUMNS,
+        )
+
+
+def _utc(timestamp: dt.datetime) -> dt.datetime:
+    """Las fechas *naive* se interpretan como UTC."""
+    return timestamp if timestamp.tzinfo is not None else timestamp.replace(tzinfo=dt.timezone.utc)
@@ -0,0 +1,132 @@
+"""Caché columnar en memoria de las lecturas recientes por tanque.
+
+Cada tanque tiene un *ring buffer* respaldado por arrays NumPy (marca de
+tiempo en segundos epoch UTC + temperatura, presión y CO₂) con capacidad fija.
+El número de tanques también está acotado (se expulsa el menos reciente), por
+lo que el consumo de memoria máximo es conocido de antemano y se reporta en
+:meth:`HotCache.stats`.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+
+from app.services.fermentation_writer import ReadingRow
+
+COLUMNS = ("temperature", "pressure", "co2")
+
+TS_DTYPE = np.float64
+VALUE_DTYPE = np.float64
+
+
+def to_epoch(timestamp: dt.datetime) -> float:
+    """Segundos epoch; las fechas *naive* se interpretan como UTC."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=dt.timezone.utc)
+    return timestamp.timestamp()
+
+
+class TankRingBuffer:
+    """Buffer circular de muestras de un tanque."""
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError("capacity debe ser >= 1")
+        self.capacity = capacity
+        self._ts = np.zeros(capacity, dtype=TS_DTYPE)
+        self._values = np.zeros((len(COLUMNS), capacity), dtype=VALUE_DTYPE)
+        self._next = 0  # posición de escritura
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._ts.nbytes + self._values.nbytes
+
+    @property
+    def oldest_ts(self) -> float | None:
+        if not self._size:
+            return None
+        return float(self._ts[(self._next - self._size) % self.capacity])
+
+    @property
+    def newest_ts(self) -> float | None:
+        if not self._size:
+            return None
+        return float(self._ts[(self._next - 1) % self.capacity])
+
+    def append(self, ts: float, temperature: float, pressure: float, co2: float) -> None:
+        self._ts[self._next] = ts
+        self._values[:, self._next] = (temperature, pressure, co2)
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def _ordered(self) -> tuple[np.ndarray, np.ndarray]:
+        """Copias en orden cronológico de marcas de tiempo y valores."""
+        if self._size < self.capacity:
+            return self._ts[: self._size].copy(), self._values[:, : self._size].copy()
+        return np.roll(self._ts, -self._next), np.roll(self._values, -self._next, axis=1)
+
+    def columns(
+        self,
+        start_ts: float | None = None,
+        end_ts: float | None = None,
+        last: int | None = None,
+    ) -> dict[str, np.ndarray]:
+        """Devuelve ``{"timestamp": ..., "temperature": ..., ...}`` en orden.
+
+        ``start_ts``/``end_ts`` (inclusivos) recortan por tiempo y ``last``
+        limita a las N muestras más recientes del rango.
+        """
+        ts, values = self._ordered()
+        lo = int(np.searchsorted(ts, start_ts, side="left")) if start_ts is not None else 0
+        hi = int(np.searchsorted(ts, end_ts, side="right")) if end_ts is not None else len(ts)
+        if last is not None:
+            lo = max(lo, hi - last)
+        out = {"timestamp": ts[lo:hi]}
+        for idx, name in enumerate(COLUMNS):
+            out[name] = values[idx, lo:hi]
+        return out
+
+
+class HotCache:
+    """Registro acotado de *ring buffers* por tanque (LRU por escritura)."""
+
+    def __init__(self, capacity: int, max_tanks: int) -> None:
+        self.capacity = capacity
+        self.max_tanks = max_tanks
+        self._buffers: OrderedDict[str, TankRingBuffer] = OrderedDict()
+        self.evictions = 0
+
+    def get(self, tank_id: str) -> TankRingBuffer | None:
+        return self._buffers.get(tank_id)
+
+    def append_rows(self, rows: Sequence[ReadingRow]) -> None:
+        for row in rows:
+            buffer = self._buffers.get(row.tank_id)
+            if buffer is None:
+                if len(self._buffers) >= self.max_tanks:
+                    self._buffers.popitem(last=False)
+                    self.evictions += 1
+                buffer = self._buffers[row.tank_id] = TankRingBuffer(self.capacity)
+            else:
+                self._buffers.move_to_end(row.tank_id)
+            buffer.append(to_epoch(row.timestamp), row.temperature, row.pressure, row.co2)
+
+    def stats(self) -> dict[str, Any]:
+        per_tank = TankRingBuffer(1).nbytes * self.capacity
+        return {
+            "tanks": len(self._buffers),
+            "max_tanks": self.max_tanks,
+            "samples_per_tank": self.capacity,
+            "samples": sum(len(buf) for buf in self._buffers.values()),
+            "bytes": sum(buf.nbytes for buf in self._buffers.values()),
+            "max_bytes": per_tank * self.max_tanks,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,181 @@
+"""Workers de ingesta de fermentación escalables horizontalmente.
+
+Cada worker es un proceso (o contenedor) independiente con su propio bucle
+asyncio, buffer, spool y escritor de BD. Los tanques se reparten entre ``N``
+shards con ``crc32(tank_id) % N`` y cada worker se suscribe sólo a los tópicos
+de los tanques de su shard, dentro del grupo compartido
+``$share/<grupo>-<shard>/...``: así todas las variables de un tanque llegan
+siempre al mismo worker y varias réplicas del mismo shard se reparten la
+carga o actúan de respaldo. Cada réplica tiene su propio spool en
+``<SPOOL_DIR>/shard-<n>/<instancia>`` (``--instance``, por defecto
+``INGEST_INSTANCE`` o el hostname).
+
+Los tanques nuevos se descubren con una suscripción compartida por todos los
+workers (``$share/<grupo>-discovery/brewpi/fermentation/+/temperature`` y
+``.../+/telemetry``): el worker que recibe un tanque desconocido lo reclama si
+es suyo o lo registra en BD para que su dueño lo adopte en el siguiente
+refresco del registro.
+
+Uso::
+
+    python -m app.services.ingestion_worker --shards 4             # 4 procesos
+    python -m app.services.ingestion_worker --shards 4 --shard 2   # sólo el shard 2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import zlib
+
+from sqlalchemy import select
+
+from app.core.config import get_settings
+from app.db.session import AsyncSessionLocal
+from app.models.fermentation import FermentationTank
+from app.services.fermentation_service import (
+    TELEMETRY_SUFFIX,
+    TOPIC_PREFIX,
+    fermentation_service,
+    tank_topic_filters,
+)
+from app.services.fermentation_writer import FermentationBulkWriter
+from app.services.mqtt import mqtt_manager
+from app.services.mqtt_dispatch import ListenerChannel, OverflowPolicy
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# una variable por formato basta para descubrir cada tanque
+DISCOVERY_FILTERS = (f"{TOPIC_PREFIX}/+/temperature", f"{TOPIC_PREFIX}/+/{TELEMETRY_SUFFIX}")
+
+
+def shard_of(tank_id: str, shards: int) -> int:
+    """Shard dueño de un tanque (estable entre procesos y reinicios)."""
+    return zlib.crc32(tank_id.encode()) % shards
+
+
+class IngestionWorker:
+    """Ingesta de los tanques de un shard."""
+
+    def __init__(self, shard: int, shards: int, group: str, instance: str) -> None:
+        if not 0 <= shard < shards:
+            raise ValueError(f"Shard {shard} fuera de rango (0..{shards - 1})")
+        if not instance or os.path.basename(instance) != instance or instance in (".", ".."):
+            raise ValueError(f"Instancia no válida: {instance!r}")
+        self.shard = shard
+        self.shards = shards
+        self.group = group
+        self.instance = instance
+        self._owned: set[str] = set()
+        self._known: set[str] = set()
+        self._channel: ListenerChannel | None = None
+        self._registry = FermentationBulkWriter()
+
+    def owns(self, tank_id: str) -> bool:
+        return shard_of(tank_id, self.shards) == self.shard
+
+    def _claim(self, tank_ids: set[str]) -> None:
+        new = {tank_id for tank_id in tank_ids if self.owns(tank_id)} - self._owned
+        if not new:
+            return
+        self._owned |= new
+        mqtt_manager.set_listener_topics(self._channel, tank_topic_filters(self._owned))
+        logger.info(
+            "Shard %s/%s: %s tanques propios (+%s)", self.shard, self.shards, len(self._owned), len(new)
+        )
+
+    async def refresh_ownership(self) -> None:
+        """Adopta los tanques del registro que pertenecen a este shard."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(FermentationTank.id))
+            tank_ids = set(result.scalars().all())
+        self._known |= tank_ids
+        self._claim(tank_ids)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh_ownership()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - se reintenta en el siguiente ciclo
+                logger.exception("Error refrescando el registro de tanques")
+            await asyncio.sleep(settings.ingest_refresh_seconds)
+
+    async def _discovery_listener(self, topic: str, payload: bytes) -> None:
+        tank_id = topic.rsplit("/", 2)[1]
+        if tank_id in self._known:
+            return
+        self._known.add(tank_id)
+        if self.owns(tank_id):
+            self._claim({tank_id})
+            return
+        # tanque de otro shard: se registra para que su dueño lo adopte
+        async with AsyncSessionLocal() as db:
+            await self._registry.ensure_tanks(db, [tank_id])
+            await db.commit()
+
+    async def run(self) -> None:
+        # las réplicas de un shard comparten volumen pero no spool
+        spool_dir = os.path.join(settings.spool_dir, f"shard-{self.shard}", self.instance)
+        self._channel = fermentation_service.setup(
+            (), share_group=f"{self.group}-{self.shard}", spool_dir=spool_dir
+        )
+        mqtt_manager.add_listener(
+            self._discovery_listener,
+            DISCOVERY_FILTERS,
+            policy=OverflowPolicy.COALESCE,
+            share_group=f"{self.group}-discovery",
+        )
+        logger.info(
+            "Worker de ingesta %s/%s (grupo %s, instancia %s) arrancado",
+            self.shard, self.shards, self.group, self.instance,
+        )
+        await asyncio.gather(mqtt_manager.run_forever(), self._refresh_loop())
+
+
+def run_shard(shard: int, shards: int, group: str, instance: str) -> None:
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [shard {shard}] %(name)s: %(message)s")
+    asyncio.run(IngestionWorker(shard, shards, group, instance).run())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker(s) de ingesta de fermentación")
+    parser.add_argument("--shards", type=int, default=settings.ingest_shards, help="número total de shards")
+    parser.add_argument("--shard", type=int, default=None, help="shard a ejecutar (por defecto, todos)")
+    parser.add_argument("--group", default=settings.ingest_share_group, help="prefijo del grupo $share")
+    parser.add_argument(
+        "--instance",
+        default=settings.ingest_instance or socket.gethostname(),
+        help="identificador de esta réplica (subdirectorio del spool)",
+    )
+    args = parser.parse_args()
+
+    if args.shard is not None:
+        run_shard(args.shard, args.shards, args.group, args.instance)
+        return
+
+    # un proceso por shard; "spawn" evita heredar bucles o conexiones del padre
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(
+            target=run_shard, args=(shard, args.shards, args.group, args.instance), name=f"ingest-{shard}"
+        )
+        for shard in range(args.shards)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Elección de líder entre los workers de la API.
+
+Con varios procesos uvicorn, las tareas que deben ejecutarse una sola vez en
+todo el despliegue (mantenimiento de particiones, fotos de inventario,
+publicación de alarmas y consignas) sólo corren en el proceso que posee el
+*advisory lock* de sesión ``LEADER_LOCK_KEY`` de PostgreSQL. El bloqueo vive
+en una conexión asyncpg propia: si se pierde, PostgreSQL lo libera y otro
+worker lo toma en su siguiente intento, mientras el antiguo líder detiene sus
+tareas al fallar la comprobación periódica de la conexión.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+from collections.abc import Callable
+from typing import Any
+
+import asyncpg
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Clave de pg_try_advisory_lock que identifica al líder
+LEADER_LOCK_KEY = 0x4C454144
+# Intervalo entre intentos de tomar el bloqueo y comprobaciones de la conexión (s)
+LEADER_CHECK_SECONDS = 5.0
+
+
+class LeaderElection:
+    """Arranca las tareas registradas mientras este proceso tiene el bloqueo."""
+
+    def __init__(self, lock_key: int) -> None:
+        self.lock_key = lock_key
+        self._jobs: list[tuple[Callable[[], Any], Callable[[], Any]]] = []
+        self._task: asyncio.Task | None = None
+        self.is_leader = False
+        self.elections = 0
+
+    def add_job(self, start: Callable[[], Any], stop: Callable[[], Any]) -> None:
+        """Registra una tarea de líder (``stop`` puede ser corrutina)."""
+        self._jobs.append((start, stop))
+
+    async def _lead(self) -> None:
+        self.is_leader = True
+        self.elections += 1
+        logger.info("Este worker es el líder: arrancan las tareas únicas")
+        for start, _ in self._jobs:
+            try:
+                start()
+            except Exception:  # noqa: BLE001 - las demás arrancan igualmente
+                logger.exception("Error arrancando una tarea de líder")
+
+    async def _step_down(self) -> None:
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        logger.warning("Este worker deja de ser el líder: se detienen las tareas únicas")
+        for _, stop in reversed(self._jobs):
+            try:
+                result = stop()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:  # noqa: BLE001 - se detienen las demás igualmente
+                logger.exception("Error deteniendo una tarea de líder")
+
+    async def _run(self) -> None:
+        while True:
+            conn: asyncpg.Connection | None = None
+            try:
+                conn = await asyncpg.connect(settings.database_dsn)
+                while not await conn.fetchval("SELECT pg_try_advisory_lock($1)", self.lock_key):
+                    await asyncio.sleep(LEADER_CHECK_SECONDS)
+                await self._lead()
+                # el bloqueo dura lo que la sesión: se comprueba que sigue viva
+                while True:
+                    await asyncio.sleep(LEADER_CHECK_SECONDS)
+                    await asyncio.wait_for(conn.fetchval("SELECT 1"), LEADER_CHECK_SECONDS)
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                logger.warning("Conexión de elección de líder perdida (%s); reintentando", exc)
+            finally:
+                await self._step_down()
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+            await asyncio.sleep(LEADER_CHECK_SECONDS)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="leader-election")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {"leader": self.is_leader, "elections": self.elections}
+
+
+leader_election = LeaderElection(LEADER_LOCK_KEY)
@@ -0,0 +1,121 @@
+"""Difusión en vivo de la telemetría de fermentación a clientes HMI.
+
+La ingesta entrega a :class:`LiveTelemetryHub` las lecturas completas de cada
+ciclo. El *hub* serializa cada lectura a JSON **una sola vez** y deja el
+fragmento en el buzón de cada cliente suscrito a ese tanque, sobrescribiendo
+el anterior: cada cliente guarda como mucho una lectura pendiente por tanque,
+así que un cliente lento recibe siempre el último valor en lugar de acumular
+un retraso sin límite. Cada cliente envía a su propio ritmo (``max_rate``
+mensajes por segundo como máximo).
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import json
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from app.services.fermentation_writer import ReadingRow
+
+
+def encode_reading(row: ReadingRow) -> str:
+    timestamp = row.timestamp
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=dt.timezone.utc)
+    return json.dumps(
+        {
+            "tank_id": row.tank_id,
+            "timestamp": timestamp.isoformat(),
+            "temperature": row.temperature,
+            "pressure": row.pressure,
+            "co2": row.co2,
+        },
+        separators=(",", ":"),
+    )
+
+
+class LiveClient:
+    """Buzón coalescente de un cliente: último fragmento por tanque."""
+
+    def __init__(self, tank_ids: Iterable[str] | None, max_rate: float) -> None:
+        self.tank_ids: frozenset[str] | None = None
+        self.min_interval = 0.0
+        self.configure(tank_ids, max_rate)
+        self._pending: dict[str, str] = {}
+        self._ready = asyncio.Event()
+        self._last_sent = 0.0
+        self.sent = 0
+        self.coalesced = 0
+
+    def configure(self, tank_ids: Iterable[str] | None, max_rate: float) -> None:
+        """``tank_ids=None`` suscribe a todos los tanques; ``max_rate`` en Hz."""
+        if max_rate <= 0:
+            raise ValueError("max_rate debe ser > 0")
+        self.tank_ids = frozenset(tank_ids) if tank_ids is not None else None
+        self.min_interval = 1.0 / max_rate
+
+    def wants(self, tank_id: str) -> bool:
+        return self.tank_ids is None or tank_id in self.tank_ids
+
+    def offer(self, tank_id: str, fragment: str) -> None:
+        if tank_id in self._pending:
+            self.coalesced += 1
+        self._pending[tank_id] = fragment
+        self._ready.set()
+
+    async def next_message(self) -> str:
+        """Espera lecturas nuevas respetando ``max_rate`` y las empaqueta."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ready.wait()
+            delay = self._last_sent + self.min_interval - loop.time()
+            if delay > 0:
+                # lo que llegue mientras tanto sobrescribe el buzón
+                await asyncio.sleep(delay)
+            self._ready.clear()
+            pending, self._pending = self._pending, {}
+            if pending:
+                break
+        self._last_sent = loop.time()
+        self.sent += 1
+        return '{"type":"telemetry","readings":[' + ",".join(pending.values()) + "]}"
+
+
+class LiveTelemetryHub:
+    """Registro de clientes en vivo y difusión por ciclo de ingesta."""
+
+    def __init__(self) -> None:
+        self._clients: set[LiveClient] = set()
+        self.ticks = 0
+
+    def connect(self, tank_ids: Iterable[str] | None, max_rate: float) -> LiveClient:
+        client = LiveClient(tank_ids, max_rate)
+        self._clients.add(client)
+        return client
+
+    def disconnect(self, client: LiveClient) -> None:
+        self._clients.discard(client)
+
+    def publish(self, rows: Sequence[ReadingRow]) -> None:
+        """Reparte las lecturas del ciclo (sólo la última por tanque)."""
+        if not self._clients or not rows:
+            return
+        self.ticks += 1
+        latest = {row.tank_id: row for row in rows}
+        fragments = {tank_id: encode_reading(row) for tank_id, row in latest.items()}
+        for client in self._clients:
+            for tank_id, fragment in fragments.items():
+                if client.wants(tank_id):
+                    client.offer(tank_id, fragment)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "clients": len(self._clients),
+            "ticks": self.ticks,
+            "sent": sum(client.sent for client in self._clients),
+            "coalesced": sum(client.coalesced for client in self._clients),
+        }
+
+
+live_hub = LiveTelemetryHub()
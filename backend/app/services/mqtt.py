@@ -7,12 +7,13 @@ Se integra con FastAPI mediante eventos de startup/shutdown.
 
 import asyncio
 import logging
-from collections.abc import AsyncIterator, Callable
-from typing import Awaitable
+from collections.abc import AsyncIterator, Callable, Iterable
+from typing import Any, Awaitable
 
 from asyncio_mqtt import Client, MqttError
 
 from app.core.config import get_settings
+from app.services.mqtt_dispatch import ListenerChannel, MessageDispatcher, OverflowPolicy
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -23,17 +24,26 @@ class MQTTManager:
 
     def __init__(self) -> None:
         self._client: Client | None = None
-        self._listeners: list[Callable[[str, bytes], Awaitable[None]]] = []
+        self._dispatcher = MessageDispatcher(
+            settings.mqtt_listener_queue_size,
+            OverflowPolicy(settings.mqtt_overflow_policy),
+        )
+        # filtros actualmente suscritos en el broker
+        self._subscribed: set[str] = set()
+        self._sync_lock = asyncio.Lock()
+        self._connected = False
 
     async def connect(self) -> None:
         """Establece conexión con el broker."""
         self._client = Client(settings.mqtt_host, settings.mqtt_port)
+        self._subscribed.clear()
         await self._client.connect()
         logger.info("Conectado al broker MQTT %s:%s", settings.mqtt_host, settings.mqtt_port)
 
     async def disconnect(self) -> None:
         """Cierra la conexión MQTT si está abierta."""
         if self._client is not None:
+            self._connected = False
             await self._client.disconnect()
             logger.info("Desconexión del broker MQTT")
 
@@ -44,6 +54,13 @@ class MQTTManager:
         await self._client.subscribe(topic)
         logger.debug("Suscrito a tópico %s", topic)
 
+    async def unsubscribe(self, topic: str) -> None:
+        """Cancela la suscripción a un tópico dado."""
+        if self._client is None:
+            raise RuntimeError("Cliente MQTT no conectado")
+        await self._client.unsubscribe(topic)
+        logger.debug("Cancelada suscripción a tópico %s", topic)
+
     async def publish(self, topic: str, payload: str | bytes) -> None:
         """Publica un mensaje en un tópico."""
         if self._client is None:
@@ -51,18 +68,62 @@ class MQTTManager:
         await self._client.publish(topic, payload)
         logger.debug("Publicado en %s: %s", topic, payload)
 
-    def add_listener(self, callback: Callable[[str, bytes], Awaitable[None]]) -> None:
-        """Registra un callback para mensajes entrantes."""
-        self._listeners.append(callback)
+    def add_listener(
+        self,
+        callback: Callable[[str, bytes], Awaitable[None]],
+        topics: str | Iterable[str] = "#",
+        *,
+        maxsize: int | None = None,
+        policy: OverflowPolicy | str | None = None,
+        share_group: str | None = None,
+    ) -> ListenerChannel:
+        """Registra un callback para los tópicos que aceptan ``topics``.
+
+        ``topics`` son filtros MQTT (admiten ``+`` y ``#``); las suscripciones
+        del broker se derivan de la unión de los filtros de todos los
+        listeners. Cada callback se ejecuta en su propio worker con una cola
+        acotada de ``maxsize`` mensajes; ``policy`` decide qué hacer cuando se
+        llena. Con ``share_group`` los filtros se suscriben como suscripción
+        compartida ``$share/<share_group>/...``.
+        """
+        filters = (topics,) if isinstance(topics, str) else tuple(topics)
+        channel = self._dispatcher.register(
+            callback, filters, maxsize=maxsize, policy=policy, share_group=share_group
+        )
+        if self._connected:
+            asyncio.create_task(self._sync_subscriptions())
+        return channel
+
+    def set_listener_topics(self, channel: ListenerChannel, topics: Iterable[str]) -> None:
+        """Cambia los filtros de un listener y ajusta las suscripciones."""
+        self._dispatcher.set_filters(channel, topics)
+        if self._connected:
+            asyncio.create_task(self._sync_subscriptions())
+
+    def stats(self) -> list[dict[str, Any]]:
+        """Contadores por listener (profundidad de cola, descartes, errores)."""
+        return self._dispatcher.stats()
+
+    async def _sync_subscriptions(self) -> None:
+        """Ajusta las suscripciones del broker a los filtros registrados."""
+        async with self._sync_lock:
+            wanted = set(self._dispatcher.subscriptions())
+            for topic in sorted(wanted - self._subscribed):
+                await self.subscribe(topic)
+                self._subscribed.add(topic)
+            for topic in sorted(self._subscribed - wanted):
+                await self.unsubscribe(topic)
+                self._subscribed.discard(topic)
 
     async def _message_loop(self) -> None:
-        """Escucha mensajes entrantes y envía a los listeners."""
+        """Escucha mensajes entrantes y los enruta hacia los listeners."""
         assert self._client is not None
+        self._dispatcher.start()
         async with self._client.unfiltered_messages() as messages:
-            await self._client.subscribe("#")  # Suscribirse a todo (ajustar según necesidad)
+            self._connected = True
+            await self._sync_subscriptions()
             async for msg in messages:
-                for listener in self._listeners:
-                    await listener(msg.topic, msg.payload)
+                await self._dispatcher.dispatch(msg.topic, msg.payload)
 
     async def run_forever(self) -> None:
         """Bucle principal para mantener alive la conexión y reintentar en errores."""
@@ -72,6 +133,7 @@ class MQTTManager:
                 await self.connect()
                 await self._message_loop()
             except MqttError as exc:
+                self._connected = False
                 logger.warning("Error MQTT: %s, reconectando en %s s", exc, reconnect_interval)
                 await asyncio.sleep(reconnect_interval)
 
@@ -0,0 +1,232 @@
+"""Etapa de despacho entre el bucle de lectura MQTT y sus listeners.
+
+Cada listener declara los filtros de tópico que le interesan y recibe su
+propia cola acotada y una tarea *worker* que la consume, de modo que un
+listener lento ya no detiene la lectura del broker. Los tópicos entrantes se
+enrutan mediante un :class:`~app.services.topic_trie.TopicTrie`, así cada
+mensaje sólo llega a los listeners cuyos filtros lo aceptan.
+
+Cuando una cola se llena se aplica la política de desbordamiento configurada:
+
+* ``block``: el bucle de lectura espera a que haya hueco (contrapresión).
+* ``drop_oldest``: se descarta el mensaje más antiguo de la cola.
+* ``coalesce``: se conserva sólo el último payload por tópico; si aun así no
+  hay hueco se descarta el tópico más antiguo.
+
+Un listener puede pertenecer a un grupo de suscripción compartida
+(``$share/<grupo>/<filtro>``): el broker reparte entonces sus mensajes entre
+todos los clientes del grupo, lo que permite escalar la ingesta en varios
+procesos.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from enum import Enum
+from typing import Any, Awaitable
+
+from app.services.topic_trie import TopicTrie, minimal_subscriptions
+
+logger = logging.getLogger(__name__)
+
+Listener = Callable[[str, bytes], Awaitable[None]]
+
+
+class OverflowPolicy(str, Enum):
+    """Política aplicada cuando la cola de un listener está llena."""
+
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    COALESCE = "coalesce"
+
+
+class ListenerChannel:
+    """Cola acotada + worker dedicado para un listener."""
+
+    def __init__(
+        self,
+        callback: Listener,
+        maxsize: int,
+        policy: OverflowPolicy,
+        filters: tuple[str, ...] = ("#",),
+        share_group: str | None = None,
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize debe ser >= 1")
+        self.callback = callback
+        self.name = getattr(callback, "__qualname__", repr(callback))
+        self.filters = filters
+        self.share_group = share_group
+        self.maxsize = maxsize
+        self.policy = policy
+
+        # clave -> (topic, payload); la clave es el tópico al coalescer
+        self._items: OrderedDict[Any, tuple[str, bytes]] = OrderedDict()
+        self._seq = itertools.count()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._task: asyncio.Task | None = None
+
+        # contadores expuestos para dimensionar la cola
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    async def put(self, topic: str, payload: bytes) -> None:
+        """Encola un mensaje aplicando la política de desbordamiento."""
+        self.received += 1
+        if self.policy is OverflowPolicy.COALESCE and topic in self._items:
+            self._items[topic] = (topic, payload)
+            self.coalesced += 1
+            return
+        if len(self._items) >= self.maxsize:
+            if self.policy is OverflowPolicy.BLOCK:
+                while len(self._items) >= self.maxsize:
+                    self._not_full.clear()
+                    await self._not_full.wait()
+            else:
+                self._items.popitem(last=False)
+                self.dropped += 1
+        key = topic if self.policy is OverflowPolicy.COALESCE else next(self._seq)
+        self._items[key] = (topic, payload)
+        self.max_depth = max(self.max_depth, len(self._items))
+        self._not_empty.set()
+
+    async def _run(self) -> None:
+        while True:
+            if not self._items:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+                continue
+            _, (topic, payload) = self._items.popitem(last=False)
+            self._not_full.set()
+            try:
+                await self.callback(topic, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - un listener defectuoso no debe matar al worker
+                self.errors += 1
+                logger.exception("Error en listener MQTT %s (tópico %s)", self.name, topic)
+            else:
+                self.delivered += 1
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name=f"mqtt-listener:{self.name}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "listener": self.name,
+            "filters": list(self.filters),
+            "share_group": self.share_group,
+            "policy": self.policy.value,
+            "maxsize": self.maxsize,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+        }
+
+
+class MessageDispatcher:
+    """Enruta cada mensaje entrante a las colas de los listeners interesados."""
+
+    def __init__(self, maxsize: int, policy: OverflowPolicy) -> None:
+        self._default_maxsize = maxsize
+        self._default_policy = policy
+        self._channels: list[ListenerChannel] = []
+        self._routes: TopicTrie[ListenerChannel] = TopicTrie()
+        self._running = False
+
+    @property
+    def channels(self) -> list[ListenerChannel]:
+        return list(self._channels)
+
+    def register(
+        self,
+        callback: Listener,
+        filters: Iterable[str] = ("#",),
+        *,
+        maxsize: int | None = None,
+        policy: OverflowPolicy | str | None = None,
+        share_group: str | None = None,
+    ) -> ListenerChannel:
+        channel = ListenerChannel(
+            callback,
+            maxsize or self._default_maxsize,
+            OverflowPolicy(policy) if policy is not None else self._default_policy,
+            tuple(filters),
+            share_group,
+        )
+        for topic_filter in channel.filters:
+            self._routes.add(topic_filter, channel)
+        self._channels.append(channel)
+        if self._running:
+            channel.start()
+        return channel
+
+    def set_filters(self, channel: ListenerChannel, filters: Iterable[str]) -> None:
+        """Sustituye los filtros de un listener ya registrado."""
+        filters = tuple(filters)
+        for topic_filter in set(channel.filters) - set(filters):
+            self._routes.remove(topic_filter, channel)
+        for topic_filter in set(filters) - set(channel.filters):
+            self._routes.add(topic_filter, channel)
+        channel.filters = filters
+
+    def start(self) -> None:
+        """Arranca los workers (idempotente; se llama en cada reconexión)."""
+        self._running = True
+        for channel in self._channels:
+            channel.start()
+
+    async def stop(self) -> None:
+        self._running = False
+        for channel in self._channels:
+            await channel.stop()
+
+    def subscriptions(self) -> list[str]:
+        """Suscripciones del broker: conjunto mínimo de filtros + compartidas.
+
+        Los filtros de listeners con ``share_group`` se suscriben tal cual con
+        el prefijo ``$share/<grupo>/``; el broker entrega los mensajes con el
+        tópico original, por lo que el enrutado no cambia.
+        """
+        plain = [f for ch in self._channels if ch.share_group is None for f in ch.filters]
+        shared = {
+            f"$share/{ch.share_group}/{f}"
+            for ch in self._channels
+            if ch.share_group is not None
+            for f in ch.filters
+        }
+        return minimal_subscriptions(plain) + sorted(shared)
+
+    async def dispatch(self, topic: str, payload: bytes) -> None:
+        for channel in self._routes.match(topic):
+            await channel.put(topic, payload)
+
+    def stats(self) -> list[dict[str, Any]]:
+        return [channel.stats() for channel in self._channels]
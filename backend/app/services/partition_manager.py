@@ -0,0 +1,163 @@
+"""Gestión de particiones diarias de ``fermentation_readings``.
+
+Una tarea en segundo plano crea por adelantado las particiones de los
+próximos días y retira las que superan la retención configurada: se separan
+(``DETACH PARTITION CONCURRENTLY``) y, según la política, se conservan como
+tablas sueltas para archivo (``detach``) o se eliminan (``drop``). La
+retención pasa así a ser una operación de metadatos en lugar de un ``DELETE``
+masivo.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+import re
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.config import get_settings
+from app.db.session import engine
+from app.models.fermentation import FermentationReading
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+RETENTION_ACTIONS = ("detach", "drop")
+
+
+class PartitionManager:
+    """Crea y retira particiones diarias (UTC) de una tabla particionada."""
+
+    def __init__(
+        self,
+        db_engine: AsyncEngine,
+        table: str,
+        premake_days: int,
+        retention_days: int,
+        retention_action: str,
+        interval_seconds: int,
+    ) -> None:
+        if retention_action not in RETENTION_ACTIONS:
+            raise ValueError(f"Política de retención no válida: {retention_action!r}")
+        self._engine = db_engine
+        self.table = table
+        self.premake_days = premake_days
+        self.retention_days = retention_days
+        self.retention_action = retention_action
+        self.interval_seconds = interval_seconds
+        self._name_re = re.compile(rf"^{re.escape(table)}_p(\d{{8}})$")
+        self._task: asyncio.Task | None = None
+
+    # ------------------------------------------------------------------
+    # Nombres y DDL
+    # ------------------------------------------------------------------
+    def partition_name(self, day: dt.date) -> str:
+        return f"{self.table}_p{day:%Y%m%d}"
+
+    def partition_day(self, name: str) -> dt.date | None:
+        match = self._name_re.match(name)
+        if not match:
+            return None
+        return dt.datetime.strptime(match.group(1), "%Y%m%d").date()
+
+    def create_ddl(self, day: dt.date) -> str:
+        lower = dt.datetime.combine(day, dt.time(), dt.timezone.utc)
+        upper = lower + dt.timedelta(days=1)
+        return (
+            f'CREATE TABLE IF NOT EXISTS "{self.partition_name(day)}" '
+            f'PARTITION OF "{self.table}" '
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+
+    # ------------------------------------------------------------------
+    # Operaciones
+    # ------------------------------------------------------------------
+    async def list_partitions(self, conn: AsyncConnection) -> dict[str, dt.date]:
+        result = await conn.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :parent"
+            ),
+            {"parent": self.table},
+        )
+        partitions = {}
+        for name in result.scalars():
+            day = self.partition_day(name)
+            if day is not None:
+                partitions[name] = day
+        return partitions
+
+    async def ensure_partitions(self, conn: AsyncConnection, today: dt.date | None = None) -> list[str]:
+        """Crea (si faltan) las particiones de hoy y de los próximos días."""
+        today = today or dt.datetime.now(dt.timezone.utc).date()
+        existing = await self.list_partitions(conn)
+        created = []
+        for offset in range(self.premake_days + 1):
+            day = today + dt.timedelta(days=offset)
+            name = self.partition_name(day)
+            if name not in existing:
+                await conn.execute(text(self.create_ddl(day)))
+                created.append(name)
+        if created:
+            logger.info("Particiones creadas: %s", ", ".join(created))
+        return created
+
+    async def apply_retention(self, today: dt.date | None = None) -> list[str]:
+        """Separa (y opcionalmente elimina) las particiones caducadas."""
+        today = today or dt.datetime.now(dt.timezone.utc).date()
+        cutoff = today - dt.timedelta(days=self.retention_days)
+        # DETACH ... CONCURRENTLY no puede ejecutarse dentro de una transacción
+        async with self._engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            expired = sorted(
+                name for name, day in (await self.list_partitions(conn)).items() if day < cutoff
+            )
+            for name in expired:
+                await conn.execute(text(f'ALTER TABLE "{self.table}" DETACH PARTITION "{name}" CONCURRENTLY'))
+                if self.retention_action == "drop":
+                    await conn.execute(text(f'DROP TABLE "{name}"'))
+        if expired:
+            logger.info("Retención (%s) aplicada a: %s", self.retention_action, ", ".join(expired))
+        return expired
+
+    async def run_once(self) -> None:
+        async with self._engine.begin() as conn:
+            await self.ensure_partitions(conn)
+        await self.apply_retention()
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - se reintenta en el siguiente ciclo
+                logger.exception("Error en mantenimiento de particiones de %s", self.table)
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever(), name=f"partitions:{self.table}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+partition_manager = PartitionManager(
+    engine,
+    FermentationReading.__tablename__,
+    premake_days=settings.readings_partition_premake_days,
+    retention_days=settings.readings_retention_days,
+    retention_action=settings.readings_retention_action,
+    interval_seconds=settings.partition_maintenance_seconds,
+)
@@ -0,0 +1,364 @@
+"""Ejecución de perfiles de fermentación y publicación de consignas.
+
+Cada perfil se compila una sola vez en una tabla de puntos de quiebre
+(segundos desde el inicio, temperatura, presión) que describe una función
+lineal a tramos: una rampa es un tramo inclinado y una meseta un tramo plano;
+un cambio brusco de consigna son dos puntos con el mismo instante. La
+consigna en un instante se obtiene con ``bisect`` sobre esa tabla.
+
+Un único planificador asyncio calcula en cada tick la consigna de todos los
+tanques con perfil y la publica por MQTT en
+``brewpi/fermentation/<tank_id>/setpoint`` cuando cambia (y periódicamente
+para los dispositivos que se reconectan). Los ticks van a plazos absolutos y
+se mide su *jitter* (retraso respecto al plazo) para verificar que el
+planificador da abasto.
+
+Cada proceso de la API tiene su planificador: los cambios de perfiles o
+asignaciones incrementan ``fermentation_schedule_version`` en su misma
+transacción (:meth:`ProfileScheduler.touch`) y todos los procesos recargan al
+ver avanzar la versión, sin quedarse publicando la consigna anterior. Todos
+calculan consignas, pero sólo el líder (:mod:`app.services.leader`) las publica.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import collections
+import datetime as dt
+import json
+import logging
+import math
+import time
+from collections.abc import Mapping, Sequence
+from typing import Any, NamedTuple
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db.session import AsyncSessionLocal
+from app.models.fermentation import FermentationProfile, FermentationScheduleVersion, FermentationTank
+from app.services.hot_cache import to_epoch
+from app.services.mqtt import mqtt_manager
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+STEP_KINDS = ("ramp", "hold")
+SETPOINT_TOPIC = "brewpi/fermentation/{tank_id}/setpoint"
+
+# Variación mínima de consigna que provoca una nueva publicación
+PUBLISH_DELTA = 0.01
+# Ticks recientes usados para el percentil de jitter
+JITTER_WINDOW = 600
+
+
+class Setpoint(NamedTuple):
+    temperature: float
+    pressure: float | None
+    step: int
+    label: str | None
+    finished: bool
+
+
+class CompiledProfile:
+    """Tabla de puntos de quiebre de un perfil lista para consultar."""
+
+    def __init__(self, name: str, steps: Sequence[Mapping[str, Any]]) -> None:
+        if not steps:
+            raise ValueError(f"El perfil {name!r} no tiene pasos")
+        self.name = name
+        first = steps[0]
+        pressure = first.get("pressure")
+        self.times = [0.0]
+        self.temperatures = [float(first["temperature"])]
+        self.pressures = [math.nan if pressure is None else float(pressure)]
+        # paso al que pertenece el tramo que empieza en cada punto
+        self.segment_steps = [0]
+        self.labels = [step.get("label") for step in steps]
+
+        for index, step in enumerate(steps):
+            kind = step.get("kind")
+            if kind not in STEP_KINDS:
+                raise ValueError(f"Tipo de paso no válido en {name!r}: {kind!r}")
+            hours = float(step["hours"])
+            if hours <= 0:
+                raise ValueError(f"Duración no válida en {name!r}: {hours}")
+            temperature = float(step["temperature"])
+            pressure = step.get("pressure")
+            pressure = self.pressures[-1] if pressure is None else float(pressure)
+            start = self.times[-1]
+            if kind == "hold" and (temperature, pressure) != (self.temperatures[-1], self.pressures[-1]):
+                # escalón: mismo instante, nueva consigna
+                self._point(start, temperature, pressure, index)
+            self.segment_steps[-1] = index
+            self._point(start + hours * 3600.0, temperature, pressure, index)
+        self.duration = self.times[-1]
+
+    def _point(self, t: float, temperature: float, pressure: float, step: int) -> None:
+        self.times.append(t)
+        self.temperatures.append(temperature)
+        self.pressures.append(pressure)
+        self.segment_steps.append(step)
+
+    def setpoint(self, elapsed: float) -> Setpoint:
+        """Consigna a ``elapsed`` segundos del inicio (se mantiene al terminar)."""
+        if elapsed >= self.duration:
+            last = len(self.times) - 1
+            step = self.segment_steps[last - 1]
+            return self._setpoint(self.temperatures[last], self.pressures[last], step, True)
+        i = max(bisect.bisect_right(self.times, elapsed) - 1, 0)
+        t0, t1 = self.times[i], self.times[i + 1]
+        frac = (elapsed - t0) / (t1 - t0) if t1 > t0 else 1.0
+        temperature = self.temperatures[i] + (self.temperatures[i + 1] - self.temperatures[i]) * frac
+        pressure = self.pressures[i] + (self.pressures[i + 1] - self.pressures[i]) * frac
+        return self._setpoint(temperature, pressure, self.segment_steps[i], False)
+
+    def temperatures_at(self, elapsed: np.ndarray) -> np.ndarray:
+        """Versión vectorizada de :meth:`setpoint` (sólo temperatura).
+
+        Antes del inicio del perfil devuelve ``NaN``; tras el final, la última
+        consigna.
+        """
+        times = np.asarray(self.times)
+        temps = np.asarray(self.temperatures)
+        i = np.clip(np.searchsorted(times, elapsed, side="right") - 1, 0, len(times) - 2)
+        span = times[i + 1] - times[i]
+        frac = np.where(span > 0, (elapsed - times[i]) / np.where(span > 0, span, 1.0), 1.0)
+        out = temps[i] + (temps[i + 1] - temps[i]) * np.clip(frac, 0.0, 1.0)
+        out[elapsed < 0] = np.nan
+        return out
+
+    def _setpoint(self, temperature: float, pressure: float, step: int, finished: bool) -> Setpoint:
+        pressure = None if math.isnan(pressure) else pressure
+        return Setpoint(temperature, pressure, step, self.labels[step], finished)
+
+
+class ProfileScheduler:
+    """Planificador único de consignas para todos los tanques."""
+
+    def __init__(self, tick_seconds: float, republish_seconds: float) -> None:
+        self.tick_seconds = tick_seconds
+        self.republish_seconds = republish_seconds
+        self._profiles: dict[str, CompiledProfile] = {}
+        # tank_id -> (perfil compilado, inicio en segundos epoch)
+        self._tanks: dict[str, tuple[CompiledProfile, float]] = {}
+        # tank_id -> (consigna publicada, instante de publicación)
+        self._published: dict[str, tuple[Setpoint, float]] = {}
+        # versión de fermentation_schedule_version cargada (None hasta la primera carga)
+        self._version: int | None = None
+        # sólo el líder publica consignas
+        self.publishing = False
+        self._task: asyncio.Task | None = None
+        self._watch_task: asyncio.Task | None = None
+
+        self.ticks = 0
+        self.overruns = 0
+        self._jitter: collections.deque[float] = collections.deque(maxlen=JITTER_WINDOW)
+        self.jitter_max = 0.0
+        self.compute_last = 0.0
+        self.compute_max = 0.0
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+    def set_assignments(
+        self,
+        profiles: Mapping[str, Sequence[Mapping[str, Any]]],
+        assignments: Sequence[tuple[str, str, dt.datetime]],
+    ) -> None:
+        """Compila los perfiles y asocia cada tanque a su perfil e inicio."""
+        compiled: dict[str, CompiledProfile] = {}
+        for name, steps in profiles.items():
+            try:
+                compiled[name] = CompiledProfile(name, steps)
+            except (KeyError, TypeError, ValueError) as err:
+                logger.error("Perfil %s no válido: %s", name, err)
+        tanks = {}
+        for tank_id, profile_name, started_at in assignments:
+            profile = compiled.get(profile_name)
+            if profile is None:
+                logger.warning("Tanque %s: perfil %s no definido", tank_id, profile_name)
+                continue
+            tanks[tank_id] = (profile, to_epoch(started_at))
+        self._profiles = compiled
+        self._tanks = tanks
+
+    @staticmethod
+    async def touch(db: AsyncSession) -> None:
+        """Marca un cambio de perfiles o asignaciones (sin commit: va en la transacción del llamador)."""
+        version = FermentationScheduleVersion
+        await db.execute(update(version).where(version.id == 1).values(version=version.version + 1))
+
+    @staticmethod
+    async def _stored_version(db: AsyncSession) -> int | None:
+        version = FermentationScheduleVersion
+        return (await db.execute(select(version.version).where(version.id == 1))).scalar_one_or_none()
+
+    async def reload(self, db: AsyncSession) -> None:
+        # la versión se lee antes que los datos: nunca se da por cargada una versión posterior
+        version = await self._stored_version(db)
+        result = await db.execute(select(FermentationProfile.name, FermentationProfile.steps))
+        profiles = dict(result.all())
+        assignments = (
+            await db.execute(
+                select(FermentationTank.id, FermentationTank.profile, FermentationTank.profile_started_at)
+                .where(FermentationTank.profile.is_not(None))
+                .where(FermentationTank.profile_started_at.is_not(None))
+            )
+        ).all()
+        self.set_assignments(profiles, assignments)
+        self._version = version
+        # tras editar perfiles o reasignar tanques se republican todas las consignas
+        self._published.clear()
+        logger.info("Planificador de perfiles: %s perfiles, %s tanques", len(self._profiles), len(self._tanks))
+
+    # ------------------------------------------------------------------
+    # Cálculo
+    # ------------------------------------------------------------------
+    def assignment(self, tank_id: str) -> tuple[CompiledProfile, float] | None:
+        """Perfil compilado e inicio (epoch) del tanque, si tiene uno en ejecución."""
+        return self._tanks.get(tank_id)
+
+    def setpoint(self, tank_id: str, now: float | None = None) -> Setpoint | None:
+        entry = self._tanks.get(tank_id)
+        if entry is None:
+            return None
+        profile, started = entry
+        return profile.setpoint((now if now is not None else time.time()) - started)
+
+    def due(self, now: float) -> list[tuple[str, Setpoint]]:
+        """Consignas de todos los tanques que hay que publicar en este tick."""
+        out = []
+        for tank_id, (profile, started) in self._tanks.items():
+            current = profile.setpoint(now - started)
+            published = self._published.get(tank_id)
+            if published is not None:
+                previous, published_at = published
+                if (
+                    current.step == previous.step
+                    and abs(current.temperature - previous.temperature) < PUBLISH_DELTA
+                    and _close(current.pressure, previous.pressure)
+                    and now - published_at < self.republish_seconds
+                ):
+                    continue
+            self._published[tank_id] = (current, now)
+            out.append((tank_id, current))
+        return out
+
+    async def _publish(self, tank_id: str, setpoint: Setpoint) -> None:
+        payload = json.dumps(
+            {
+                "temperature": round(setpoint.temperature, 3),
+                "pressure": None if setpoint.pressure is None else round(setpoint.pressure, 4),
+                "step": setpoint.step,
+                "label": setpoint.label,
+                "finished": setpoint.finished,
+            }
+        )
+        try:
+            await mqtt_manager.publish(SETPOINT_TOPIC.format(tank_id=tank_id), payload)
+        except Exception:  # noqa: BLE001 - se reintenta en la siguiente republicación
+            self._published.pop(tank_id, None)
+            logger.warning("No se pudo publicar la consigna de %s", tank_id)
+
+    # ------------------------------------------------------------------
+    # Bucle
+    # ------------------------------------------------------------------
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.reload(db)
+                break
+            except Exception:  # noqa: BLE001 - la BD puede no estar lista al arrancar
+                logger.exception("No se pudieron cargar los perfiles; reintentando")
+                await asyncio.sleep(5)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline += self.tick_seconds
+            await asyncio.sleep(max(deadline - loop.time(), 0.0))
+            jitter = loop.time() - deadline
+            if jitter > self.tick_seconds:
+                # tick(s) perdidos: se salta al siguiente plazo en vez de acumular
+                missed = int(jitter // self.tick_seconds)
+                self.overruns += missed
+                deadline += missed * self.tick_seconds
+            self.ticks += 1
+            self._jitter.append(jitter)
+            self.jitter_max = max(self.jitter_max, jitter)
+
+            if not self.publishing:
+                continue
+            started = time.perf_counter()
+            due = self.due(time.time())
+            self.compute_last = time.perf_counter() - started
+            self.compute_max = max(self.compute_max, self.compute_last)
+            for tank_id, setpoint in due:
+                await self._publish(tank_id, setpoint)
+
+    def set_publishing(self, publishing: bool) -> None:
+        if publishing and not self.publishing:
+            # un nuevo líder no sabe qué publicó el anterior: se republica todo
+            self._published.clear()
+        self.publishing = publishing
+
+    async def watch_version(self) -> None:
+        """Recarga cuando otro proceso cambia perfiles o asignaciones."""
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            if self._version is None:
+                continue
+            try:
+                async with AsyncSessionLocal() as db:
+                    if await self._stored_version(db) != self._version:
+                        await self.reload(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - se reintenta en el siguiente tick
+                logger.exception("No se pudo comprobar la versión de los perfiles")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever(), name="profile-scheduler")
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self.watch_version(), name="profile-version")
+
+    async def stop(self) -> None:
+        for task in (self._task, self._watch_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._watch_task = None
+
+    def stats(self) -> dict[str, Any]:
+        recent = sorted(self._jitter)
+        p99 = recent[min(int(len(recent) * 0.99), len(recent) - 1)] if recent else 0.0
+        return {
+            "publishing": self.publishing,
+            "tanks": len(self._tanks),
+            "profiles": len(self._profiles),
+            "tick_seconds": self.tick_seconds,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "jitter_last_ms": round(self._jitter[-1] * 1000, 3) if recent else 0.0,
+            "jitter_p99_ms": round(p99 * 1000, 3),
+            "jitter_max_ms": round(self.jitter_max * 1000, 3),
+            "compute_last_ms": round(self.compute_last * 1000, 3),
+            "compute_max_ms": round(self.compute_max * 1000, 3),
+        }
+
+
+def _close(a: float | None, b: float | None) -> bool:
+    if a is None or b is None:
+        return a is b
+    return abs(a - b) < PUBLISH_DELTA
+
+
+profile_scheduler = ProfileScheduler(settings.profile_tick_seconds, settings.profile_republish_seconds)
@@ -0,0 +1,153 @@
+"""Mantenimiento incremental de agregados (*rollups*) de fermentación.
+
+La ingesta acumula en memoria, por tanque, resolución e intervalo, el delta
+de min/max/media/último/conteo desde el último volcado. Cada volcado envía los
+deltas en un ``INSERT ... ON CONFLICT DO UPDATE`` que los fusiona con lo ya
+persistido, por lo que un intervalo puede completarse en varios volcados (o
+tras un reinicio) sin recalcular nada a partir de las lecturas crudas.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.fermentation import ROLLUP_RESOLUTIONS, FermentationRollup
+from app.services.fermentation_writer import ReadingRow
+from app.services.hot_cache import COLUMNS, to_epoch
+
+# Resolución de las lecturas crudas (un flush por segundo)
+RAW_RESOLUTION = 1
+
+# 3 claves + conteo + 12 agregados por fila; asyncpg admite 32767 parámetros
+UPSERT_CHUNK_ROWS = 1500
+
+
+def choose_resolution(span_seconds: float, max_points: int) -> int:
+    """Resolución (s) más gruesa necesaria para no superar ``max_points``.
+
+    Se devuelve la más fina de ``RAW_RESOLUTION`` y ``ROLLUP_RESOLUTIONS``
+    cuyo número de puntos en el rango cabe en el presupuesto: cualquier
+    resolución más gruesa también cumpliría, pero perdería detalle. Si
+    ninguna cabe se usa la de 1 h.
+    """
+    for resolution in (RAW_RESOLUTION, *ROLLUP_RESOLUTIONS):
+        if span_seconds / resolution <= max_points:
+            return resolution
+    return ROLLUP_RESOLUTIONS[-1]
+
+
+class _Aggregate:
+    __slots__ = ("count", "mins", "maxs", "sums", "lasts")
+
+    def __init__(self, values: Sequence[float]) -> None:
+        self.count = 1
+        self.mins = list(values)
+        self.maxs = list(values)
+        self.sums = list(values)
+        self.lasts = list(values)
+
+    def add(self, values: Sequence[float]) -> None:
+        self.count += 1
+        for idx, value in enumerate(values):
+            if value < self.mins[idx]:
+                self.mins[idx] = value
+            if value > self.maxs[idx]:
+                self.maxs[idx] = value
+            self.sums[idx] += value
+            self.lasts[idx] = value
+
+    def merge_older(self, older: "_Aggregate") -> None:
+        """Fusiona un delta anterior (p. ej. de un volcado fallido)."""
+        self.count += older.count
+        for idx in range(len(COLUMNS)):
+            self.mins[idx] = min(self.mins[idx], older.mins[idx])
+            self.maxs[idx] = max(self.maxs[idx], older.maxs[idx])
+            self.sums[idx] += older.sums[idx]
+
+
+class RollupAccumulator:
+    """Deltas pendientes por (tanque, resolución, inicio de intervalo)."""
+
+    def __init__(self, resolutions: Iterable[int] = ROLLUP_RESOLUTIONS) -> None:
+        self.resolutions = tuple(resolutions)
+        self._pending: dict[tuple[str, int, float], _Aggregate] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add_rows(self, rows: Iterable[ReadingRow]) -> None:
+        for row in rows:
+            ts = to_epoch(row.timestamp)
+            values = (row.temperature, row.pressure, row.co2)
+            for resolution in self.resolutions:
+                key = (row.tank_id, resolution, ts - ts % resolution)
+                agg = self._pending.get(key)
+                if agg is None:
+                    self._pending[key] = _Aggregate(values)
+                else:
+                    agg.add(values)
+
+    def drain(self) -> dict[tuple[str, int, float], _Aggregate]:
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, drained: dict[tuple[str, int, float], _Aggregate]) -> None:
+        """Reincorpora deltas cuyo volcado no llegó a confirmarse."""
+        for key, older in drained.items():
+            current = self._pending.get(key)
+            if current is None:
+                self._pending[key] = older
+            else:
+                current.merge_older(older)
+
+    async def flush(self, db: AsyncSession) -> dict[tuple[str, int, float], _Aggregate]:
+        """Fusiona los deltas en ``fermentation_rollups`` (sin commit).
+
+        Devuelve lo volcado para poder llamar a :meth:`restore` si la
+        transacción termina en *rollback*.
+        """
+        drained = self.drain()
+        rows = [_row(key, agg) for key, agg in drained.items()]
+        for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+            await db.execute(_upsert(rows[start : start + UPSERT_CHUNK_ROWS]))
+        return drained
+
+
+def _row(key: tuple[str, int, float], agg: _Aggregate) -> dict[str, Any]:
+    tank_id, resolution, bucket = key
+    row: dict[str, Any] = {
+        "tank_id": tank_id,
+        "resolution": resolution,
+        "bucket": dt.datetime.fromtimestamp(bucket, dt.timezone.utc),
+        "count": agg.count,
+    }
+    for idx, var in enumerate(COLUMNS):
+        row[f"{var}_min"] = agg.mins[idx]
+        row[f"{var}_max"] = agg.maxs[idx]
+        row[f"{var}_mean"] = agg.sums[idx] / agg.count
+        row[f"{var}_last"] = agg.lasts[idx]
+    return row
+
+
+def _upsert(rows: list[dict[str, Any]]):
+    table = FermentationRollup.__table__
+    stmt = pg_insert(table).values(rows)
+    new = stmt.excluded
+    total = table.c.count + new.count
+    merged: dict[str, Any] = {"count": total}
+    for var in COLUMNS:
+        merged[f"{var}_min"] = func.least(table.c[f"{var}_min"], new[f"{var}_min"])
+        merged[f"{var}_max"] = func.greatest(table.c[f"{var}_max"], new[f"{var}_max"])
+        merged[f"{var}_mean"] = (
+            table.c[f"{var}_mean"] * table.c.count + new[f"{var}_mean"] * new.count
+        ) / total
+        merged[f"{var}_last"] = new[f"{var}_last"]
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.tank_id, table.c.resolution, table.c.bucket],
+        set_=merged,
+    )
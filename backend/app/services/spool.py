@@ -0,0 +1,295 @@
+"""Spool local de escritura anticipada (*write-ahead*) para la ingesta.
+
+Las lecturas se anexan a segmentos de tamaño fijo mapeados en memoria
+(``mmap``), de modo que el bucle de ingesta escribe a velocidad de memoria y
+nunca espera a PostgreSQL. Un drenador independiente lee el spool en lotes
+grandes, los persiste y sólo entonces avanza el *checkpoint*, por lo que una
+caída o reinicio de la BD no pierde datos: al volver se reanuda desde el
+último lote confirmado. La posición también se guarda en BD junto a cada
+lote (``fermentation_spool_checkpoints``), de modo que una caída entre el
+commit en BD y el checkpoint local no duplica lecturas. Por eso cada
+directorio es de un único proceso: se bloquea con ``flock`` al abrirlo y un
+segundo proceso falla al arrancar en lugar de compartir segmentos.
+
+Formato de registro (little endian)::
+
+    <II>     longitud del cuerpo, CRC32 del cuerpo
+    <ddddH>  timestamp epoch UTC, temperatura, presión, CO₂, longitud del id
+    bytes    tank_id en UTF-8
+
+Una cabecera a cero marca el final de los datos del segmento.
+"""
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import fcntl
+import logging
+import mmap
+import os
+import pathlib
+import struct
+import uuid
+import zlib
+from collections.abc import Sequence
+from typing import Any, NamedTuple
+
+from app.services.fermentation_writer import ReadingRow
+from app.services.hot_cache import to_epoch
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("<II")
+BODY = struct.Struct("<ddddH")
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".spool"
+CHECKPOINT_FILE = "checkpoint"
+# Identificador del spool (cambia si se borra el directorio y se crea de nuevo)
+SPOOL_ID_FILE = "spool_id"
+# Lecturas que la BD rechazó repetidamente (CSV, para revisión manual)
+QUARANTINE_FILE = "quarantine.csv"
+# Bloqueo exclusivo del directorio mientras el spool está abierto
+LOCK_FILE = "lock"
+
+
+class SpoolPosition(NamedTuple):
+    segment: int
+    offset: int
+
+
+def _encode(row: ReadingRow) -> bytes:
+    tank_id = row.tank_id.encode()
+    body = BODY.pack(to_epoch(row.timestamp), row.temperature, row.pressure, row.co2, len(tank_id)) + tank_id
+    return HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def _decode(body: bytes) -> ReadingRow:
+    ts, temperature, pressure, co2, id_len = BODY.unpack_from(body)
+    tank_id = body[BODY.size : BODY.size + id_len].decode()
+    return ReadingRow(tank_id, dt.datetime.fromtimestamp(ts, dt.timezone.utc), temperature, pressure, co2)
+
+
+class _Segment:
+    """Archivo preasignado y mapeado en memoria."""
+
+    def __init__(self, path: pathlib.Path, size: int) -> None:
+        self.path = path
+        path.touch(exist_ok=True)
+        self._file = open(path, "r+b")  # noqa: SIM115 - vive lo que el segmento
+        if os.fstat(self._file.fileno()).st_size < size:
+            self._file.truncate(size)
+        self.map = mmap.mmap(self._file.fileno(), size)
+        self.size = size
+
+    def read(self, offset: int) -> tuple[bytes | None, int]:
+        """Cuerpo del registro en ``offset`` y desplazamiento siguiente.
+
+        Devuelve ``None`` si no hay un registro completo y válido.
+        """
+        if offset + HEADER.size > self.size:
+            return None, offset
+        length, crc = HEADER.unpack_from(self.map, offset)
+        end = offset + HEADER.size + length
+        if length == 0 or end > self.size:
+            return None, offset
+        body = self.map[offset + HEADER.size : end]
+        if zlib.crc32(body) != crc:
+            return None, offset
+        return body, end
+
+    def close(self) -> None:
+        self.map.flush()
+        self.map.close()
+        self._file.close()
+
+
+class WriteAheadSpool:
+    """Cola persistente de lecturas entre el listener MQTT y la BD."""
+
+    def __init__(self, directory: str | os.PathLike, segment_bytes: int, max_segments: int) -> None:
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = self._acquire_lock()
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.dropped_segments = 0
+        self.quarantined_rows = 0
+        self.spool_id = self._load_spool_id()
+
+        self._read_pos = self._load_checkpoint()
+        segments = self._segment_ids()
+        if not segments:
+            segments = [self._read_pos.segment]
+        if self._read_pos.segment < segments[0]:
+            self._read_pos = SpoolPosition(segments[0], 0)
+        self._segments: dict[int, _Segment] = {}
+        self._write_seq = segments[-1]
+        self._write_offset = self._recover_end(self._write_seq)
+
+    # ------------------------------------------------------------------
+    # Segmentos y checkpoint
+    # ------------------------------------------------------------------
+    def _segment_path(self, seq: int) -> pathlib.Path:
+        return self.directory / f"{SEGMENT_PREFIX}{seq:012d}{SEGMENT_SUFFIX}"
+
+    def _segment_ids(self) -> list[int]:
+        return sorted(
+            int(path.name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)])
+            for path in self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")
+        )
+
+    def _segment(self, seq: int) -> _Segment:
+        segment = self._segments.get(seq)
+        if segment is None:
+            segment = self._segments[seq] = _Segment(self._segment_path(seq), self.segment_bytes)
+        return segment
+
+    def _release(self, seq: int, delete: bool) -> None:
+        segment = self._segments.pop(seq, None)
+        if segment is not None:
+            segment.close()
+        if delete:
+            self._segment_path(seq).unlink(missing_ok=True)
+
+    def _acquire_lock(self) -> Any:
+        lock = open(self.directory / LOCK_FILE, "a")
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            raise RuntimeError(f"El spool {self.directory} está en uso por otro proceso") from None
+        return lock
+
+    def _load_spool_id(self) -> str:
+        path = self.directory / SPOOL_ID_FILE
+        try:
+            return path.read_text().strip()
+        except FileNotFoundError:
+            spool_id = uuid.uuid4().hex
+            path.write_text(spool_id + "\n")
+            return spool_id
+
+    def _load_checkpoint(self) -> SpoolPosition:
+        path = self.directory / CHECKPOINT_FILE
+        try:
+            segment, offset = path.read_text().split()
+            return SpoolPosition(int(segment), int(offset))
+        except (FileNotFoundError, ValueError):
+            return SpoolPosition(0, 0)
+
+    def _save_checkpoint(self, position: SpoolPosition) -> None:
+        tmp = self.directory / f"{CHECKPOINT_FILE}.tmp"
+        with open(tmp, "w") as fh:
+            fh.write(f"{position.segment} {position.offset}\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.directory / CHECKPOINT_FILE)
+
+    def _recover_end(self, seq: int) -> int:
+        """Fin de datos válidos del segmento; limpia un registro truncado."""
+        segment = self._segment(seq)
+        offset = 0
+        while True:
+            body, next_offset = segment.read(offset)
+            if body is None:
+                break
+            offset = next_offset
+        segment.map[offset:] = bytes(segment.size - offset)
+        return offset
+
+    # ------------------------------------------------------------------
+    # Escritura (listener)
+    # ------------------------------------------------------------------
+    def append(self, rows: Sequence[ReadingRow]) -> None:
+        segment = self._segment(self._write_seq)
+        for row in rows:
+            record = _encode(row)
+            if len(record) > self.segment_bytes:
+                raise ValueError("Registro mayor que un segmento de spool")
+            if self._write_offset + len(record) > self.segment_bytes:
+                segment = self._roll()
+            end = self._write_offset + len(record)
+            segment.map[self._write_offset : end] = record
+            self._write_offset = end
+
+    def _roll(self) -> _Segment:
+        self._segment(self._write_seq).map.flush()
+        if self._write_seq != self._read_pos.segment:
+            self._release(self._write_seq, delete=False)
+        self._write_seq += 1
+        self._write_offset = 0
+        segments = self._segment_ids()
+        while len(segments) >= self.max_segments and segments[0] < self._write_seq:
+            # spool lleno: se sacrifica el segmento más antiguo para acotar el disco
+            oldest = segments.pop(0)
+            self._release(oldest, delete=True)
+            self.dropped_segments += 1
+            logger.error("Spool lleno: descartado segmento %s sin drenar", oldest)
+            if self._read_pos.segment <= oldest:
+                self._read_pos = SpoolPosition(oldest + 1, 0)
+                self._save_checkpoint(self._read_pos)
+        return self._segment(self._write_seq)
+
+    def sync(self) -> None:
+        """Fuerza a disco las páginas del segmento en escritura."""
+        self._segment(self._write_seq).map.flush()
+
+    # ------------------------------------------------------------------
+    # Lectura (drenador)
+    # ------------------------------------------------------------------
+    def read_batch(self, max_rows: int) -> tuple[list[ReadingRow], SpoolPosition]:
+        """Lee hasta ``max_rows`` lecturas desde el checkpoint (sin avanzarlo)."""
+        rows: list[ReadingRow] = []
+        seq, offset = self._read_pos
+        while len(rows) < max_rows:
+            body, next_offset = self._segment(seq).read(offset)
+            if body is None:
+                if seq >= self._write_seq:
+                    break
+                if seq != self._read_pos.segment:
+                    self._release(seq, delete=False)
+                seq, offset = seq + 1, 0
+                continue
+            rows.append(_decode(body))
+            offset = next_offset
+        return rows, SpoolPosition(seq, offset)
+
+    def commit(self, position: SpoolPosition) -> None:
+        """Confirma lo leído hasta ``position`` y borra segmentos drenados."""
+        # si mientras tanto se descartaron segmentos por spool lleno, no retroceder
+        position = max(position, self._read_pos)
+        self._save_checkpoint(position)
+        for seq in range(self._read_pos.segment, position.segment):
+            self._release(seq, delete=True)
+        self._read_pos = position
+
+    def quarantine(self, rows: Sequence[ReadingRow]) -> None:
+        """Aparta ``rows`` a ``quarantine.csv`` (el llamador confirma la posición después)."""
+        with open(self.directory / QUARANTINE_FILE, "a", newline="") as fh:
+            writer = csv.writer(fh)
+            for row in rows:
+                writer.writerow((row.tank_id, row.timestamp.isoformat(), row.temperature, row.pressure, row.co2))
+            fh.flush()
+            os.fsync(fh.fileno())
+        self.quarantined_rows += len(rows)
+
+    def pending_bytes(self) -> int:
+        segments = self._write_seq - self._read_pos.segment
+        return segments * self.segment_bytes + self._write_offset - self._read_pos.offset
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "read_segment": self._read_pos.segment,
+            "read_offset": self._read_pos.offset,
+            "write_segment": self._write_seq,
+            "write_offset": self._write_offset,
+            "pending_bytes": self.pending_bytes(),
+            "dropped_segments": self.dropped_segments,
+            "quarantined_rows": self.quarantined_rows,
+        }
+
+    def close(self) -> None:
+        for seq in list(self._segments):
+            self._release(seq, delete=False)
+        # cerrar el descriptor libera el flock
+        self._lock.close()
@@ -0,0 +1,52 @@
+"""Formato binario compacto de telemetría de fermentación.
+
+En lugar de un mensaje ASCII por variable (``.../temperature``,
+``.../pressure``, ``.../co2``), un dispositivo puede publicar un único mensaje
+por tanque en ``brewpi/fermentation/<tank_id>/telemetry`` con todas las
+variables y la marca de tiempo del propio dispositivo.
+
+Versión 1 (little endian, 34 bytes)::
+
+    B   versión (1)
+    B   flags (reservado, 0)
+    d   timestamp del dispositivo, segundos epoch UTC
+    d   temperatura (°C)
+    d   presión (bar)
+    d   CO₂ (%)
+
+El primer byte identifica la versión para poder ampliar el formato sin romper
+a los consumidores existentes. El simulador mantiene una copia de este módulo
+en ``simulador/app/utils/telemetry_codec.py``.
+"""
+from __future__ import annotations
+
+import struct
+from typing import NamedTuple
+
+TELEMETRY_VERSION = 1
+
+_V1 = struct.Struct("<BBdddd")
+
+
+class Telemetry(NamedTuple):
+    timestamp: float
+    temperature: float
+    pressure: float
+    co2: float
+
+
+def encode_telemetry(timestamp: float, temperature: float, pressure: float, co2: float) -> bytes:
+    return _V1.pack(TELEMETRY_VERSION, 0, timestamp, temperature, pressure, co2)
+
+
+def decode_telemetry(payload: bytes) -> Telemetry:
+    """Decodifica un payload; lanza ``ValueError`` si la versión o el tamaño no cuadran."""
+    if not payload:
+        raise ValueError("Payload de telemetría vacío")
+    version = payload[0]
+    if version != TELEMETRY_VERSION:
+        raise ValueError(f"Versión de telemetría no soportada: {version}")
+    if len(payload) != _V1.size:
+        raise ValueError(f"Payload de telemetría v1 de {len(payload)} bytes (se esperaban {_V1.size})")
+    _, _, timestamp, temperature, pressure, co2 = _V1.unpack(payload)
+    return Telemetry(timestamp, temperature, pressure, co2)
@@ -0,0 +1,139 @@
+"""Trie de filtros de tópico MQTT (comodines ``+`` y ``#``).
+
+Permite enrutar cada tópico entrante sólo a los valores (listeners) cuyos
+filtros coinciden, con un coste proporcional a la profundidad del tópico, y
+calcular el conjunto mínimo de suscripciones que cubre todos los filtros.
+"""
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+SINGLE_LEVEL = "+"
+MULTI_LEVEL = "#"
+
+
+def validate_filter(topic_filter: str) -> None:
+    """Valida un filtro según la especificación MQTT 3.1.1 (sección 4.7)."""
+    if not topic_filter:
+        raise ValueError("El filtro de tópico no puede estar vacío")
+    levels = topic_filter.split("/")
+    for idx, level in enumerate(levels):
+        if MULTI_LEVEL in level and (level != MULTI_LEVEL or idx != len(levels) - 1):
+            raise ValueError(f"'#' sólo puede ocupar el último nivel completo: {topic_filter!r}")
+        if SINGLE_LEVEL in level and level != SINGLE_LEVEL:
+            raise ValueError(f"'+' debe ocupar un nivel completo: {topic_filter!r}")
+
+
+def filter_covers(general: str, specific: str) -> bool:
+    """Indica si todo tópico aceptado por ``specific`` lo acepta ``general``."""
+    g_levels = general.split("/")
+    s_levels = specific.split("/")
+    for idx, g_level in enumerate(g_levels):
+        system = idx == 0 and s_levels[0].startswith("$")
+        if g_level == MULTI_LEVEL:
+            return not system
+        if idx >= len(s_levels):
+            return False
+        s_level = s_levels[idx]
+        if s_level == MULTI_LEVEL:
+            return False
+        if g_level == SINGLE_LEVEL:
+            if system:
+                return False
+            continue
+        if g_level != s_level:
+            return False
+    return len(g_levels) == len(s_levels)
+
+
+def minimal_subscriptions(filters: Iterable[str]) -> list[str]:
+    """Elimina duplicados y filtros ya cubiertos por otro más general."""
+    unique = sorted(set(filters))
+    return [
+        flt for flt in unique if not any(other != flt and filter_covers(other, flt) for other in unique)
+    ]
+
+
+class _Node:
+    __slots__ = ("children", "values")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _Node] = {}
+        self.values: list = []
+
+
+class TopicTrie(Generic[T]):
+    """Trie nivel a nivel de filtros MQTT con valores asociados."""
+
+    def __init__(self) -> None:
+        self._root = _Node()
+        self._filters: dict[str, list[T]] = {}
+
+    def filters(self) -> list[str]:
+        return list(self._filters)
+
+    def add(self, topic_filter: str, value: T) -> None:
+        validate_filter(topic_filter)
+        node = self._root
+        for level in topic_filter.split("/"):
+            node = node.children.setdefault(level, _Node())
+        if value not in node.values:
+            node.values.append(value)
+            self._filters.setdefault(topic_filter, []).append(value)
+
+    def remove(self, topic_filter: str, value: T) -> bool:
+        """Quita ``value`` del filtro; poda las ramas que quedan vacías."""
+        path = [self._root]
+        for level in topic_filter.split("/"):
+            child = path[-1].children.get(level)
+            if child is None:
+                return False
+            path.append(child)
+        node = path[-1]
+        if value not in node.values:
+            return False
+        node.values.remove(value)
+        self._filters[topic_filter].remove(value)
+        if not self._filters[topic_filter]:
+            del self._filters[topic_filter]
+        levels = topic_filter.split("/")
+        for level, parent, child in zip(reversed(levels), reversed(path[:-1]), reversed(path[1:])):
+            if child.values or child.children:
+                break
+            del parent.children[level]
+        return True
+
+    def match(self, topic: str) -> list[T]:
+        """Valores cuyos filtros aceptan ``topic`` (sin duplicados, en orden)."""
+        levels = topic.split("/")
+        system = levels[0].startswith("$")
+        found: list[T] = []
+        nodes = [self._root]
+        for idx, level in enumerate(levels):
+            wildcards_allowed = not (idx == 0 and system)
+            next_nodes: list[_Node] = []
+            for node in nodes:
+                if wildcards_allowed:
+                    multi = node.children.get(MULTI_LEVEL)
+                    if multi is not None:
+                        found.extend(multi.values)
+                    single = node.children.get(SINGLE_LEVEL)
+                    if single is not None:
+                        next_nodes.append(single)
+                exact = node.children.get(level)
+                if exact is not None:
+                    next_nodes.append(exact)
+            nodes = next_nodes
+            if not nodes:
+                break
+        else:
+            for node in nodes:
+                found.extend(node.values)
+                # "a/#" también acepta el nivel padre "a"
+                multi = node.children.get(MULTI_LEVEL)
+                if multi is not None:
+                    found.extend(multi.values)
+        return list(dict.fromkeys(found))
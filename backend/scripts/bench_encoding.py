@@ -0,0 +1,118 @@
+"""Benchmark de codificación de respuestas: contrato por defecto vs ruta rápida.
+
+Compara, por endpoint y con filas sintéticas, el camino por defecto de
+FastAPI (validación contra ``response_model`` + JSON estándar) con la ruta
+rápida de :mod:`app.core.encoding` (orjson / MessagePack desde tuplas). Sólo
+mide la serialización: la consulta a BD queda fuera.
+
+Uso (desde ``backend/``)::
+
+    python -m scripts.bench_encoding --rows 5000 --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import time
+from decimal import Decimal
+from typing import Any, Callable, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.core.encoding import MSGPACK, ORJSON, encode, msgpack, orjson, records
+from app.inventory.models import InventoryItem, InventoryTransaction
+from app.inventory.schemas import ItemDTO, TransactionDTO
+from app.inventory.service import ITEM_COLUMNS, TRANSACTION_COLUMNS
+from app.routers.fermentation import ReadingDTO
+
+
+def _item_rows(n: int) -> list[tuple]:
+    now = dt.datetime.now(dt.timezone.utc)
+    return [
+        (
+            f"Malta {i}", "malt", "kg", "Proveedor", Decimal("12.50"), dt.date(2027, 1, 1), "A-1",
+            "Fabricante", "nacional", Decimal("10.000"), Decimal("25.000"), "25 kg", f"LOT-{i:06d}",
+            Decimal("125.500"), now,
+        )
+        for i in range(n)
+    ]
+
+
+def _transaction_rows(n: int) -> list[tuple]:
+    now = dt.datetime.now(dt.timezone.utc)
+    return [(i, "CONSUMO", Decimal("-1.250"), f"B{i % 50}", "operador", now) for i in range(n)]
+
+
+def _history_rows(n: int) -> list[dict[str, Any]]:
+    start = time.time() - n
+    return [
+        {
+            "timestamp": dt.datetime.fromtimestamp(start + i, dt.timezone.utc).isoformat(),
+            "temperature": 18.0 + i * 1e-4,
+            "pressure": 1.02,
+            "co2": 2.4,
+        }
+        for i in range(n)
+    ]
+
+
+def _default_path(model: Any, content: Any) -> Callable[[], bytes]:
+    field = create_response_field(name="bench", type_=List[model])
+
+    def run() -> bytes:
+        value = asyncio.run(serialize_response(field=field, response_content=content))
+        return JSONResponse(value).body
+
+    return run
+
+
+def _timed(fn: Callable[[], Any], repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - started)
+        size = len(out.body if hasattr(out, "body") else out)
+    return best * 1000, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    item_rows = _item_rows(args.rows)
+    transaction_rows = _transaction_rows(args.rows)
+    history = _history_rows(args.rows)
+    # el camino por defecto parte de objetos ORM (items/transacciones) o dicts (histórico)
+    items = [InventoryItem(**dict(zip(ITEM_COLUMNS, row))) for row in item_rows]
+    transactions = [InventoryTransaction(**dict(zip(TRANSACTION_COLUMNS, row))) for row in transaction_rows]
+
+    endpoints = {
+        "GET /inventory/items": (
+            _default_path(ItemDTO, items), lambda: records(ITEM_COLUMNS, item_rows)
+        ),
+        "GET /inventory/items/{lot}/transactions": (
+            _default_path(TransactionDTO, transactions), lambda: records(TRANSACTION_COLUMNS, transaction_rows)
+        ),
+        "GET /fermentation/tanks/{id}/history": (_default_path(ReadingDTO, history), lambda: history),
+    }
+    encodings = [enc for enc, lib in ((ORJSON, orjson), (MSGPACK, msgpack)) if lib is not None]
+
+    print(f"{args.rows} filas, mejor de {args.repeat} repeticiones")
+    print(f"{'endpoint':42} {'codificación':12} {'ms':>9} {'bytes':>10} {'mejora':>7}")
+    for name, (default, build) in endpoints.items():
+        base_ms, base_size = _timed(default, args.repeat)
+        print(f"{name:42} {'default':12} {base_ms:9.1f} {base_size:10d} {'1.0x':>7}")
+        for encoding in encodings:
+            ms, size = _timed(lambda: encode(encoding, build()), args.repeat)
+            print(f"{name:42} {encoding:12} {ms:9.1f} {size:10d} {base_ms / ms:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """Microservicio de simulación de fermentación para BrewPiControl.
 
-Publica datos de temperatura, presión y CO₂ de cuatro fermentadores virtuales.
+Publica datos de temperatura, presión y CO₂ de ``SIM_FERMENTERS`` fermentadores
+virtuales (cuatro por defecto).
 Se ejecuta indefinidamente dentro de un contenedor Docker.
 """
 from __future__ import annotations
@@ -16,8 +17,10 @@ from services.mqtt_client import MQTTClient
 import os
 
 PUBLISH_INTERVAL = float(os.getenv("SIM_PUBLISH_INTERVAL", 3.0))
+# Número de fermentadores virtuales (subirlo sirve para probar la ingesta escalada)
+FERMENTER_COUNT = int(os.getenv("SIM_FERMENTERS", 4))
 FERMENTERS: List[Fermenter] = [
-    Fermenter(f"FERMENTER_{i}") for i in range(1, 5)
+    Fermenter(f"FERMENTER_{i}") for i in range(1, FERMENTER_COUNT + 1)
 ]
 
 mqtt_client = MQTTClient()
@@ -9,6 +9,7 @@ import time
 import os
 
 from ..utils.random_gen import gaussian_bounded, logistic_0_100
+from ..utils.telemetry_codec import encode_telemetry
 
 # ---------------------------------------------------------------------------
 # Parámetros globales configurables vía variables de entorno (.env)
@@ -23,6 +24,10 @@ PRESS_SIGMA: float = float(os.getenv("SIM_PRESS_SIGMA", 0.05))
 
 CO2_SIGMA: float = float(os.getenv("SIM_CO2_SIGMA", 1.0))
 
+# Formato de publicación: "text" (un float ASCII por variable) o "packed"
+# (un mensaje binario por tanque en .../telemetry con hora del dispositivo)
+PAYLOAD_FORMAT: str = os.getenv("SIM_PAYLOAD_FORMAT", "text")
+
 
 class Fermenter:
     """Representa un fermentador y su proceso de fermentación."""
@@ -61,9 +66,12 @@ class Fermenter:
     # ------------------------------------------------------------------
     # Serialización
     # ------------------------------------------------------------------
-    def mqtt_messages(self) -> list[tuple[str, str]]:
+    def mqtt_messages(self) -> list[tuple[str, str | bytes]]:
         """Devuelve los mensajes MQTT a publicar para este fermentador."""
         base_topic = f"brewpi/fermentation/{self.id}"
+        if PAYLOAD_FORMAT == "packed":
+            payload = encode_telemetry(time.time(), self.temperature, self.pressure, self.co2)
+            return [(f"{base_topic}/telemetry", payload)]
         return [
             (f"{base_topic}/temperature", f"{self.temperature:.2f}"),
             (f"{base_topic}/pressure", f"{self.pressure:.3f}"),
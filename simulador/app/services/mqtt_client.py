@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 import os
-from typing import Iterable, Tuple
+from typing import Iterable, Tuple, Union
 
 import paho.mqtt.client as mqtt
 from dotenv import load_dotenv
@@ -32,7 +32,7 @@ class MQTTClient:
         self._client.loop_start()
         print(f"[MQTT] Conectado a {MQTT_HOST}:{MQTT_PORT}")
 
-    def publish_many(self, messages: Iterable[Tuple[str, str]]) -> None:
+    def publish_many(self, messages: Iterable[Tuple[str, Union[str, bytes]]]) -> None:
         """Publica múltiples mensajes (topic, payload)."""
         for topic, payload in messages:
             self._client.publish(topic, payload)